@@ -4,6 +4,8 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
+import storage
+import replicas
 
 # Configure logging - only show warnings and errors in production
 logging.basicConfig(level=logging.WARNING)
@@ -11,7 +13,7 @@ logging.basicConfig(level=logging.WARNING)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': replicas.RoutingSession})
 login_manager = LoginManager()
 
 # Create the app
@@ -21,20 +23,70 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 # Configure the database with optimized settings
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///baduk_lectures.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_pre_ping": True,
-    "pool_recycle": 300,
-    "pool_size": 10,
-    "max_overflow": 20,
-    "pool_timeout": 30
-}
+# Engine tuning per backend (see storage.py); DB_PROFILE=default keeps the plain pool settings
+app.config["STORAGE_PROFILE"] = storage.profile_for(app.config["SQLALCHEMY_DATABASE_URI"], os.environ.get("DB_PROFILE"))
+app.config["SQLITE_POOL_SIZE"] = int(os.environ.get("SQLITE_POOL_SIZE", "5"))
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+app.config["SQLITE_CACHE_SIZE_KB"] = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+# Postgres cancels any statement running longer than this; 0 disables the limit
+app.config["DB_STATEMENT_TIMEOUT_MS"] = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = storage.engine_options(app.config)
+# Comma separated read replica URLs for the public pages; writes and /admin stay on the primary
+app.config["READ_REPLICA_URLS"] = [url.strip() for url in os.environ.get("READ_REPLICA_URLS", "").split(",") if url.strip()]
+app.config["REPLICA_HEALTH_INTERVAL"] = int(os.environ.get("REPLICA_HEALTH_INTERVAL", "10"))
+# Seconds after a write during which that client reads from the primary
+app.config["READ_YOUR_WRITES_SECONDS"] = int(os.environ.get("READ_YOUR_WRITES_SECONDS", "5"))
 app.config["YOUTUBE_API_KEY"] = os.environ.get("YOUTUBE_API_KEY", "your-api-key")
+# Point at a local stub server in tests; batches of ids are fetched on a small thread pool
+app.config["YOUTUBE_API_BASE"] = os.environ.get("YOUTUBE_API_BASE", "https://www.googleapis.com/youtube/v3")
+app.config["YOUTUBE_FETCH_WORKERS"] = int(os.environ.get("YOUTUBE_FETCH_WORKERS", "4"))
+# Seconds a fetched video (or a not-found answer) is served from the local cache
+app.config["YOUTUBE_CACHE_TTL"] = int(os.environ.get("YOUTUBE_CACHE_TTL", str(7 * 24 * 3600)))
+app.config["YOUTUBE_NEGATIVE_CACHE_TTL"] = int(os.environ.get("YOUTUBE_NEGATIVE_CACHE_TTL", "3600"))
+# Local thumbnail cache; the base URL replaces i.ytimg.com when downloading originals
+app.config["THUMBNAIL_DIR"] = os.environ.get("THUMBNAIL_DIR", os.path.join(app.instance_path, "thumbnails"))
+app.config["THUMBNAIL_BASE_URL"] = os.environ.get("THUMBNAIL_BASE_URL", "https://i.ytimg.com")
+# Fingerprinted, precompressed copies of static/ served with immutable caching
+app.config["ASSET_FINGERPRINT"] = os.environ.get("ASSET_FINGERPRINT", "1") != "0"
+app.config["ASSET_BUILD_DIR"] = os.environ.get("ASSET_BUILD_DIR", os.path.join(app.instance_path, "assets"))
+# Compress HTML/JSON responses above a small size; serialize JSON with orjson
+app.config["COMPRESSION"] = os.environ.get("COMPRESSION", "1") != "0"
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", "500"))
+app.config["FAST_JSON"] = os.environ.get("FAST_JSON", "1") != "0"
+# Per-request SQL/template/YouTube timings, Server-Timing header and /admin/metrics
+app.config["METRICS"] = os.environ.get("METRICS", "1") != "0"
+app.config["SLOW_REQUEST_MS"] = int(os.environ.get("SLOW_REQUEST_MS", "500"))
+# Background ingestion: worker threads per process (0 to leave jobs to `flask jobs-work`),
+# retries with exponential backoff, and how long a running job may stay locked
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", "1"))
+app.config["JOB_POLL_INTERVAL"] = float(os.environ.get("JOB_POLL_INTERVAL", "5"))
+app.config["JOB_MAX_ATTEMPTS"] = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+app.config["JOB_BACKOFF_SECONDS"] = int(os.environ.get("JOB_BACKOFF_SECONDS", "30"))
+app.config["JOB_LOCK_TIMEOUT"] = int(os.environ.get("JOB_LOCK_TIMEOUT", "300"))
+# Answer topic/tag/rank filters from the in-memory facet index instead of SQL joins
+app.config["FACET_INDEX"] = os.environ.get("FACET_INDEX", "1") != "0"
+# Public page cache: "memory" (per worker), "sqlite:///path" (shared by workers) or "none"
+app.config["RESPONSE_CACHE"] = os.environ.get("RESPONSE_CACHE", "memory")
+app.config["RESPONSE_CACHE_SIZE"] = int(os.environ.get("RESPONSE_CACHE_SIZE", "512"))
+# Related lectures kept per lecture, and whether admin writes refresh them in the background
+# (imports and restores are rebuilt in full by the job workers)
+app.config["RELATED_COUNT"] = int(os.environ.get("RELATED_COUNT", "8"))
+app.config["RELATED_AUTO"] = os.environ.get("RELATED_AUTO", "1") != "0"
+# Pre-rendered public pages for nginx/CDN serving (empty to disable), refreshed after admin writes
+app.config["STATIC_EXPORT_DIR"] = os.environ.get("STATIC_EXPORT_DIR", "")
+app.config["STATIC_EXPORT_AUTO"] = os.environ.get("STATIC_EXPORT_AUTO", "1") != "0"
+# Where catalog snapshots are written (SQLite files or Postgres COPY directories)
+app.config["SNAPSHOT_DIR"] = os.environ.get("SNAPSHOT_DIR", os.path.join(app.instance_path, "snapshots"))
+
+# Create or migrate the schema while the app is set up; turn off when a release step runs db_update
+app.config["INIT_DB_ON_STARTUP"] = os.environ.get("INIT_DB_ON_STARTUP", "1") != "0"
 
 @app.cli.command("db_update")
 def db_update():
     """Update database tables."""
     with app.app_context():
-        db.create_all()
+        init_database()
         print("Database tables updated successfully!")
 
 # Initialize extensions
@@ -42,7 +94,76 @@ db.init_app(app)
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-with app.app_context():
-    import models
-    import routes
-    db.create_all()
+def init_database():
+    """Create missing tables, apply migrations and set up the search index. Needs an app context."""
+    import migrations
+    import search_index
+    import versions
+    migrations.migrate()
+    search_index.init_search_index()
+    versions.init_versions()
+
+def warm_up():
+    """Load state every worker would otherwise build on its first requests.
+
+    Under gunicorn's preload_app this runs once in the master and forked
+    workers share the memory copy-on-write.
+    """
+    from metadata_cache import metadata
+    from facet_index import facet_index
+    from suggest_index import suggest_index
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    metadata.ensure_current()
+    if app.config["FACET_INDEX"]:
+        facet_index.ensure_current()
+    suggest_index.ensure_current()
+    db.session.remove()
+
+def after_fork():
+    """Drop pooled connections inherited from the parent; call in every forked worker."""
+    with app.app_context():
+        db.engine.dispose(close=False)
+    for engine in replicas.replicas.engines:
+        engine.dispose(close=False)
+
+_created = False
+
+def create_app(init_db=None, warm=False):
+    """Register routes, hooks and engines on the app and return it.
+
+    Schema creation is a separate step, run here only when init_db (default
+    INIT_DB_ON_STARTUP) is true. Calling it again returns the same app.
+    """
+    global _created
+    if init_db is None:
+        init_db = app.config["INIT_DB_ON_STARTUP"]
+    with app.app_context():
+        if not _created:
+            _created = True
+            storage.init_storage(app.config, db.engine)
+            replicas.init_replicas(app)
+            import models
+            import routes
+            import search_index
+            import versions
+            import assets
+            import compression
+            import fast_json
+            import metrics
+            import migrations
+            import query_plans
+            import related
+            import static_export
+            assets.init_assets()
+            fast_json.init_json()
+        if init_db:
+            init_database()
+        if warm:
+            warm_up()
+    return app
+
+# Importing this module still gives a ready app for `gunicorn app:app`, main.py
+# and the flask CLI. wsgi.py sets APP_FACTORY=1 and calls create_app() itself.
+if os.environ.get("APP_FACTORY") != "1":
+    create_app()
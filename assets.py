@@ -0,0 +1,155 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+import tempfile
+import brotli
+from flask import request, send_file, url_for, abort
+from werkzeug.utils import safe_join
+from app import app
+
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Encoding name -> sibling suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Logical name (css/style.css) -> {'path': fingerprinted name, 'encodings': [...]}
+manifest = {}
+_served = {}
+
+
+def build_dir():
+    return app.config['ASSET_BUILD_DIR']
+
+
+def _write(path, data):
+    """Write atomically so concurrently starting workers never serve a half-written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        return
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as out:
+        out.write(data)
+    os.replace(tmp, path)
+
+
+def fingerprint(filename, data):
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def build_assets():
+    """Copy every static file to a content-hashed name with gzip/brotli siblings
+    and write the manifest. Unchanged files are not recompressed."""
+    built = {}
+    static_folder = app.static_folder
+    for directory, _, files in os.walk(static_folder):
+        for name in sorted(files):
+            source = os.path.join(directory, name)
+            filename = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            hashed = fingerprint(filename, data)
+            target = os.path.join(build_dir(), hashed)
+            _write(target, data)
+
+            encodings = []
+            if os.path.splitext(name)[1] in COMPRESSIBLE:
+                compressed = {
+                    'br': lambda: brotli.compress(data, quality=11),
+                    'gzip': lambda: gzip.compress(data, compresslevel=9, mtime=0),
+                }
+                for encoding, suffix in ENCODINGS:
+                    if not os.path.exists(target + suffix):
+                        encoded = compressed[encoding]()
+                        # Only keep siblings that actually save bytes
+                        if len(encoded) >= len(data):
+                            continue
+                        _write(target + suffix, encoded)
+                    encodings.append(encoding)
+            built[filename] = {'path': hashed, 'encodings': encodings}
+
+    _write_manifest(built)
+    load_manifest(built)
+    return built
+
+
+def _write_manifest(built):
+    path = os.path.join(build_dir(), MANIFEST_NAME)
+    fd, tmp = tempfile.mkstemp(dir=build_dir(), suffix='.tmp')
+    with os.fdopen(fd, 'w') as out:
+        json.dump(built, out, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_manifest(built=None):
+    """Load the manifest written by build_assets (or use ``built``)."""
+    global manifest, _served
+    if built is None:
+        try:
+            with open(os.path.join(build_dir(), MANIFEST_NAME)) as f:
+                built = json.load(f)
+        except (OSError, ValueError):
+            built = {}
+    manifest = built
+    _served = {entry['path']: entry for entry in built.values()}
+
+
+def asset_url(endpoint, **values):
+    """Drop-in for url_for: static files resolve to their fingerprinted names."""
+    if endpoint == 'static' and values.get('filename') in manifest:
+        values['filename'] = manifest[values['filename']]['path']
+        return url_for('asset', **values)
+    return url_for(endpoint, **values)
+
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    entry = _served.get(filename)
+    if entry is None:
+        # Files from earlier builds stay servable for pages cached before a deploy
+        path = safe_join(build_dir(), filename)
+        if path is None or filename == MANIFEST_NAME or not os.path.isfile(path):
+            abort(404)
+        entry = {'encodings': [name for name, suffix in ENCODINGS if os.path.isfile(path + suffix)]}
+    path = os.path.join(build_dir(), filename)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if name in entry['encodings'] and request.accept_encodings[name]:
+            encoding, path = name, path + suffix
+            break
+
+    response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if entry['encodings']:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+
+@app.cli.command("assets-build")
+def assets_build():
+    """Fingerprint and precompress static files."""
+    built = build_assets()
+    print(f"Built {len(built)} assets into {build_dir()}")
+
+
+def init_assets():
+    """Build at startup unless disabled; a deploy step can run `flask assets-build` instead."""
+    if not app.config['ASSET_FINGERPRINT']:
+        return
+    try:
+        build_assets()
+    except OSError as e:
+        logging.error(f"Error building assets, serving static files directly: {str(e)}")
+        load_manifest({})
@@ -0,0 +1,133 @@
+"""Compare the legacy row-by-row import with the bulk importer.
+
+Generates an export file, imports it into a throwaway SQLite database with
+each path and prints timings and query counts as JSON:
+
+    python benchmarks/bench_import.py --lectures 20000
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_import.db')
+
+from sqlalchemy import event  # noqa: E402
+from app import app, db  # noqa: E402
+from models import Lecture, Topic, Tag, Rank  # noqa: E402
+from data_transfer import import_file  # noqa: E402
+
+
+def generate_export(lectures, topics, tags, ranks, seed=1):
+    """An export document shaped like the old jsonify output (keys sorted, lectures first)."""
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    data = {
+        'topics': [{'id': i, 'name': f'Topic {i}'} for i in range(1, topics + 1)],
+        'tags': [{'id': i, 'name': f'Tag {i}'} for i in range(1, tags + 1)],
+        'ranks': [{'id': i, 'name': f'Rank {i}'} for i in range(1, ranks + 1)],
+        'lectures': [{
+            'id': i,
+            'title': f'Lecture {i} on joseki and fuseki',
+            'youtube_id': f'v{i:010d}',
+            'thumbnail_url': f'https://i.ytimg.com/vi/v{i:010d}/hqdefault.jpg',
+            'publish_date': (start + timedelta(minutes=rng.randrange(5_000_000))).isoformat(),
+            'rank_id': rng.randint(1, ranks),
+            'topic_ids': rng.sample(range(1, topics + 1), rng.randint(1, min(3, topics))),
+            'tag_ids': rng.sample(range(1, tags + 1), rng.randint(0, min(4, tags)))
+        } for i in range(1, lectures + 1)]
+    }
+    return json.dumps(data, sort_keys=True).encode('utf-8')
+
+
+def legacy_import(raw):
+    """The import loop as it was before the bulk importer, for comparison."""
+    import_data = json.loads(raw.decode('utf-8'))
+    id_maps = {}
+    for key, model in (('topics', Topic), ('tags', Tag), ('ranks', Rank)):
+        id_maps[key] = {}
+        for item in import_data.get(key, []):
+            existing = model.query.filter_by(name=item['name']).first()
+            if not existing:
+                existing = model(name=item['name'])
+                db.session.add(existing)
+                db.session.flush()
+            id_maps[key][item['id']] = existing.id
+    for lecture_data in import_data.get('lectures', []):
+        if Lecture.query.filter_by(youtube_id=lecture_data['youtube_id']).first():
+            continue
+        lecture = Lecture(
+            title=lecture_data['title'],
+            youtube_id=lecture_data['youtube_id'],
+            thumbnail_url=lecture_data['thumbnail_url'],
+            publish_date=datetime.fromisoformat(lecture_data['publish_date'])
+        )
+        if lecture_data.get('rank_id') in id_maps['ranks']:
+            lecture.rank_id = id_maps['ranks'][lecture_data['rank_id']]
+        for old_id in lecture_data.get('topic_ids', []):
+            if old_id in id_maps['topics']:
+                lecture.topics.append(Topic.query.get(id_maps['topics'][old_id]))
+        for old_id in lecture_data.get('tag_ids', []):
+            if old_id in id_maps['tags']:
+                lecture.tags.append(Tag.query.get(id_maps['tags'][old_id]))
+        db.session.add(lecture)
+
+
+def clear():
+    for table in ('lecture_topic', 'lecture_tag', 'lecture', 'topic', 'tag', 'rank'):
+        db.session.execute(db.text(f'DELETE FROM {table}'))
+    db.session.commit()
+
+
+def measure(name, run):
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    clear()
+    event.listen(db.engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    run()
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    event.remove(db.engine, 'before_cursor_execute', count)
+    return {
+        'path': name,
+        'seconds': round(elapsed, 3),
+        'queries': queries[0],
+        'lectures': Lecture.query.count()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lectures', type=int, default=5000)
+    parser.add_argument('--topics', type=int, default=30)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--ranks', type=int, default=10)
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the bulk importer')
+    args = parser.parse_args()
+
+    raw = generate_export(args.lectures, args.topics, args.tags, args.ranks)
+    results = []
+    with app.app_context():
+        if not args.skip_legacy:
+            results.append(measure('legacy', lambda: legacy_import(raw)))
+        results.append(measure('bulk', lambda: import_file(io.BytesIO(raw), 'export.json')))
+    print(json.dumps({
+        'benchmark': 'import',
+        'file_bytes': len(raw),
+        'params': vars(args),
+        'results': results
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Load benchmark for the public pages and the admin export/import.
+
+Runs each scenario against a synthetic catalog with the Flask test client,
+or against a running server with --url (public scenarios only), and prints
+latency percentiles, throughput and SQL query counts as JSON:
+
+    python benchmarks/bench_load.py --lectures 10000 --output run.json
+    DATABASE_URL=sqlite:////tmp/catalog.db python benchmarks/bench_load.py --reuse
+    python benchmarks/bench_load.py --url http://127.0.0.1:8000 --topics 30 --tags 200
+
+Query counts come from the Server-Timing header, so METRICS must be on.
+Compare two runs with benchmarks/compare.py.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+WORDS = ['joseki', 'fuseki', 'tesuji', 'endgame', 'invasion', 'ko', 'ladder', 'moyo', 'semeai', 'tsumego']
+ADMIN_SCENARIOS = {'export', 'export_ndjson', 'import'}
+
+
+def scenarios(args):
+    """Scenario name -> (iterations, function(rng) -> (method, path, extra request kwargs))."""
+    def topic(rng):
+        return rng.randint(1, min(args.topics, 5)) if rng.random() < 0.7 else rng.randint(1, args.topics)
+
+    def tag(rng):
+        return rng.randint(1, min(args.tags, 20)) if rng.random() < 0.7 else rng.randint(1, args.tags)
+
+    def get(path):
+        return 'GET', path, {}
+
+    return {
+        'home': (args.iterations, lambda rng: get('/')),
+        'search_page': (args.iterations, lambda rng: get('/search')),
+        'suggest': (args.iterations, lambda rng: get(
+            f'/api/suggest?q={rng.choice(WORDS)[:rng.randint(2, 5)]}')),
+        'related': (args.iterations, lambda rng: get(f'/api/lecture/{rng.randint(1, args.lectures)}/related')),
+        'search_browse': (args.iterations, lambda rng: get('/api/search')),
+        'search_text': (args.iterations, lambda rng: get(f'/api/search?q={rng.choice(WORDS)}')),
+        'search_topic': (args.iterations, lambda rng: get(f'/api/search?topics[]={topic(rng)}')),
+        'search_tags_all': (args.iterations, lambda rng: get(
+            f'/api/search?tags[]={tag(rng)}&tags[]={tag(rng)}&tag_match=all')),
+        'search_text_filters': (args.iterations, lambda rng: get(
+            f'/api/search?q={rng.choice(WORDS)}&topics[]={topic(rng)}&rank={rng.randint(1, args.ranks)}')),
+        'search_facets': (args.iterations, lambda rng: get(
+            f'/api/search?topics[]={topic(rng)}&facets=1')),
+        'search_rank_sort': (args.iterations, lambda rng: get('/api/search?sort=rank')),
+        'search_deep_offset': (args.iterations, lambda rng: get(
+            f'/api/search?page={rng.randint(args.deep_page // 2, args.deep_page)}')),
+        'search_deep_cursor': (args.iterations, None),
+        'export': (args.admin_iterations, lambda rng: get('/admin/export')),
+        'export_ndjson': (args.admin_iterations, lambda rng: get('/admin/export?format=ndjson')),
+        'import': (args.admin_iterations, None),
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, wall_seconds):
+    latencies = sorted(sample['ms'] for sample in samples)
+    ok = [sample for sample in samples if sample['status'] < 400]
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p90_ms': round(percentile(latencies, 0.90), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'max_ms': round(latencies[-1], 3),
+        'rps': round(len(samples) / wall_seconds, 1) if wall_seconds else None,
+        'queries_mean': round(sum(s['queries'] for s in ok) / len(ok), 2) if ok else None,
+        'bytes_mean': round(sum(s['bytes'] for s in ok) / len(ok)) if ok else None
+    }
+
+
+class TestClientTarget:
+    """In-process requests through the Flask test client, one client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+            if self.app.config.get('BENCH_ADMIN'):
+                client.post('/login', data={'username': 'bench', 'password': 'bench'})
+        return client
+
+    def request(self, method, path, **kwargs):
+        response = self.client().open(path, method=method, **kwargs)
+        return response.status_code, response.headers.get('Server-Timing', ''), response.get_data()
+
+
+class HTTPTarget:
+    """Requests to a running server over a keep-alive session per thread."""
+
+    def __init__(self, base_url):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method, path, **kwargs):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        response = session.request(method, self.base_url + path, **kwargs)
+        return response.status_code, response.headers.get('Server-Timing', ''), response.content
+
+
+def timed(target, method, path, **kwargs):
+    started = time.perf_counter()
+    status, server_timing, body = target.request(method, path, **kwargs)
+    elapsed = (time.perf_counter() - started) * 1000
+    match = QUERIES_RE.search(server_timing)
+    return {'ms': elapsed, 'status': status, 'queries': int(match.group(1)) if match else 0,
+            'bytes': len(body)}, body
+
+
+def run_scenario(target, name, iterations, make_request, args, export_body=None):
+    rng = random.Random(f'{args.seed}-{name}')
+    if name == 'search_deep_cursor':
+        def one(i):
+            # Follow next_cursor a few pages deep; every hop is one sample
+            samples, cursor = [], ''
+            for _ in range(args.cursor_hops):
+                sample, body = timed(target, 'GET', f'/api/search?cursor={cursor}')
+                samples.append(sample)
+                cursor = json.loads(body).get('next_cursor')
+                if not cursor:
+                    break
+            return samples
+    elif name == 'import':
+        def one(i):
+            from io import BytesIO
+            data = {'import_file': (BytesIO(export_body), 'export.json')}
+            return [timed(target, 'POST', '/admin/import', data=data,
+                          content_type='multipart/form-data')[0]]
+    else:
+        requests_to_make = [make_request(rng) for _ in range(iterations)]
+
+        def one(i):
+            method, path, kwargs = requests_to_make[i]
+            return [timed(target, method, path, **kwargs)[0]]
+
+    for i in range(min(args.warmup, iterations)):
+        one(i)
+    samples = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for result in pool.map(one, range(iterations)):
+            samples.extend(result)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lectures', type=int, default=10000)
+    parser.add_argument('--topics', type=int, default=30)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--ranks', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reuse', action='store_true', help='use the catalog already in DATABASE_URL')
+    parser.add_argument('--url', help='benchmark a running server instead of the test client')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--admin-iterations', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--deep-page', type=int, default=50)
+    parser.add_argument('--cursor-hops', type=int, default=10)
+    parser.add_argument('--response-cache', default='none', help='RESPONSE_CACHE for the in-process app')
+    parser.add_argument('--scenarios', help='comma separated subset to run')
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    args = parser.parse_args()
+
+    selected = scenarios(args)
+    if args.scenarios:
+        selected = {name: selected[name] for name in args.scenarios.split(',')}
+
+    environment = {'python': platform.python_version(), 'platform': platform.platform()}
+    if args.url:
+        selected = {name: spec for name, spec in selected.items() if name not in ADMIN_SCENARIOS}
+        target = HTTPTarget(args.url)
+        environment['target'] = args.url
+    else:
+        if not args.reuse:
+            os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_load.db')
+        os.environ['RESPONSE_CACHE'] = args.response_cache
+        os.environ.setdefault('JOB_WORKERS', '0')
+        # Related lists are built once below instead of by the background updater mid-run
+        os.environ.setdefault('RELATED_AUTO', '0')
+        os.environ['SLOW_REQUEST_MS'] = str(10 ** 9)
+        from app import app, db
+        from models import User, Lecture
+        from catalog import generate_catalog
+
+        app.config['WTF_CSRF_ENABLED'] = False
+        with app.app_context():
+            if not args.reuse:
+                generate_catalog(args.lectures, args.topics, args.tags, args.ranks, args.seed)
+            if 'related' in selected:
+                from related import rebuild_related
+                rebuild_related()
+            if ADMIN_SCENARIOS & selected.keys():
+                if not User.query.filter_by(username='bench').first():
+                    user = User(username='bench')
+                    user.set_password('bench')
+                    db.session.add(user)
+                    db.session.commit()
+                app.config['BENCH_ADMIN'] = True
+            environment['database'] = db.engine.dialect.name
+            environment['lectures'] = db.session.query(Lecture).count()
+        target = TestClientTarget(app)
+        environment['target'] = 'test-client'
+
+    export_body = None
+    if 'import' in selected:
+        # Re-importing the catalog's own export measures the dedupe path without changing data
+        export_body = target.request('GET', '/admin/export')[2]
+
+    results = {}
+    for name, (iterations, make_request) in selected.items():
+        results[name] = run_scenario(target, name, iterations, make_request, args, export_body)
+        print(f"{name}: p50 {results[name]['p50_ms']}ms, {results[name]['queries_mean']} queries",
+              file=sys.stderr)
+
+    output = json.dumps({
+        'benchmark': 'load',
+        'params': vars(args),
+        'environment': environment,
+        'scenarios': results
+    }, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Payload size and JSON serialization time for /api/search and export.
+
+Loads a synthetic catalog into a throwaway SQLite database, then reports,
+as JSON, the /api/search body size uncompressed and with each available
+Content-Encoding, plus the time to serialize the search and export payloads
+with the standard library and with orjson:
+
+    python benchmarks/bench_payload.py --lectures 5000 --per-page 50
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_payload.db')
+os.environ['RESPONSE_CACHE'] = 'none'
+
+from flask import request  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from app import app, db  # noqa: E402
+from data_transfer import import_file, iter_export_json  # noqa: E402
+from search_engine import SearchParams, run_search  # noqa: E402
+import fast_json  # noqa: E402
+from bench_import import generate_export  # noqa: E402
+
+
+def best_of(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lectures', type=int, default=5000)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        import_file(io.BytesIO(generate_export(args.lectures, 30, 200, 10)), 'export.json')
+        db.session.commit()
+
+    client = app.test_client()
+    url = f'/api/search?per_page={args.per_page}&facets=1'
+    sizes = {'identity': len(client.get(url).data)}
+    for encoding in ('gzip', 'br'):
+        response = client.get(url, headers={'Accept-Encoding': encoding})
+        assert response.headers.get('Content-Encoding') == encoding
+        sizes[encoding] = len(response.data)
+
+    with app.test_request_context(url):
+        payload = run_search(SearchParams(request.args))
+        stdlib = DefaultJSONProvider(app)
+        serialize = {'search_stdlib_ms': best_of(lambda: stdlib.dumps(payload), args.repeat)}
+        orjson_provider = fast_json.OrjsonProvider(app)
+        assert json.loads(orjson_provider.dumps(payload)) == json.loads(stdlib.dumps(payload))
+        serialize['search_orjson_ms'] = best_of(lambda: orjson_provider.dumps(payload), args.repeat)
+
+        def export(fast):
+            app.config['FAST_JSON'] = fast
+            return lambda: sum(len(chunk) for chunk in iter_export_json())
+        serialize['export_stdlib_ms'] = best_of(export(False), 3)
+        serialize['export_orjson_ms'] = best_of(export(True), 3)
+
+    print(json.dumps({
+        'benchmark': 'payload',
+        'params': vars(args),
+        'search_bytes': sizes,
+        'serialize': serialize
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Cold start benchmark: import time and time to first request under gunicorn.
+
+Builds a synthetic catalog in a throwaway SQLite file, then measures
+
+* the cold import of ``app`` (routes plus schema step) and of the factory
+  path without the schema step, each in a fresh interpreter;
+* for each server profile, the time from starting gunicorn until the first
+  200 response, and the proportional memory (PSS) of the running workers.
+
+Prints the results as JSON:
+
+    python benchmarks/bench_startup.py --lectures 20000
+    python benchmarks/bench_startup.py --profiles preload,no-preload --workers 4
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import platform
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPTS = {
+    'import_app': 'import app',
+    'import_factory': ('import os; os.environ["APP_FACTORY"] = "1"\n'
+                       'from app import create_app; create_app(init_db=False)'),
+    'import_factory_warm': ('import os; os.environ["APP_FACTORY"] = "1"\n'
+                            'from app import create_app; create_app(init_db=False, warm=True)'),
+}
+
+# Server profile -> (gunicorn arguments, extra environment)
+SERVER_PROFILES = {
+    'legacy': (['app:app', '-c', os.devnull], {}),
+    'preload': (['-c', 'gunicorn.conf.py'], {'PRELOAD_APP': '1'}),
+    'no-preload': (['-c', 'gunicorn.conf.py'], {'PRELOAD_APP': '0'}),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_import(script, env, repeat):
+    """Best of ``repeat`` fresh interpreters, in seconds."""
+    timed = f'import time\nstarted = time.perf_counter()\n{script}\nprint(time.perf_counter() - started)'
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', timed], cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(float(output.strip().splitlines()[-1]))
+    return round(min(runs), 3)
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_kb(pid):
+    """(rss, pss) of a process from /proc, or (None, None) where unavailable."""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in ('Rss', 'Pss'):
+                    values[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values.get('Rss'), values.get('Pss')
+
+
+def time_server(profile, env, workers, timeout):
+    args, extra_env = SERVER_PROFILES[profile]
+    port = free_port()
+    env = dict(env, GUNICORN_BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers), **extra_env)
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers)] + args
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first_request = None
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+                    if response.status == 200:
+                        first_request = time.perf_counter() - started
+                        break
+            except OSError:
+                time.sleep(0.05)
+        # Let every worker finish booting before reading memory
+        time.sleep(1.0)
+        worker_pids = children(server.pid)
+        memory = [memory_kb(pid) for pid in worker_pids]
+        rss = [value for value, _ in memory if value is not None]
+        pss = [value for _, value in memory if value is not None]
+        return {
+            'profile': profile,
+            'first_request_seconds': round(first_request, 3) if first_request is not None else None,
+            'workers': len(worker_pids),
+            'worker_rss_kb_total': sum(rss) if rss else None,
+            'worker_pss_kb_total': sum(pss) if pss else None
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lectures', type=int, default=20000)
+    parser.add_argument('--profiles', default='legacy,preload,no-preload')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per import timing')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_startup.db'),
+               JOB_WORKERS='0', RELATED_AUTO='0')
+    env.pop('APP_FACTORY', None)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'catalog.py'), '--lectures', str(args.lectures)],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+
+    imports = {name: time_import(script, env, args.repeat) for name, script in IMPORT_SCRIPTS.items()}
+    servers = []
+    for profile in args.profiles.split(','):
+        servers.append(time_server(profile, env, args.workers, args.timeout))
+        print(f"{profile}: first request after {servers[-1]['first_request_seconds']}s", file=sys.stderr)
+
+    print(json.dumps({
+        'benchmark': 'startup',
+        'params': vars(args),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'imports_seconds': imports,
+        'servers': servers
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Concurrent read throughput while an admin import is running, per storage profile.
+
+Each profile runs in a fresh process against a throwaway SQLite file: a
+synthetic catalog is generated, reader threads hit /api/search for a
+quiet period, then again while a bulk import writes in the background.
+Prints reads per second, latency percentiles and errors as JSON:
+
+    python benchmarks/bench_storage.py --lectures 20000 --import-lectures 20000
+    python benchmarks/bench_storage.py --profiles sqlite --readers 8
+
+The "default" profile is the plain pooled engine without SQLite tuning
+(rollback journal); "sqlite" is the tuned WAL profile from storage.py.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def import_document(lectures, topics, tags, ranks, seed):
+    """An export document with lectures the synthetic catalog does not have yet."""
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    return json.dumps({
+        'topics': [{'id': i, 'name': f'Topic {i}'} for i in range(1, topics + 1)],
+        'tags': [{'id': i, 'name': f'Tag {i}'} for i in range(1, tags + 1)],
+        'ranks': [{'id': i, 'name': f'Rank {i}'} for i in range(1, ranks + 1)],
+        'lectures': [{
+            'id': i,
+            'title': f'Imported lecture {i} on joseki',
+            'youtube_id': f'imp{i:08d}',
+            'thumbnail_url': f'https://i.ytimg.com/vi/imp{i:08d}/hqdefault.jpg',
+            'publish_date': (start + timedelta(minutes=rng.randrange(5_000_000))).isoformat(),
+            'rank_id': rng.randint(1, ranks),
+            'topic_ids': rng.sample(range(1, topics + 1), rng.randint(1, min(3, topics))),
+            'tag_ids': rng.sample(range(1, tags + 1), rng.randint(0, min(4, tags)))
+        } for i in range(1, lectures + 1)]
+    }).encode('utf-8')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return round(sorted_values[index], 3)
+
+
+def read_load(app, args, stop):
+    """Start reader threads that run until ``stop`` is set."""
+    samples, lock = [], threading.Lock()
+
+    def reader(number):
+        rng = random.Random(f'{args.seed}-{number}')
+        client = app.test_client()
+        local = []
+        while not stop.is_set():
+            path = f'/api/search?topics[]={rng.randint(1, args.topics)}&page={rng.randint(1, 20)}'
+            started = time.perf_counter()
+            status = client.get(path).status_code
+            local.append(((time.perf_counter() - started) * 1000, status))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    return threads, samples, started
+
+
+def summarize(threads, samples, started):
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies = sorted(ms for ms, status in samples)
+    return {
+        'reads': len(samples),
+        'errors': sum(1 for ms, status in samples if status >= 400),
+        'reads_per_second': round(len(samples) / wall, 1) if wall else None,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+        'seconds': round(wall, 3)
+    }
+
+
+def child(args):
+    from app import app, db
+    from catalog import generate_catalog
+    from data_transfer import import_file
+    from storage import storage_settings
+    from versions import commit_catalog_change
+
+    with app.app_context():
+        generate_catalog(args.lectures, args.topics, args.tags, args.ranks, args.seed)
+        settings = storage_settings(db.engine, app.config['STORAGE_PROFILE'])
+    raw = import_document(args.import_lectures, args.topics, args.tags, args.ranks, args.seed)
+
+    stop = threading.Event()
+    threads, samples, started = read_load(app, args, stop)
+    time.sleep(args.quiet_seconds)
+    stop.set()
+    quiet = summarize(threads, samples, started)
+
+    stop = threading.Event()
+    threads, samples, started = read_load(app, args, stop)
+    import_started = time.perf_counter()
+    with app.app_context():
+        report = import_file(io.BytesIO(raw), 'export.json')
+        commit_catalog_change(metadata=True)
+    import_seconds = time.perf_counter() - import_started
+    stop.set()
+    during = summarize(threads, samples, started)
+
+    return {
+        'profile': app.config['STORAGE_PROFILE'],
+        'settings': settings,
+        'import_seconds': round(import_seconds, 3),
+        'import': report.summary(),
+        'quiet': quiet,
+        'during_import': during
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', default='default,sqlite', help='comma separated storage profiles')
+    parser.add_argument('--lectures', type=int, default=20000)
+    parser.add_argument('--import-lectures', type=int, default=20000)
+    parser.add_argument('--topics', type=int, default=30)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--ranks', type=int, default=12)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--quiet-seconds', type=float, default=3.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args)))
+        return
+
+    results = []
+    for profile in args.profiles.split(','):
+        env = dict(os.environ,
+                   DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_storage.db'),
+                   DB_PROFILE=profile,
+                   # Every read goes to the database: no page cache, no in-memory facet index
+                   RESPONSE_CACHE='none', FACET_INDEX='0', JOB_WORKERS='0', METRICS='0',
+                   RELATED_AUTO='0')
+        command = [sys.executable, os.path.abspath(__file__), '--child']
+        for name in ('lectures', 'import_lectures', 'topics', 'tags', 'ranks', 'readers', 'quiet_seconds', 'seed'):
+            command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+        print(f"{profile}: {results[-1]['during_import']['reads_per_second']} reads/s during import",
+              file=sys.stderr)
+
+    print(json.dumps({
+        'benchmark': 'storage',
+        'params': {key: value for key, value in vars(args).items() if key != 'child'},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'results': results
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
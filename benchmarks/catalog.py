@@ -0,0 +1,156 @@
+"""Deterministic synthetic catalog generator.
+
+Fills the configured database (DATABASE_URL) with N lectures plus topics,
+tags and ranks, with skewed popularity and realistic association fan-out.
+The same arguments always produce the same catalog. Existing lectures,
+topics, tags and ranks are replaced:
+
+    DATABASE_URL=sqlite:////tmp/catalog.db python benchmarks/catalog.py --lectures 100000
+
+Other benchmarks import generate_catalog() and call it inside an app context.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TERMS = [
+    'joseki', 'fuseki', 'tesuji', 'life and death', 'endgame', 'opening theory', 'middle game',
+    'invasion', 'reduction', 'ko fight', 'ladder', 'net', 'sabaki', 'good shape', 'direction of play',
+    'influence', 'territory', 'moyo', 'aji', 'semeai', 'pro game review', 'AI joseki', '3-3 invasion',
+    'Chinese opening', 'Kobayashi opening', 'sanrensei', 'tsumego', 'counting', 'thickness', 'attack'
+]
+FORMATS = ['lecture', 'review', 'problems', 'live stream', 'study session', 'game commentary', 'Q&A']
+LEVELS = ['beginner', 'intermediate', 'advanced', 'dan-level', 'kyu-level', 'practical', 'essential']
+
+# Lectures per topic / tag / rank follow these fan-out and popularity settings
+TOPICS_PER_LECTURE = ([1, 2, 3], [0.55, 0.35, 0.10])
+TAGS_PER_LECTURE = ([0, 1, 2, 3, 4, 5], [0.15, 0.30, 0.25, 0.15, 0.10, 0.05])
+POPULARITY_SKEW = 1.1
+BATCH_SIZE = 10000
+START_DATE = datetime(2015, 1, 1)
+DATE_SPAN_MINUTES = 10 * 365 * 24 * 60
+
+
+def _zipf_weights(count, skew=POPULARITY_SKEW):
+    weights, total = [], 0.0
+    for rank in range(count):
+        total += 1.0 / (rank + 1) ** skew
+        weights.append(total)
+    return weights
+
+
+def _pick(rng, population, cum_weights, k):
+    """k distinct items drawn by weight."""
+    chosen = set()
+    while len(chosen) < min(k, len(population)):
+        chosen.add(rng.choices(population, cum_weights=cum_weights)[0])
+    return sorted(chosen)
+
+
+def iter_lecture_rows(lectures, topics, tags, ranks, seed=1):
+    """Yield (lecture row, topic ids, tag ids) for lecture ids 1..lectures."""
+    from utils import placeholder_thumbnail
+
+    rng = random.Random(seed)
+    topic_ids, tag_ids, rank_ids = range(1, topics + 1), range(1, tags + 1), range(1, ranks + 1)
+    topic_weights, tag_weights = _zipf_weights(topics), _zipf_weights(tags)
+    # Most lectures sit in the middle ranks
+    rank_weights = [min(i + 1, ranks - i) for i in range(ranks)]
+    for lecture_id in range(1, lectures + 1):
+        youtube_id = f'syn{lecture_id:08d}'
+        row = {
+            'id': lecture_id,
+            'title': f'{rng.choice(LEVELS).capitalize()} {rng.choice(TERMS)} {rng.choice(FORMATS)} #{lecture_id}',
+            'youtube_id': youtube_id,
+            'thumbnail_url': placeholder_thumbnail(youtube_id),
+            'publish_date': START_DATE + timedelta(minutes=rng.randrange(DATE_SPAN_MINUTES)),
+            'rank_id': rng.choices(rank_ids, weights=rank_weights)[0] if ranks and rng.random() < 0.9 else None
+        }
+        topic_count = rng.choices(*TOPICS_PER_LECTURE)[0] if topics else 0
+        tag_count = rng.choices(*TAGS_PER_LECTURE)[0] if tags else 0
+        yield row, _pick(rng, topic_ids, topic_weights, topic_count), _pick(rng, tag_ids, tag_weights, tag_count)
+
+
+def generate_catalog(lectures, topics=30, tags=200, ranks=12, seed=1):
+    """Replace the catalog with a synthetic one. Needs an app context. Returns counts."""
+    from app import db
+    from models import Lecture, Topic, Tag, Rank, lecture_topic, lecture_tag
+    from search_index import suspend_sqlite_sync, resume_sqlite_sync
+    from snapshots import truncate_catalog
+    from versions import commit_catalog_change
+
+    truncate_catalog()
+    db.session.close()
+    sqlite = db.engine.dialect.name == 'sqlite'
+    counts = {'lectures': 0, 'topic_links': 0, 'tag_links': 0}
+    with db.engine.begin() as conn:
+        if sqlite:
+            # One FTS rebuild at the end instead of a trigger per row
+            suspend_sqlite_sync(conn)
+        for model, count, label in ((Topic, topics, 'Topic'), (Tag, tags, 'Tag'), (Rank, ranks, 'Rank')):
+            if count:
+                conn.execute(db.insert(model), [{'id': i, 'name': f'{label} {i}'} for i in range(1, count + 1)])
+
+        batch, topic_links, tag_links = [], [], []
+
+        def flush():
+            conn.execute(db.insert(Lecture), batch)
+            if topic_links:
+                conn.execute(lecture_topic.insert(), topic_links)
+            if tag_links:
+                conn.execute(lecture_tag.insert(), tag_links)
+            counts['lectures'] += len(batch)
+            counts['topic_links'] += len(topic_links)
+            counts['tag_links'] += len(tag_links)
+            batch.clear()
+            topic_links.clear()
+            tag_links.clear()
+
+        for row, row_topics, row_tags in iter_lecture_rows(lectures, topics, tags, ranks, seed):
+            batch.append(row)
+            topic_links.extend({'lecture_id': row['id'], 'topic_id': t} for t in row_topics)
+            tag_links.extend({'lecture_id': row['id'], 'tag_id': t} for t in row_tags)
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+
+        if sqlite:
+            resume_sqlite_sync(conn)
+        elif db.engine.dialect.name == 'postgresql':
+            # Explicit ids were inserted, so move the sequences past them
+            for table in ('topic', 'tag', 'rank', 'lecture'):
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                    f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM \"{table}\""
+                )
+    commit_catalog_change(metadata=True)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lectures', type=int, default=1000)
+    parser.add_argument('--topics', type=int, default=30)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--ranks', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        started = time.perf_counter()
+        counts = generate_catalog(args.lectures, args.topics, args.tags, args.ranks, args.seed)
+        elapsed = time.perf_counter() - started
+    print(json.dumps({'benchmark': 'catalog', 'params': vars(args), 'counts': counts,
+                      'seconds': round(elapsed, 3)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
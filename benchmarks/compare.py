@@ -0,0 +1,50 @@
+"""Compare two bench_load.py results and flag regressions.
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 0.15
+
+Exits with status 1 when a scenario's p50 or p90 latency grows by more than
+the threshold, or its mean query count grows at all.
+"""
+import sys
+import json
+import argparse
+
+METRICS = ('p50_ms', 'p90_ms', 'p99_ms', 'rps', 'queries_mean')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed relative latency growth')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['scenarios']
+    with open(args.candidate) as f:
+        candidate = json.load(f)['scenarios']
+
+    regressions = []
+    print(f"{'scenario':<22}" + ''.join(f'{metric:>24}' for metric in METRICS))
+    for name in sorted(baseline.keys() & candidate.keys()):
+        cells = []
+        for metric in METRICS:
+            old, new = baseline[name].get(metric), candidate[name].get(metric)
+            if old is None or new is None:
+                cells.append(f"{'-':>24}")
+                continue
+            change = (new - old) / old if old else 0.0
+            cells.append(f'{old:>9} -> {new:<9} {change:+.0%}'.rjust(24))
+            if metric in ('p50_ms', 'p90_ms') and change > args.threshold:
+                regressions.append(f'{name} {metric} {change:+.0%}')
+            if metric == 'queries_mean' and new > old:
+                regressions.append(f'{name} queries {old} -> {new}')
+        print(f'{name:<22}' + ''.join(cells))
+
+    if regressions:
+        print('\nRegressions:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
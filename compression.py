@@ -0,0 +1,122 @@
+import gzip
+import zlib
+import threading
+from collections import OrderedDict
+import brotli
+from flask import request
+from app import app
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+    'application/json', 'application/x-ndjson', 'image/svg+xml'
+}
+# Cheap settings for bodies compressed per request; static assets are precompressed harder
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CompressedBodies:
+    """Small LRU of compressed bodies keyed by (ETag, encoding).
+
+    Responses from the response cache carry a strong ETag, so a popular page
+    is compressed once per catalog version instead of once per request.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+compressed_bodies = CompressedBodies()
+
+
+def choose_encoding():
+    """Best encoding the client accepts: brotli, then gzip."""
+    if request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterator of chunks, flushing after each so streaming stays incremental."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+@app.after_request
+def compress_response(response):
+    if not app.config['COMPRESSION'] or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or response.direct_passthrough
+            or request.method == 'HEAD'):
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    if not response.is_streamed and len(response.get_data()) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    etag, weak = response.get_etag()
+    if etag:
+        # Different bytes for the same content: a validator of its own, as strong as the original,
+        # so If-None-Match is checked again against the encoded tag
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        key = (etag, encoding) if etag and not weak else None
+        body = compressed_bodies.get(key) if key else None
+        if body is None:
+            body = compress(response.get_data(), encoding)
+            if key:
+                compressed_bodies.set(key, body)
+        response.set_data(body)
+
+    response.headers['Content-Encoding'] = encoding
+    return response
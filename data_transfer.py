@@ -0,0 +1,441 @@
+import gzip
+import codecs
+import json
+import zlib
+from datetime import datetime
+from app import db
+import fast_json
+from models import Lecture, Topic, Tag, Rank, lecture_topic, lecture_tag
+
+EXPORT_BATCH_SIZE = 1000
+
+METADATA_MODELS = (
+    ('topics', 'topic', Topic),
+    ('tags', 'tag', Tag),
+    ('ranks', 'rank', Rank)
+)
+
+
+def _dumps(data):
+    return fast_json.dumps(data)
+
+
+def iter_metadata(model):
+    for item_id, name in db.session.execute(db.select(model.id, model.name).order_by(model.id)):
+        yield {'id': item_id, 'name': name}
+
+
+def iter_lectures(batch_size=EXPORT_BATCH_SIZE):
+    """Export dicts for every lecture, read in batches so memory stays flat.
+
+    Each batch preloads its topic and tag links with one query apiece.
+    """
+    result = db.session.execute(
+        db.select(Lecture.id, Lecture.title, Lecture.youtube_id, Lecture.thumbnail_url,
+                  Lecture.publish_date, Lecture.rank_id)
+        .order_by(Lecture.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for batch in result.partitions():
+        ids = [row[0] for row in batch]
+        topic_ids, tag_ids = {}, {}
+        for links, assoc, column in ((topic_ids, lecture_topic, lecture_topic.c.topic_id),
+                                     (tag_ids, lecture_tag, lecture_tag.c.tag_id)):
+            for lecture_id, item_id in db.session.execute(
+                db.select(assoc.c.lecture_id, column).where(assoc.c.lecture_id.in_(ids))
+            ):
+                links.setdefault(lecture_id, []).append(item_id)
+
+        for lecture_id, title, youtube_id, thumbnail_url, publish_date, rank_id in batch:
+            yield {
+                'id': lecture_id,
+                'title': title,
+                'youtube_id': youtube_id,
+                'thumbnail_url': thumbnail_url,
+                'publish_date': publish_date.isoformat(),
+                'rank_id': rank_id,
+                'topic_ids': topic_ids.get(lecture_id, []),
+                'tag_ids': tag_ids.get(lecture_id, [])
+            }
+
+
+def iter_export_json(batch_size=EXPORT_BATCH_SIZE):
+    """The export document as text chunks.
+
+    Same structure as the old in-memory export (and so importable), with
+    topics, tags and ranks written before lectures.
+    """
+    yield '{'
+    for key, kind, model in METADATA_MODELS:
+        yield f'"{key}":['
+        for index, item in enumerate(iter_metadata(model)):
+            yield (',' if index else '') + _dumps(item)
+        yield '],'
+    yield '"lectures":['
+    for index, lecture in enumerate(iter_lectures(batch_size)):
+        yield (',' if index else '') + _dumps(lecture)
+    yield ']}'
+
+
+def iter_export_ndjson(batch_size=EXPORT_BATCH_SIZE):
+    """One JSON object per line, each tagged with its record type."""
+    for key, kind, model in METADATA_MODELS:
+        for item in iter_metadata(model):
+            yield _dumps({'type': kind, **item}) + '\n'
+    for lecture in iter_lectures(batch_size):
+        yield _dumps({'type': 'lecture', **lecture}) + '\n'
+
+
+def gzip_chunks(chunks, level=6, flush_size=64 * 1024):
+    """Gzip a stream of text chunks, emitting compressed data every ``flush_size`` bytes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        pending += len(data)
+        out = compressor.compress(data)
+        if pending >= flush_size:
+            out += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def buffered(chunks, size=64 * 1024):
+    """Join small text chunks into writes of roughly ``size`` bytes."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+# Import
+
+IMPORT_BATCH_SIZE = 1000
+# Stay well below SQLite's bound-parameter limit in IN lists
+IN_CHUNK_SIZE = 500
+
+SECTION_KINDS = {
+    'topic': 'topics',
+    'tag': 'tags',
+    'rank': 'ranks',
+    'lecture': 'lectures'
+}
+
+
+class _JSONReader:
+    """Pull-parser over a text stream, decoding one JSON value at a time."""
+
+    def __init__(self, stream, chunk_size=64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def next_char(self):
+        char = self.peek()
+        self.pos += 1
+        return char
+
+    def expect(self, char):
+        if self.next_char() != char:
+            raise ValueError(f"Malformed JSON: expected '{char}'")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number cut off at the end of the buffer still decodes, so read on first
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_records(stream):
+    """(section, record) pairs from an export document, without loading it whole.
+
+    Each list opens with a (section, None) pair, so empty sections are seen too.
+    """
+    reader = _JSONReader(stream)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if reader.peek() == '[':
+            reader.expect('[')
+            yield key, None
+            if reader.peek() == ']':
+                reader.next_char()
+            else:
+                while True:
+                    yield key, reader.value()
+                    char = reader.next_char()
+                    if char == ']':
+                        break
+                    if char != ',':
+                        raise ValueError("Malformed JSON: expected ',' or ']'")
+        else:
+            reader.value()
+        char = reader.next_char()
+        if char == '}':
+            return
+        if char != ',':
+            raise ValueError("Malformed JSON: expected ',' or '}'")
+
+
+def iter_ndjson_records(stream):
+    """(section, record) pairs from an NDJSON export, with a (section, None) pair opening each section.
+
+    NDJSON exports always write topics, tags and ranks first, so the first
+    lecture also opens any of them that had no records.
+    """
+    opened = set()
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        section = SECTION_KINDS.get(record.pop('type', None))
+        if not section:
+            continue
+        if section not in opened:
+            sections = SECTION_KINDS.values() if section == 'lectures' else [section]
+            for name in sections:
+                if name not in opened:
+                    opened.add(name)
+                    yield name, None
+        yield section, record
+
+
+def open_import_stream(file):
+    """Text stream over an uploaded export, transparently un-gzipping it.
+
+    Uses a codecs reader rather than TextIOWrapper so the upload is not
+    closed when the reader goes away and can be read a second time.
+    """
+    head = file.read(2)
+    file.seek(0)
+    if head == b'\x1f\x8b':
+        file = gzip.GzipFile(fileobj=file, mode='rb')
+    return codecs.getreader('utf-8')(file)
+
+
+class ImportReport:
+    def __init__(self):
+        self.counts = {
+            section: {'inserted': 0, 'skipped': 0, 'invalid': 0}
+            for section in ('topics', 'tags', 'ranks', 'lectures')
+        }
+
+    def add(self, section, outcome, amount=1):
+        self.counts[section][outcome] += amount
+
+    def summary(self):
+        lectures = self.counts['lectures']
+        metadata = sum(self.counts[s]['inserted'] for s in ('topics', 'tags', 'ranks'))
+        return (f"{lectures['inserted']} lectures imported, {lectures['skipped']} already present, "
+                f"{lectures['invalid']} invalid; {metadata} new topics, tags and ranks")
+
+
+def _chunks(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BulkImporter:
+    """Set-based import: a few IN queries to resolve existing rows, executemany inserts."""
+
+    MODELS = {'topics': Topic, 'tags': Tag, 'ranks': Rank}
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        # old id from the file -> id in this database
+        self.id_maps = {section: {} for section in self.MODELS}
+        self.pending = {section: {} for section in self.MODELS}
+        self.seen_youtube_ids = set()
+        self.lecture_batch = []
+
+    def add_metadata(self, section, record):
+        try:
+            old_id, name = record['id'], record['name'].strip()
+        except (KeyError, TypeError, AttributeError):
+            self.report.add(section, 'invalid')
+            return
+        if not name:
+            self.report.add(section, 'invalid')
+            return
+        self.pending[section][old_id] = name
+
+    def flush_metadata(self):
+        """Resolve pending names to ids, inserting the ones that do not exist yet."""
+        for section, model in self.MODELS.items():
+            pending = self.pending[section]
+            if not pending:
+                continue
+            names = set(pending.values())
+            existing = {}
+            for chunk in _chunks(names):
+                existing.update(db.session.execute(
+                    db.select(model.name, model.id).where(model.name.in_(chunk))
+                ).all())
+            new_names = sorted(names - existing.keys())
+            if new_names:
+                db.session.execute(db.insert(model), [{'name': name} for name in new_names])
+                for chunk in _chunks(new_names):
+                    existing.update(db.session.execute(
+                        db.select(model.name, model.id).where(model.name.in_(chunk))
+                    ).all())
+            self.report.add(section, 'inserted', len(new_names))
+            self.report.add(section, 'skipped', len(pending) - len(new_names))
+            for old_id, name in pending.items():
+                self.id_maps[section][old_id] = existing[name]
+            pending.clear()
+
+    def add_lecture(self, record):
+        try:
+            row = {
+                'title': record['title'].strip(),
+                'youtube_id': record['youtube_id'].strip(),
+                'thumbnail_url': record.get('thumbnail_url'),
+                'publish_date': datetime.fromisoformat(record['publish_date']),
+                'rank_id': record.get('rank_id'),
+                'topic_ids': list(record.get('topic_ids') or []),
+                'tag_ids': list(record.get('tag_ids') or [])
+            }
+        except (KeyError, TypeError, ValueError, AttributeError):
+            self.report.add('lectures', 'invalid')
+            return
+        if not row['title'] or not row['youtube_id']:
+            self.report.add('lectures', 'invalid')
+            return
+        if row['youtube_id'] in self.seen_youtube_ids:
+            self.report.add('lectures', 'skipped')
+            return
+        self.seen_youtube_ids.add(row['youtube_id'])
+        self.lecture_batch.append(row)
+        if len(self.lecture_batch) >= self.batch_size:
+            self.flush_lectures()
+
+    def flush_lectures(self):
+        batch, self.lecture_batch = self.lecture_batch, []
+        if not batch:
+            return
+        self.flush_metadata()
+        existing = set()
+        for chunk in _chunks(row['youtube_id'] for row in batch):
+            existing.update(db.session.execute(
+                db.select(Lecture.youtube_id).where(Lecture.youtube_id.in_(chunk))
+            ).scalars())
+        new_rows = [row for row in batch if row['youtube_id'] not in existing]
+        self.report.add('lectures', 'skipped', len(batch) - len(new_rows))
+        if not new_rows:
+            return
+
+        rank_map = self.id_maps['ranks']
+        inserted = db.session.execute(
+            db.insert(Lecture).returning(Lecture.id, Lecture.youtube_id),
+            [{
+                'title': row['title'],
+                'youtube_id': row['youtube_id'],
+                'thumbnail_url': row['thumbnail_url'],
+                'publish_date': row['publish_date'],
+                'rank_id': rank_map.get(row['rank_id'])
+            } for row in new_rows]
+        ).all()
+        new_ids = {youtube_id: lecture_id for lecture_id, youtube_id in inserted}
+
+        topic_map, tag_map = self.id_maps['topics'], self.id_maps['tags']
+        topic_links, tag_links = [], []
+        for row in new_rows:
+            lecture_id = new_ids[row['youtube_id']]
+            for topic_id in {topic_map[t] for t in row['topic_ids'] if t in topic_map}:
+                topic_links.append({'lecture_id': lecture_id, 'topic_id': topic_id})
+            for tag_id in {tag_map[t] for t in row['tag_ids'] if t in tag_map}:
+                tag_links.append({'lecture_id': lecture_id, 'tag_id': tag_id})
+        if topic_links:
+            db.session.execute(lecture_topic.insert(), topic_links)
+        if tag_links:
+            db.session.execute(lecture_tag.insert(), tag_links)
+        self.report.add('lectures', 'inserted', len(new_rows))
+
+    def run(self, open_records):
+        """Import from ``open_records()``, which returns a fresh record iterator.
+
+        Exports list topics, tags and ranks before lectures and are read in
+        one pass. Older exports put lectures first, so lectures met before
+        every metadata section has started are skipped on a first pass and
+        read again, and only those, once every id can be mapped.
+        """
+        sections_seen = set()
+        deferred = 0
+        for section, record in open_records():
+            if record is None:
+                sections_seen.add(section)
+            elif section in self.MODELS:
+                self.add_metadata(section, record)
+            elif section == 'lectures':
+                if not sections_seen.issuperset(self.MODELS):
+                    deferred += 1
+                else:
+                    self.add_lecture(record)
+        self.flush_metadata()
+        self.flush_lectures()
+        if deferred:
+            # The deferred lectures are the first ones in the file
+            for section, record in open_records():
+                if section == 'lectures' and record is not None:
+                    self.add_lecture(record)
+                    deferred -= 1
+                    if not deferred:
+                        break
+            self.flush_lectures()
+        return self.report
+
+
+def import_file(file, filename='', batch_size=IMPORT_BATCH_SIZE):
+    """Import an uploaded JSON/NDJSON export (optionally gzipped). The caller commits."""
+    iter_records = iter_ndjson_records if '.ndjson' in filename else iter_json_records
+
+    def open_records():
+        file.seek(0)
+        return iter_records(open_import_stream(file))
+
+    return BulkImporter(batch_size).run(open_records)
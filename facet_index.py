@@ -0,0 +1,311 @@
+import bisect
+import logging
+import threading
+from datetime import datetime
+from app import db
+from models import Lecture, lecture_topic, lecture_tag
+from versions import get_version, catalog_changed
+
+# Python ints are used as bitsets over lecture ids: bit n is set when
+# lecture n is in the set, so AND/OR/popcount run in C.
+
+# Set bit positions for every byte value, used to turn bitsets back into ids
+_BYTE_BITS = [tuple(b for b in range(8) if value >> b & 1) for value in range(256)]
+
+
+def ids_to_bits(ids):
+    """Bitset with a bit set for every id."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def bits_to_ids(bits):
+    """Ids of the set bits, in ascending order."""
+    buf = bits.to_bytes((bits.bit_length() + 7) >> 3, 'little')
+    ids = []
+    for offset, value in enumerate(buf):
+        if value:
+            base = offset << 3
+            ids.extend(base + b for b in _BYTE_BITS[value])
+    return ids
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _date_value(publish_date):
+    # Lectures without a date sort after every dated one
+    return (publish_date - EPOCH).total_seconds() if publish_date else float('-inf')
+
+
+def date_key(publish_date, lecture_id):
+    """Sort key for newest first, ties broken by newest id."""
+    return (-_date_value(publish_date), -lecture_id)
+
+
+def rank_key(rank_id, publish_date, lecture_id):
+    """Sort key for rank ascending (unranked first), then newest first."""
+    return (rank_id or 0, -_date_value(publish_date), -lecture_id)
+
+
+class SortedIds:
+    """Lecture ids kept in sort-key order."""
+
+    def __init__(self, items=()):
+        items = sorted(items)
+        self.keys = [key for key, lecture_id in items]
+        self.ids = [lecture_id for key, lecture_id in items]
+
+    def add(self, key, lecture_id):
+        pos = bisect.bisect_left(self.keys, key)
+        self.keys.insert(pos, key)
+        self.ids.insert(pos, lecture_id)
+
+    def remove(self, key):
+        pos = bisect.bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            del self.keys[pos]
+            del self.ids[pos]
+
+    def position_after(self, key):
+        return bisect.bisect_right(self.keys, key)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class FacetIndex:
+    """In-memory topic/tag/rank bitsets plus the lecture ids in each sort order.
+
+    The index remembers the catalog version it was built from. Writes made in
+    this process are applied incrementally through the catalog_changed signal;
+    any other version change (another worker, import, reset) triggers a full
+    rebuild on next use.
+    """
+
+    SORTS = ('date', 'rank')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+        self._clear()
+
+    def _clear(self):
+        self.topics = {}
+        self.tags = {}
+        self.ranks = {}
+        self.all_bits = 0
+        # lecture id -> (topic ids, tag ids, rank id, publish date)
+        self.lectures = {}
+        self.orders = {sort_by: SortedIds() for sort_by in self.SORTS}
+
+    def ensure_current(self):
+        """Rebuild if the database holds a newer catalog than the one indexed."""
+        version = get_version()
+        with self.lock:
+            if self.version != version:
+                self.rebuild(version)
+
+    def rebuild(self, version=None):
+        if version is None:
+            version = get_version()
+        with self.lock:
+            self._clear()
+            rows = db.session.execute(
+                db.select(Lecture.id, Lecture.publish_date, Lecture.rank_id)
+            ).all()
+            topic_rows = db.session.execute(
+                db.select(lecture_topic.c.lecture_id, lecture_topic.c.topic_id)
+            ).all()
+            tag_rows = db.session.execute(
+                db.select(lecture_tag.c.lecture_id, lecture_tag.c.tag_id)
+            ).all()
+
+            lecture_topics = {}
+            for lecture_id, topic_id in topic_rows:
+                lecture_topics.setdefault(lecture_id, []).append(topic_id)
+            lecture_tags = {}
+            for lecture_id, tag_id in tag_rows:
+                lecture_tags.setdefault(lecture_id, []).append(tag_id)
+
+            topic_ids, tag_ids, rank_ids = {}, {}, {}
+            date_items, rank_items = [], []
+            for lecture_id, publish_date, rank_id in rows:
+                topics = tuple(lecture_topics.get(lecture_id, ()))
+                tags = tuple(lecture_tags.get(lecture_id, ()))
+                self.lectures[lecture_id] = (topics, tags, rank_id, publish_date)
+                for topic_id in topics:
+                    topic_ids.setdefault(topic_id, []).append(lecture_id)
+                for tag_id in tags:
+                    tag_ids.setdefault(tag_id, []).append(lecture_id)
+                if rank_id is not None:
+                    rank_ids.setdefault(rank_id, []).append(lecture_id)
+                date_items.append((date_key(publish_date, lecture_id), lecture_id))
+                rank_items.append((rank_key(rank_id, publish_date, lecture_id), lecture_id))
+
+            self.topics = {key: ids_to_bits(ids) for key, ids in topic_ids.items()}
+            self.tags = {key: ids_to_bits(ids) for key, ids in tag_ids.items()}
+            self.ranks = {key: ids_to_bits(ids) for key, ids in rank_ids.items()}
+            self.all_bits = ids_to_bits(self.lectures)
+            self.orders = {'date': SortedIds(date_items), 'rank': SortedIds(rank_items)}
+            self.version = version
+            logging.info(f"Facet index rebuilt with {len(self.lectures)} lectures at version {version}")
+
+    def _unset(self, lecture_id):
+        entry = self.lectures.pop(lecture_id, None)
+        if entry is None:
+            return
+        topics, tags, rank_id, publish_date = entry
+        mask = ~(1 << lecture_id)
+        for topic_id in topics:
+            self.topics[topic_id] &= mask
+        for tag_id in tags:
+            self.tags[tag_id] &= mask
+        if rank_id is not None:
+            self.ranks[rank_id] &= mask
+        self.all_bits &= mask
+        self.orders['date'].remove(date_key(publish_date, lecture_id))
+        self.orders['rank'].remove(rank_key(rank_id, publish_date, lecture_id))
+
+    def _set(self, lecture_id, topics, tags, rank_id, publish_date):
+        self.lectures[lecture_id] = (topics, tags, rank_id, publish_date)
+        bit = 1 << lecture_id
+        for topic_id in topics:
+            self.topics[topic_id] = self.topics.get(topic_id, 0) | bit
+        for tag_id in tags:
+            self.tags[tag_id] = self.tags.get(tag_id, 0) | bit
+        if rank_id is not None:
+            self.ranks[rank_id] = self.ranks.get(rank_id, 0) | bit
+        self.all_bits |= bit
+        self.orders['date'].add(date_key(publish_date, lecture_id), lecture_id)
+        self.orders['rank'].add(rank_key(rank_id, publish_date, lecture_id), lecture_id)
+
+    def update_lectures(self, lecture_ids):
+        """Re-read the given lectures from the database and patch their bits."""
+        lecture_ids = list(lecture_ids)
+        if not lecture_ids:
+            return
+        rows = db.session.execute(
+            db.select(Lecture.id, Lecture.publish_date, Lecture.rank_id).where(Lecture.id.in_(lecture_ids))
+        ).all()
+        topic_rows = db.session.execute(
+            db.select(lecture_topic.c.lecture_id, lecture_topic.c.topic_id)
+            .where(lecture_topic.c.lecture_id.in_(lecture_ids))
+        ).all()
+        tag_rows = db.session.execute(
+            db.select(lecture_tag.c.lecture_id, lecture_tag.c.tag_id)
+            .where(lecture_tag.c.lecture_id.in_(lecture_ids))
+        ).all()
+        with self.lock:
+            for lecture_id in lecture_ids:
+                self._unset(lecture_id)
+            for lecture_id, publish_date, rank_id in rows:
+                topics = tuple(t for l, t in topic_rows if l == lecture_id)
+                tags = tuple(t for l, t in tag_rows if l == lecture_id)
+                self._set(lecture_id, topics, tags, rank_id, publish_date)
+
+    def on_catalog_changed(self, sender, version, lecture_ids=None, **extra):
+        with self.lock:
+            if self.version is None:
+                return
+            if lecture_ids is not None and self.version == version - 1:
+                self.update_lectures(lecture_ids)
+                self.version = version
+            else:
+                # Someone else wrote in between, or the change is too broad
+                self.version = None
+
+    def select(self, topic_ids=(), tag_ids=(), rank_id=None, topic_match='any', tag_match='any'):
+        """Bitset of lectures matching the facet filters."""
+        with self.lock:
+            bits = self.all_bits
+            for facet, ids, match in ((self.topics, topic_ids, topic_match), (self.tags, tag_ids, tag_match)):
+                if not ids:
+                    continue
+                sets = [facet.get(i, 0) for i in ids]
+                if match == 'all':
+                    for s in sets:
+                        bits &= s
+                else:
+                    combined = 0
+                    for s in sets:
+                        combined |= s
+                    bits &= combined
+            if rank_id is not None:
+                bits &= self.ranks.get(rank_id, 0)
+            return bits
+
+    def counts(self, text_bits=None, topic_ids=(), tag_ids=(), rank_id=None, topic_match='any', tag_match='any'):
+        """Lectures per topic, tag and rank under the current filters.
+
+        Each facet is counted with every filter except its own, so the numbers
+        say what picking that value instead would return.
+        """
+        with self.lock:
+            bases = {
+                'topics': self.select((), tag_ids, rank_id, topic_match, tag_match),
+                'tags': self.select(topic_ids, (), rank_id, topic_match, tag_match),
+                'ranks': self.select(topic_ids, tag_ids, None, topic_match, tag_match),
+            }
+            counts = {}
+            for name, facet in (('topics', self.topics), ('tags', self.tags), ('ranks', self.ranks)):
+                base = bases[name]
+                if text_bits is not None:
+                    base &= text_bits
+                counts[name] = {value: (base & bits).bit_count() for value, bits in facet.items()}
+            return counts
+
+    def sort_key(self, sort_by, lecture_id):
+        topics, tags, rank_id, publish_date = self.lectures[lecture_id]
+        if sort_by == 'rank':
+            return rank_key(rank_id, publish_date, lecture_id)
+        return date_key(publish_date, lecture_id)
+
+    def page(self, bits, sort_by='date', offset=0, limit=12, after_key=None):
+        """Ids in ``bits`` in sort order, skipping ``offset`` ids or everything up to ``after_key``.
+
+        Returns (ids, has_next). Dense sets walk the presorted ids until the
+        page is full; sparse sets are pulled out of the bitset and sorted.
+        """
+        with self.lock:
+            count = bits.bit_count()
+            if not count:
+                return [], False
+            order = self.orders[sort_by]
+            start = order.position_after(after_key) if after_key is not None else 0
+            wanted = offset + limit + 1
+            total = len(order) - start
+
+            if wanted * total // count <= count + (bits.bit_length() >> 3):
+                buf = bits.to_bytes((bits.bit_length() + 7) >> 3, 'little')
+                size = len(buf)
+                ids = []
+                for lecture_id in order.ids[start:]:
+                    byte = lecture_id >> 3
+                    if byte < size and buf[byte] >> (lecture_id & 7) & 1:
+                        ids.append(lecture_id)
+                        if len(ids) == wanted:
+                            break
+            else:
+                keyed = [(self.sort_key(sort_by, i), i) for i in bits_to_ids(bits)]
+                if after_key is not None:
+                    keyed = [item for item in keyed if item[0] > after_key]
+                ids = [i for key, i in sorted(keyed)[:wanted]]
+
+            ids = ids[offset:]
+            return ids[:limit], len(ids) > limit
+
+    def contains(self, bits):
+        """Membership test function for a bitset, for filtering other orderings."""
+        buf = bits.to_bytes((bits.bit_length() + 7) >> 3, 'little')
+        size = len(buf)
+        return lambda i: (i >> 3) < size and bool(buf[i >> 3] >> (i & 7) & 1)
+
+
+facet_index = FacetIndex()
+catalog_changed.connect(facet_index.on_catalog_changed)
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectMultipleField, SubmitField
+from wtforms import StringField, PasswordField, SelectMultipleField, SubmitField, TextAreaField
 from wtforms.validators import DataRequired, URL
 
 class LoginForm(FlaskForm):
@@ -15,6 +15,13 @@ class LectureForm(FlaskForm):
     rank = SelectMultipleField('Rank', coerce=int)
     submit = SubmitField('Save Lecture')
 
+class BulkLectureForm(FlaskForm):
+    urls = TextAreaField('YouTube URLs', validators=[DataRequired()])
+    topics = SelectMultipleField('Topics', coerce=int)
+    tags = SelectMultipleField('Tags', coerce=int)
+    rank = SelectMultipleField('Rank', coerce=int)
+    submit = SubmitField('Add Lectures')
+
 class MetadataForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
     submit = SubmitField('Save')
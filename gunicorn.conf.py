@@ -0,0 +1,62 @@
+import gc
+import os
+import logging
+import importlib.util
+import multiprocessing
+
+# Production server settings, read by `gunicorn -c gunicorn.conf.py`.
+# WEB_WORKER_CLASS picks sync, gthread or gevent (async) workers, sized from
+# the CPU count unless WEB_CONCURRENCY / WEB_THREADS are set.
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+# Load the app once in the master so warmed caches and compiled templates are
+# shared copy-on-write by every worker; engines reconnect after the fork.
+preload_app = os.environ.get("PRELOAD_APP", "1") != "0"
+
+cpus = multiprocessing.cpu_count()
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+if worker_class == "gevent" and importlib.util.find_spec("gevent") is None:
+    logging.warning("gevent is not installed, using gthread workers")
+    worker_class = "gthread"
+
+if worker_class == "sync":
+    # One request per process; classic (2 x cores) + 1
+    workers = 2 * cpus + 1
+    threads = 1
+elif worker_class == "gevent":
+    # Requests wait on I/O cooperatively; one process per core is enough
+    workers = cpus
+    threads = 1
+    worker_connections = int(os.environ.get("WORKER_CONNECTIONS", "100"))
+    if preload_app:
+        # The preloaded app must be imported after patching, not only inside the workers
+        from gevent import monkey
+        monkey.patch_all()
+else:
+    # Threads share a process (and its in-memory caches) and overlap database and YouTube waits
+    worker_class = "gthread"
+    workers = cpus + 1
+    threads = int(os.environ.get("WEB_THREADS", "4"))
+
+workers = int(os.environ.get("WEB_CONCURRENCY", workers))
+threads = int(os.environ.get("WEB_THREADS", threads))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG")
+
+
+def when_ready(server):
+    if preload_app:
+        # Keep the garbage collector from touching (and so copying) the preloaded objects
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Only a preloaded app has engines and pooled connections inherited from the master
+    if preload_app:
+        from app import after_fork
+        after_fork()
@@ -0,0 +1,87 @@
+import re
+from app import db
+from models import Lecture, lecture_topic, lecture_tag
+from utils import extract_video_id, fetch_videos
+
+IN_CHUNK_SIZE = 500
+
+
+class BulkAddReport:
+    def __init__(self):
+        self.added = []
+        self.existing = []
+        self.not_found = []
+        self.invalid = []
+
+    def summary(self):
+        parts = [f"{len(self.added)} lectures added"]
+        if self.existing:
+            parts.append(f"{len(self.existing)} already present")
+        if self.not_found:
+            parts.append(f"{len(self.not_found)} not found on YouTube")
+        if self.invalid:
+            parts.append(f"{len(self.invalid)} unrecognised lines")
+        return ', '.join(parts)
+
+
+def parse_video_ids(text):
+    """Video ids from pasted URLs or ids, one per line or separated by spaces or commas.
+
+    Returns (ids in first-seen order, entries that are not YouTube links).
+    """
+    video_ids, invalid = {}, []
+    for entry in re.split(r'[\s,]+', text or ''):
+        if not entry:
+            continue
+        try:
+            video_ids.setdefault(extract_video_id(entry), None)
+        except Exception:
+            invalid.append(entry)
+    return list(video_ids), invalid
+
+
+def bulk_add_lectures(text, topic_ids=(), tag_ids=(), rank_id=None):
+    """Fetch every new video in ``text`` and insert them with shared topics, tags and rank.
+
+    Titles come from YouTube. The caller commits, so all lectures land in one
+    transaction.
+    """
+    report = BulkAddReport()
+    video_ids, report.invalid = parse_video_ids(text)
+
+    existing = set()
+    for start in range(0, len(video_ids), IN_CHUNK_SIZE):
+        chunk = video_ids[start:start + IN_CHUNK_SIZE]
+        existing.update(db.session.execute(
+            db.select(Lecture.youtube_id).where(Lecture.youtube_id.in_(chunk))
+        ).scalars())
+    report.existing = [video_id for video_id in video_ids if video_id in existing]
+    new_ids = [video_id for video_id in video_ids if video_id not in existing]
+
+    videos = fetch_videos(new_ids) if new_ids else {}
+    report.not_found = [video_id for video_id in new_ids if video_id not in videos]
+    rows = [{
+        'title': videos[video_id]['title'] or video_id,
+        'youtube_id': video_id,
+        'thumbnail_url': videos[video_id]['thumbnail_url'],
+        'publish_date': videos[video_id]['publish_date'],
+        'rank_id': rank_id
+    } for video_id in new_ids if video_id in videos]
+    if not rows:
+        return report
+
+    inserted = db.session.execute(
+        db.insert(Lecture).returning(Lecture.id, Lecture.youtube_id), rows
+    ).all()
+    report.added = [lecture_id for lecture_id, _ in inserted]
+    if topic_ids:
+        db.session.execute(lecture_topic.insert(), [
+            {'lecture_id': lecture_id, 'topic_id': topic_id}
+            for lecture_id in report.added for topic_id in set(topic_ids)
+        ])
+    if tag_ids:
+        db.session.execute(lecture_tag.insert(), [
+            {'lecture_id': lecture_id, 'tag_id': tag_id}
+            for lecture_id in report.added for tag_id in set(tag_ids)
+        ])
+    return report
@@ -0,0 +1,237 @@
+import os
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+from app import app, db
+from models import Lecture, IngestJob
+from utils import fetch_videos
+from thumbnails import cache_thumbnail
+from related import rebuild_if_requested
+from versions import commit_catalog_change
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+MAX_BACKOFF_SECONDS = 3600
+
+
+def enqueue_fetch(lecture):
+    """Queue a YouTube lookup for a lecture saved with placeholder details. The caller commits."""
+    job = IngestJob(lecture_id=lecture.id, youtube_id=lecture.youtube_id, status=PENDING)
+    db.session.add(job)
+    return job
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter: base, 2x base, 4x base ... capped at an hour."""
+    delay = min(app.config['JOB_BACKOFF_SECONDS'] * 2 ** max(attempts - 1, 0), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_job():
+    """Atomically take the next due job, including ones left running by a dead worker."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'])
+    claimable = db.or_(
+        db.and_(IngestJob.status == PENDING, IngestJob.run_after <= now),
+        db.and_(IngestJob.status == RUNNING, IngestJob.locked_at < stale)
+    )
+    for _ in range(3):
+        job_id = db.session.execute(
+            db.select(IngestJob.id).where(claimable).order_by(IngestJob.run_after, IngestJob.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        # Only one worker wins the conditional update; the others try the next job
+        claimed = db.session.execute(
+            db.update(IngestJob).where(IngestJob.id == job_id, claimable)
+            .values(status=RUNNING, locked_at=now, attempts=IngestJob.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(IngestJob, job_id)
+    return None
+
+
+def run_job(job):
+    """Fill in a lecture's thumbnail and publish date and cache the thumbnail locally;
+    retry with backoff on errors."""
+    try:
+        lecture = db.session.get(Lecture, job.lecture_id)
+        if lecture is None or lecture.youtube_id != job.youtube_id:
+            # Deleted, reset or pointed at another video since the job was queued
+            job.status, job.last_error = DONE, 'Lecture no longer matches this job'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        video_info = fetch_videos([job.youtube_id]).get(job.youtube_id)
+        if video_info is None:
+            # The lecture keeps its placeholder details; job_status lists it for the admin to fix
+            logging.warning(f"Video {job.youtube_id} of lecture {lecture.id} not found")
+            job.status, job.last_error = FAILED, 'Video not found'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        lecture.thumbnail_url = video_info['thumbnail_url']
+        lecture.publish_date = video_info['publish_date']
+        cache_thumbnail(lecture)
+        job.status, job.last_error = DONE, None
+        job.finished_at = datetime.utcnow()
+        commit_catalog_change([lecture.id])
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error running ingest job {job.id}: {str(e)}")
+        job = db.session.get(IngestJob, job.id)
+        job.last_error = str(e)
+        if job.attempts >= app.config['JOB_MAX_ATTEMPTS']:
+            job.status = FAILED
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = PENDING
+            job.run_after = datetime.utcnow() + timedelta(seconds=backoff_seconds(job.attempts))
+        db.session.commit()
+
+
+def run_pending(limit=None):
+    """Run due jobs in the current thread until none are left. Returns how many ran."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def run_requested_rebuild():
+    """Rebuild the related lists if a catalog change asked for it. Returns the lecture count or None."""
+    try:
+        rebuilt = rebuild_if_requested()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error rebuilding related lectures: {str(e)}")
+        return None
+    if rebuilt is not None:
+        logging.info(f"Rebuilt related lectures for {rebuilt} lectures")
+    return rebuilt
+
+
+class JobWorkers:
+    """Worker threads polling the job table. Started lazily, once per process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rebuilding = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+        self.threads = []
+
+    def ensure_started(self):
+        # Threads do not survive a fork, so a forked worker process starts its own
+        if self.pid == os.getpid() or app.config['JOB_WORKERS'] <= 0:
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.wakeup = threading.Event()
+            self.threads = [
+                threading.Thread(target=self.loop, name=f'ingest-worker-{n}', daemon=True)
+                for n in range(app.config['JOB_WORKERS'])
+            ]
+            for thread in self.threads:
+                thread.start()
+
+    def notify(self):
+        """Wake the workers after committing new jobs."""
+        self.wakeup.set()
+
+    def loop(self):
+        while True:
+            try:
+                with app.app_context():
+                    ran = run_pending()
+            except Exception as e:
+                logging.error(f"Ingest worker error: {str(e)}")
+                ran = 0
+            # One thread per process rebuilds; the others keep running jobs meanwhile
+            rebuilt = None
+            if self.rebuilding.acquire(blocking=False):
+                try:
+                    with app.app_context():
+                        rebuilt = run_requested_rebuild()
+                finally:
+                    self.rebuilding.release()
+            if not ran and rebuilt is None:
+                self.wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+                self.wakeup.clear()
+
+
+workers = JobWorkers()
+
+
+@app.before_request
+def start_job_workers():
+    workers.ensure_started()
+
+
+def _job_dict(job, title):
+    return {
+        'id': job.id,
+        'lecture_id': job.lecture_id,
+        'title': title,
+        'youtube_id': job.youtube_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'last_error': job.last_error,
+        'run_after': job.run_after.isoformat(),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def job_status(limit=20):
+    """Counts by status, the most recent jobs and the failed ones still to fix, for the admin panel.
+
+    A failed job needs attention while its lecture still points at the same
+    video, since that lecture is left with placeholder details.
+    """
+    counts = dict(db.session.execute(
+        db.select(IngestJob.status, db.func.count()).group_by(IngestJob.status)
+    ).all())
+    recent = db.session.execute(
+        db.select(IngestJob, Lecture.title)
+        .outerjoin(Lecture, Lecture.id == IngestJob.lecture_id)
+        .order_by(IngestJob.id.desc()).limit(limit)
+    ).all()
+    unresolved = db.session.execute(
+        db.select(IngestJob, Lecture.title)
+        .join(Lecture, db.and_(Lecture.id == IngestJob.lecture_id, Lecture.youtube_id == IngestJob.youtube_id))
+        .where(IngestJob.status == FAILED)
+        .order_by(IngestJob.id.desc()).limit(limit)
+    ).all()
+    return {
+        'counts': {status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)},
+        'jobs': [_job_dict(job, title) for job, title in recent],
+        'unresolved': [_job_dict(job, title) for job, title in unresolved]
+    }
+
+
+@app.cli.command("jobs-work")
+def jobs_work():
+    """Run ingest jobs and requested related-lecture rebuilds in the foreground until interrupted."""
+    print("Processing ingest jobs, press Ctrl+C to stop")
+    while True:
+        with app.app_context():
+            ran = run_pending()
+            rebuilt = run_requested_rebuild()
+        if not ran and rebuilt is None:
+            time.sleep(app.config['JOB_POLL_INTERVAL'])
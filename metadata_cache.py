@@ -0,0 +1,64 @@
+import threading
+from collections import namedtuple
+from app import db
+from models import Topic, Tag, Rank
+from versions import METADATA, get_version, catalog_changed
+
+MetadataItem = namedtuple('MetadataItem', ['id', 'name'])
+
+KINDS = {
+    'topics': Topic,
+    'tags': Tag,
+    'ranks': Rank
+}
+
+
+class MetadataCache:
+    """Topics, tags and ranks shared by every request in the process.
+
+    Reloaded when the metadata version in the database moves, which covers
+    writes made by other workers; local writes drop the cache right away.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.items = {}
+        self.names = {}
+
+    def ensure_current(self):
+        version = get_version(METADATA)
+        if self.version == version:
+            return
+        with self.lock:
+            if self.version == version:
+                return
+            items, names = {}, {}
+            for kind, model in KINDS.items():
+                rows = db.session.execute(db.select(model.id, model.name).order_by(model.id)).all()
+                items[kind] = tuple(MetadataItem(item_id, name) for item_id, name in rows)
+                names[kind] = {item_id: name for item_id, name in rows}
+            self.items, self.names = items, names
+            self.version = version
+
+    def all(self, kind):
+        """Every topic, tag or rank as (id, name) items in id order."""
+        self.ensure_current()
+        return self.items[kind]
+
+    def choices(self, kind):
+        """(id, name) pairs for form select fields."""
+        return [tuple(item) for item in self.all(kind)]
+
+    def name_map(self, kind):
+        """Mapping of id to name."""
+        self.ensure_current()
+        return self.names[kind]
+
+    def on_catalog_changed(self, sender, metadata=False, **extra):
+        if metadata:
+            self.version = None
+
+
+metadata = MetadataCache()
+catalog_changed.connect(metadata.on_catalog_changed)
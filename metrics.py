@@ -0,0 +1,211 @@
+import time
+import bisect
+import logging
+import threading
+from flask import g, request, has_request_context, before_render_template, template_rendered, Response
+from flask_login import login_required
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+from replicas import replicas
+
+# Latency buckets in seconds, shared by every route histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements kept per request for the slow-request log
+MAX_LOGGED_STATEMENTS = 50
+
+
+class RequestMetrics:
+    """Timings collected while one request is handled, kept on ``g``."""
+
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'statements', 'timings', 'template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = []
+        self.timings = {}
+        self.template_started = None
+
+
+def current():
+    """Metrics of the request being handled, or None outside a request."""
+    if has_request_context():
+        return g.get('_metrics')
+    return None
+
+
+def add_timing(name, seconds):
+    """Add time spent in a named component (template, youtube ...) to the current request."""
+    metrics = current()
+    if metrics is not None:
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + seconds
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Per-process aggregates: a latency histogram and SQL totals per route."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.requests = {}
+        self.sql_queries = {}
+        self.sql_seconds = {}
+
+    def observe(self, route, method, status, seconds, metrics):
+        with self.lock:
+            key = (route, method)
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram()
+            histogram.observe(seconds)
+            status_key = (route, method, str(status))
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self.sql_queries[key] = self.sql_queries.get(key, 0) + metrics.sql_count
+            self.sql_seconds[key] = self.sql_seconds.get(key, 0.0) + metrics.sql_seconds
+
+    def render(self):
+        """Prometheus text exposition format."""
+        def labels(**values):
+            return '{' + ','.join(f'{name}="{value}"' for name, value in values.items()) + '}'
+
+        lines = []
+        with self.lock:
+            lines.append('# HELP http_request_duration_seconds Request latency by route.')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for (route, method), histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket'
+                                 f'{labels(route=route, method=method, le=bound)} {cumulative}')
+                lines.append(f'http_request_duration_seconds_sum{labels(route=route, method=method)} '
+                             f'{histogram.total:.6f}')
+                lines.append(f'http_request_duration_seconds_count{labels(route=route, method=method)} '
+                             f'{histogram.count}')
+
+            lines.append('# HELP http_requests_total Requests by route and status.')
+            lines.append('# TYPE http_requests_total counter')
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{labels(route=route, method=method, status=status)} {count}')
+
+            lines.append('# HELP sql_queries_total SQL statements executed while handling requests.')
+            lines.append('# TYPE sql_queries_total counter')
+            for (route, method), count in sorted(self.sql_queries.items()):
+                lines.append(f'sql_queries_total{labels(route=route, method=method)} {count}')
+
+            lines.append('# HELP sql_seconds_total Time spent in SQL while handling requests.')
+            lines.append('# TYPE sql_seconds_total counter')
+            for (route, method), seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'sql_seconds_total{labels(route=route, method=method)} {seconds:.6f}')
+
+        # Imported here because utils reports its timings through this module
+        from utils import youtube_stats
+        stats = youtube_stats.as_dict()
+        lines.append('# HELP youtube_cache_lookups_total YouTube metadata cache lookups by result.')
+        lines.append('# TYPE youtube_cache_lookups_total counter')
+        for result in ('cache_hits', 'negative_hits', 'cache_misses'):
+            lines.append(f'youtube_cache_lookups_total{labels(result=result)} {stats[result]}')
+        lines.append('# HELP youtube_upstream_requests_total Calls to the YouTube API.')
+        lines.append('# TYPE youtube_upstream_requests_total counter')
+        lines.append(f'youtube_upstream_requests_total {stats["upstream_requests"]}')
+        lines.append('# TYPE youtube_upstream_errors_total counter')
+        lines.append(f'youtube_upstream_errors_total {stats["upstream_errors"]}')
+        lines.append('# TYPE youtube_upstream_seconds_total counter')
+        lines.append(f'youtube_upstream_seconds_total {youtube_stats.upstream_seconds:.6f}')
+        if replicas.engines:
+            lines.append('# HELP db_replica_healthy Whether a read replica is in the round-robin rotation.')
+            lines.append('# TYPE db_replica_healthy gauge')
+            for replica in replicas.status():
+                lines.append(f'db_replica_healthy{labels(url=replica["url"])} {int(replica["healthy"])}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+# The start time lives on the execution context, which is dropped with the
+# statement even when it raises and after_cursor_execute never fires
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current() is not None and context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = current()
+    started = getattr(context, '_query_started', None)
+    if metrics is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    metrics.sql_count += 1
+    metrics.sql_seconds += elapsed
+    if len(metrics.statements) < MAX_LOGGED_STATEMENTS:
+        metrics.statements.append((elapsed, statement))
+
+
+def _template_started(sender, template, context, **extra):
+    metrics = current()
+    if metrics is not None:
+        metrics.template_started = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    metrics = current()
+    if metrics is not None and metrics.template_started is not None:
+        add_timing('template', time.perf_counter() - metrics.template_started)
+        metrics.template_started = None
+
+
+before_render_template.connect(_template_started, app)
+template_rendered.connect(_template_finished, app)
+
+
+@app.before_request
+def start_request_metrics():
+    if app.config['METRICS']:
+        g._metrics = RequestMetrics()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    metrics = current()
+    if metrics is None:
+        return response
+    elapsed = time.perf_counter() - metrics.started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    registry.observe(route, request.method, response.status_code, elapsed, metrics)
+
+    timings = [f'db;dur={metrics.sql_seconds * 1000:.1f};desc="{metrics.sql_count} queries"']
+    timings += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in metrics.timings.items()]
+    timings.append(f'total;dur={elapsed * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+
+    if elapsed * 1000 >= app.config['SLOW_REQUEST_MS']:
+        statements = '\n'.join(f'  {seconds * 1000:.1f}ms {" ".join(statement.split())}'
+                               for seconds, statement in metrics.statements)
+        logging.warning(
+            f"Slow request {request.method} {request.full_path} took {elapsed * 1000:.0f}ms "
+            f"({metrics.sql_count} queries, {metrics.sql_seconds * 1000:.0f}ms SQL)\n{statements}"
+        )
+    return response
+
+
+@app.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,119 @@
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from app import app, db
+from models import Lecture, IngestJob, SchemaMigration, lecture_topic, lecture_tag
+
+# Versioned schema changes for databases created before a model changed.
+# db.create_all() only creates missing tables, so anything that alters an
+# existing table (keys, indexes) is a numbered migration here. A fresh
+# database gets the current schema from create_all() and is stamped with
+# every version without running them.
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+@contextmanager
+def _transaction():
+    """A connection inside one transaction that also covers DDL."""
+    db.session.close()
+    if db.engine.dialect.name == 'sqlite':
+        # pysqlite would commit before each DDL statement, so manage the transaction by hand
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.exec_driver_sql('COMMIT')
+            except Exception:
+                conn.exec_driver_sql('ROLLBACK')
+                raise
+    else:
+        with db.engine.begin() as conn:
+            yield conn
+
+
+def _rebuild_association(conn, table):
+    """Recreate an association table with its composite primary key, dropping
+    duplicate and half-empty rows the old keyless table allowed."""
+    if db.inspect(conn).get_pk_constraint(table.name)['constrained_columns']:
+        return
+    old_name = f'{table.name}_old'
+    columns = ', '.join(table.columns.keys())
+    not_null = ' AND '.join(f'{column} IS NOT NULL' for column in table.columns.keys())
+    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+    table.create(conn)
+    conn.exec_driver_sql(
+        f'INSERT INTO "{table.name}" ({columns}) SELECT DISTINCT {columns} FROM "{old_name}" WHERE {not_null}'
+    )
+    conn.exec_driver_sql(f'DROP TABLE "{old_name}"')
+
+
+def _create_index(conn, table, name):
+    index = next(index for index in table.indexes if index.name == name)
+    index.create(conn, checkfirst=True)
+
+
+@migration(1, 'association primary keys and reverse indexes')
+def association_keys(conn):
+    _rebuild_association(conn, lecture_topic)
+    _rebuild_association(conn, lecture_tag)
+
+
+@migration(2, 'search and job queue indexes')
+def search_indexes(conn):
+    _create_index(conn, Lecture.__table__, 'ix_lecture_rank_date')
+    _create_index(conn, IngestJob.__table__, 'ix_ingest_job_due')
+
+
+def current_version():
+    versions = db.session.execute(db.select(SchemaMigration.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def migrate():
+    """Bring the schema up to date and return the versions that were applied."""
+    fresh = not db.inspect(db.engine).has_table(Lecture.__tablename__)
+    db.create_all()
+    done = set(db.session.execute(db.select(SchemaMigration.version)).scalars())
+    db.session.close()
+
+    applied = []
+    for version, name, func in MIGRATIONS:
+        if version in done:
+            continue
+        with _transaction() as conn:
+            if not fresh:
+                logging.info(f"Applying migration {version}: {name}")
+                func(conn)
+            conn.execute(db.insert(SchemaMigration).values(version=version, name=name,
+                                                          applied_at=datetime.utcnow()))
+        if not fresh:
+            applied.append(version)
+    return applied
+
+
+@app.cli.command("db-migrate")
+def db_migrate():
+    """Apply pending schema migrations."""
+    applied = migrate()
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print("Schema is up to date")
+
+
+@app.cli.command("db-version")
+def db_version():
+    """Show the applied schema version and any pending migrations."""
+    version = current_version()
+    print(f"Schema version {version}")
+    for number, name, func in MIGRATIONS:
+        if number > version:
+            print(f"Pending: {number} {name}")
@@ -25,6 +25,11 @@ class Lecture(db.Model):
     thumbnail_url = db.Column(db.String(200))
     publish_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     rank_id = db.Column(db.Integer, db.ForeignKey('rank.id'), index=True)
+
+    __table_args__ = (
+        # Rank filter ordered by date, see migrations.py
+        db.Index('ix_lecture_rank_date', 'rank_id', 'publish_date'),
+    )
     
     # Relationships
     topics = db.relationship('Topic', secondary='lecture_topic')
@@ -43,13 +48,91 @@ class Rank(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(20), unique=True, nullable=False)
 
+class DataVersion(db.Model):
+    # Counters bumped by admin writes so every worker can tell its caches are stale
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaMigration(db.Model):
+    # Versions from migrations.py already applied to this database
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class YouTubeVideo(db.Model):
+    # Cached videos.list snippets; found=False remembers ids YouTube does not know
+    video_id = db.Column(db.String(20), primary_key=True)
+    snippet = db.Column(db.Text)
+    found = db.Column(db.Boolean, nullable=False, default=True)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class IngestJob(db.Model):
+    # Background YouTube lookups for lectures saved before the video details were known.
+    # lecture_id is deliberately not a foreign key so snapshots can truncate lectures.
+    id = db.Column(db.Integer, primary_key=True)
+    lecture_id = db.Column(db.Integer, nullable=False, index=True)
+    youtube_id = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_ingest_job_due', 'status', 'run_after'),
+    )
+
+class ThumbnailVariant(db.Model):
+    # Resized thumbnails cached on disk; files are named by the digest of their content
+    youtube_id = db.Column(db.String(20), primary_key=True)
+    variant = db.Column(db.String(16), primary_key=True)
+    digest = db.Column(db.String(40), nullable=False)
+    width = db.Column(db.Integer)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class RelatedLecture(db.Model):
+    # Precomputed nearest neighbours from related.py, best first by score. Clustered on
+    # the primary key so one lecture's list is a single range read; no foreign keys,
+    # like IngestJob, so catalog truncation does not have to clear it first.
+    lecture_id = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_related_lecture_related', 'related_id'),
+        {'sqlite_with_rowid': False},
+    )
+
+class RelatedVector(db.Model):
+    # Normalized feature weights of each lecture, as used for its related list. The
+    # feature index makes one feature's posting list a range read, so incremental
+    # updates only load the lectures sharing a feature with the changed ones.
+    lecture_id = db.Column(db.Integer, primary_key=True)
+    feature = db.Column(db.String(100), primary_key=True)
+    weight = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_related_vector_feature', 'feature', 'lecture_id', 'weight'),
+        {'sqlite_with_rowid': False},
+    )
+
+class RelatedFeature(db.Model):
+    # How many lectures have each feature in related_vector, for idf weights
+    feature = db.Column(db.String(100), primary_key=True)
+    documents = db.Column(db.Integer, nullable=False)
+
 # Association tables
+# The primary key serves lookups by lecture, the reverse index lookups by topic/tag
 lecture_topic = db.Table('lecture_topic',
-    db.Column('lecture_id', db.Integer, db.ForeignKey('lecture.id')),
-    db.Column('topic_id', db.Integer, db.ForeignKey('topic.id'))
+    db.Column('lecture_id', db.Integer, db.ForeignKey('lecture.id'), primary_key=True),
+    db.Column('topic_id', db.Integer, db.ForeignKey('topic.id'), primary_key=True),
+    db.Index('ix_lecture_topic_topic', 'topic_id', 'lecture_id')
 )
 
 lecture_tag = db.Table('lecture_tag',
-    db.Column('lecture_id', db.Integer, db.ForeignKey('lecture.id')),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'))
+    db.Column('lecture_id', db.Integer, db.ForeignKey('lecture.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_lecture_tag_tag', 'tag_id', 'lecture_id')
 )
@@ -0,0 +1,54 @@
+import json
+import base64
+from datetime import datetime
+from app import db
+from models import Lecture
+
+# Sorts that support keyset pagination, mapped to whether the sort key descends.
+# Ties are always broken by lecture id, newest id first.
+KEYSET_SORTS = {
+    'date': True,
+    'relevance': False
+}
+
+
+def encode_cursor(sort_by, value, lecture_id):
+    """Pack the sort key of the last returned row into an opaque token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_by, value, lecture_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_by):
+    """Unpack a token from encode_cursor, raising ValueError if it is unusable."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, value, lecture_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort_by:
+        raise ValueError('Cursor does not match the requested sort')
+    if not isinstance(lecture_id, int) or isinstance(lecture_id, bool):
+        raise ValueError('Invalid cursor')
+    if sort_by == 'date':
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+    elif not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError('Invalid cursor')
+    return value, lecture_id
+
+
+def keyset_order(sort_by, column):
+    """ORDER BY clauses matching keyset_after for the given sort."""
+    if KEYSET_SORTS[sort_by]:
+        return [column.desc(), Lecture.id.desc()]
+    return [column.asc(), Lecture.id.desc()]
+
+
+def keyset_after(sort_by, column, value, lecture_id):
+    """Filter selecting rows that come after (value, lecture_id) in keyset_order."""
+    beyond = column < value if KEYSET_SORTS[sort_by] else column > value
+    return db.or_(beyond, db.and_(column == value, Lecture.id < lecture_id))
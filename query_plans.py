@@ -0,0 +1,91 @@
+import re
+from datetime import datetime
+import click
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+from app import app, db
+from search_engine import SearchParams, sql_queries
+from search_index import text_matches
+
+# Search queries whose plans must reach lectures and their topics/tags
+# through an index. Each entry is (name, query arguments).
+CHECKED_SEARCHES = [
+    ('topic any', {'topics[]': ['1', '2']}),
+    ('topic all', {'topics[]': ['1', '2'], 'topic_match': 'all'}),
+    ('tag any', {'tags[]': ['1', '2']}),
+    ('tag all', {'tags[]': ['1', '2'], 'tag_match': 'all'}),
+    ('rank', {'rank': '1'}),
+    ('rank sort', {'sort': 'rank', 'topics[]': ['1']}),
+    ('date keyset', {'cursor': '', 'tags[]': ['1'], 'rank': '1'}),
+    ('text', {'q': 'joseki', 'topics[]': ['1']}),
+]
+
+# Any SCAN of lecture or an association table reads the whole table (an index
+# walk in sort order still reads every row that fails the filters); they must
+# only be SEARCHed. A temp B-tree sorting a scanned lecture table is reported too.
+SQLITE_FULL_SCAN_RE = re.compile(r'^SCAN (lecture|lecture_topic|lecture_tag)(_\d+)?( |$)')
+SQLITE_TEMP_BTREE_RE = re.compile(r'^USE TEMP B-TREE\b')
+POSTGRES_FULL_SCAN_RE = re.compile(r'Seq Scan on (lecture_topic|lecture_tag|lecture)\b')
+
+
+def explain(query):
+    """Plan lines for ``query`` as the database would run it."""
+    dialect = db.engine.dialect.name
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+
+    def add_prefix(conn, cursor, statement, parameters, context, executemany):
+        return prefix + statement, parameters
+
+    with db.engine.connect() as conn:
+        if dialect == 'postgresql':
+            # Tables are small outside production; only report scans no index could avoid
+            conn.exec_driver_sql('SET enable_seqscan = off')
+        event.listen(conn, 'before_cursor_execute', add_prefix, retval=True)
+        rows = conn.execute(query).all()
+        conn.rollback()
+    if dialect == 'sqlite':
+        return [row[3] for row in rows]
+    return [row[0] for row in rows]
+
+
+def full_scans(plan):
+    if db.engine.dialect.name != 'sqlite':
+        return [line for line in plan if POSTGRES_FULL_SCAN_RE.search(line)]
+    scans = [line for line in plan if SQLITE_FULL_SCAN_RE.search(line.strip())]
+    if scans:
+        scans += [line for line in plan if SQLITE_TEMP_BTREE_RE.search(line.strip())]
+    return scans
+
+
+def check_plans():
+    """Explain every checked search; returns [(name, plan, full scan lines)]."""
+    results = []
+    for name, args in CHECKED_SEARCHES:
+        params = SearchParams(MultiDict(args))
+        matches = text_matches(params.query) if params.query else None
+        after = (datetime.utcnow(), 2 ** 31 - 1) if params.cursor is not None else None
+        ids_query, count_query = sql_queries(params, matches, after)
+        queries = [(name, ids_query.limit(params.per_page + 1))]
+        if params.cursor is None:
+            queries.append((f'{name} count', count_query))
+        for label, query in queries:
+            plan = explain(query)
+            results.append((label, plan, full_scans(plan)))
+    return results
+
+
+@app.cli.command("db-check-plans")
+@click.option('--verbose', is_flag=True, help='Print every plan, not just failures.')
+def db_check_plans(verbose):
+    """Fail if a search query plan scans a whole lecture or association table."""
+    failures = 0
+    for name, plan, scans in check_plans():
+        if scans:
+            failures += 1
+        if scans or verbose:
+            print(f"{'FULL SCAN' if scans else 'ok'}\t{name}")
+            for line in plan:
+                print(f"\t{line}")
+    if failures:
+        raise click.ClickException(f"{failures} search queries scan whole tables")
+    print("No full table scans in search query plans")
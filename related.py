@@ -0,0 +1,472 @@
+import os
+import math
+import time
+import heapq
+import logging
+import threading
+from collections import defaultdict
+import click
+import numpy as np
+from scipy import sparse
+from app import app, db
+from models import (Lecture, DataVersion, RelatedLecture, RelatedVector, RelatedFeature,
+                    lecture_topic, lecture_tag)
+from search_index import TOKEN_RE
+from versions import CATALOG, RELATED_REBUILD, catalog_changed
+
+# Related lectures are the nearest neighbours by cosine similarity of sparse
+# feature vectors over topics, tags, title words and rank. Lists are computed
+# ahead of time into the related_lecture table, so serving one is a primary
+# key range read. The vectors and feature document counts are stored too, so
+# an admin edit only reloads the lectures that share a feature with it.
+TOPIC_WEIGHT = 1.0
+TAG_WEIGHT = 1.5
+TITLE_WEIGHT = 1.0
+RANK_WEIGHT = 2.0
+# Adjacent ranks share a feature at this fraction of RANK_WEIGHT, so 5k is close to 4k and 6k
+RANK_SPREAD = 0.5
+# Shorter title words ("of", "vs", move numbers) say nothing about the content
+MIN_TOKEN_CHARS = 3
+# Longer words are cut to fit RelatedVector.feature
+MAX_TOKEN_CHARS = 96
+# Every stored lecture has this zero-weight feature, so its document count is the lecture count
+DOCUMENTS = '*'
+# Dense cells per block of the vectorized product, which bounds its memory
+CHUNK_CELLS = 4_000_000
+# Features on more than this fraction of lectures (ranks, common topics) fill
+# most of every block, so they are multiplied as a dense matrix of at most
+# DENSE_CELLS floats instead of through scipy's sparse product
+DENSE_FRACTION = 0.01
+DENSE_CELLS = 16_000_000
+# Lecture ids or features per IN (...)
+ID_BATCH = 500
+# A failed incremental update is retried after this long
+RETRY_SECONDS = 30
+
+
+def _title_tokens(title):
+    return {token[:MAX_TOKEN_CHARS] for token in TOKEN_RE.findall(title.casefold())
+            if len(token) >= MIN_TOKEN_CHARS and not token.isdigit()}
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_BATCH):
+        yield ids[start:start + ID_BATCH]
+
+
+def _raw_features(lecture_ids=None):
+    """{lecture id: {feature: weight before idf}} for every lecture, or only ``lecture_ids``."""
+    raw = {}
+    for batch in _batches(lecture_ids) if lecture_ids is not None else [None]:
+        def scoped(query, column):
+            return query if batch is None else query.where(column.in_(batch))
+
+        for lecture_id, title, rank_id in db.session.execute(
+                scoped(db.select(Lecture.id, Lecture.title, Lecture.rank_id), Lecture.id)):
+            features = {f'w:{token}': TITLE_WEIGHT for token in _title_tokens(title or '')}
+            if rank_id is not None:
+                features[f'r:{rank_id - 1}'] = RANK_WEIGHT * RANK_SPREAD
+                features[f'r:{rank_id + 1}'] = RANK_WEIGHT * RANK_SPREAD
+                features[f'r:{rank_id}'] = RANK_WEIGHT
+            raw[lecture_id] = features
+        for prefix, weight, table, column in (('t', TOPIC_WEIGHT, lecture_topic, 'topic_id'),
+                                              ('g', TAG_WEIGHT, lecture_tag, 'tag_id')):
+            for lecture_id, item_id in db.session.execute(
+                    scoped(db.select(table.c.lecture_id, table.c[column]), table.c.lecture_id)):
+                if lecture_id in raw:
+                    raw[lecture_id][f'{prefix}:{item_id}'] = weight
+    return raw
+
+
+def _weigh(features, documents):
+    """L2-normalized [(feature, weight)] for one lecture.
+
+    Topic, tag and title word weights are scaled by inverse document
+    frequency, so sharing a rare tag counts for more than sharing the most
+    common topic. Rank features are not, since every lecture has one.
+    """
+    total = documents[DOCUMENTS]
+    weighted = [(feature, weight if feature.startswith('r:')
+                 else weight * math.log(1 + total / documents[feature]))
+                for feature, weight in features.items()]
+    norm = math.sqrt(sum(weight * weight for feature, weight in weighted)) or 1.0
+    return [(feature, weight / norm) for feature, weight in weighted]
+
+
+def _best(scored, k):
+    # Ties go to the newer (higher) id so equal neighbours do not shuffle between runs
+    return [(other_id, score) for other_id, score
+            in heapq.nlargest(k, scored, key=lambda item: (item[1], item[0])) if score > 0]
+
+
+def _all_top_k(vectors, k):
+    """(lecture id, [(related id, score), ...]) for every lecture in ``vectors``.
+
+    X @ X.T in row blocks: each block of scores is dense, so its height
+    shrinks as the catalog grows to keep CHUNK_CELLS floats in memory. The
+    common feature columns go through a dense BLAS product and the rest
+    through a sparse one, which keeps the sparse result small.
+    """
+    ids = sorted(vectors)
+    columns = {}
+    data, indices, indptr = [], [], [0]
+    for lecture_id in ids:
+        for feature, weight in vectors[lecture_id]:
+            indices.append(columns.setdefault(feature, len(columns)))
+            data.append(weight)
+        indptr.append(len(indices))
+    n = len(ids)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [(lecture_id, []) for lecture_id in ids]
+    matrix = sparse.csr_matrix((np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32),
+                                np.array(indptr, dtype=np.int64)), shape=(n, max(len(columns), 1)))
+    frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    common = np.argsort(-frequency, kind='stable')[:max(1, DENSE_CELLS // n)]
+    common = common[frequency[common] > n * DENSE_FRACTION]
+    rare = np.setdiff1d(np.arange(matrix.shape[1]), common)
+    dense = matrix[:, common].toarray()
+    dense_transposed = np.ascontiguousarray(dense.T)
+    matrix = matrix[:, rare].tocsr()
+    transposed = matrix.T.tocsc()
+    id_array = np.array(ids, dtype=np.int64)
+    block_rows = max(1, CHUNK_CELLS // n)
+    results = []
+    for start in range(0, n, block_rows):
+        block = (matrix[start:start + block_rows] @ transposed).toarray()
+        block += dense[start:start + block_rows] @ dense_transposed
+        local = np.arange(block.shape[0])
+        block[local, local + start] = 0.0
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for row in local:
+            results.append((int(id_array[start + row]),
+                            [(int(id_array[column]), float(score))
+                             for column, score in zip(top[row], top_scores[row]) if score > 0]))
+    return results
+
+
+def _scores(vector, postings, lecture_id):
+    """Similarity of one lecture's vector to every other stored lecture sharing a feature with it."""
+    totals = defaultdict(float)
+    for feature, weight in vector:
+        for other_id, other_weight in postings.get(feature, ()):
+            totals[other_id] += weight * other_weight
+    totals.pop(lecture_id, None)
+    return totals
+
+
+def _load_postings(features, postings):
+    """Add the stored (lecture id, weight) lists of ``features`` to ``postings``."""
+    missing = [feature for feature in features if feature not in postings and feature != DOCUMENTS]
+    for feature in missing:
+        postings[feature] = []
+    for batch in _batches(missing):
+        for feature, lecture_id, weight in db.session.execute(
+                db.select(RelatedVector.feature, RelatedVector.lecture_id, RelatedVector.weight)
+                .where(RelatedVector.feature.in_(batch))):
+            postings[feature].append((lecture_id, weight))
+
+
+def _load_vectors(lecture_ids):
+    vectors = defaultdict(list)
+    for batch in _batches(lecture_ids):
+        for lecture_id, feature, weight in db.session.execute(
+                db.select(RelatedVector.lecture_id, RelatedVector.feature, RelatedVector.weight)
+                .where(RelatedVector.lecture_id.in_(batch), RelatedVector.feature != DOCUMENTS)):
+            vectors[lecture_id].append((feature, weight))
+    return vectors
+
+
+def _load_lists(lecture_ids):
+    lists = defaultdict(dict)
+    for batch in _batches(lecture_ids):
+        for lecture_id, related_id, score in db.session.execute(
+                db.select(RelatedLecture.lecture_id, RelatedLecture.related_id, RelatedLecture.score)
+                .where(RelatedLecture.lecture_id.in_(batch))):
+            lists[lecture_id][related_id] = score
+    return lists
+
+
+def _replace(table, key, rows, clear=None):
+    """Delete the rows of ``clear`` (all of them when None) and insert ``rows``. The caller commits."""
+    if clear is None:
+        db.session.execute(table.delete())
+    for batch in _batches(clear or ()):
+        db.session.execute(table.delete().where(table.c[key].in_(batch)))
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+def _write_lists(lists, clear=None):
+    _replace(RelatedLecture.__table__, 'lecture_id',
+             [{'lecture_id': lecture_id, 'related_id': related_id, 'score': score}
+              for lecture_id, related in lists.items() for related_id, score in related], clear)
+
+
+def _write_vectors(vectors, clear=None):
+    _replace(RelatedVector.__table__, 'lecture_id',
+             [{'lecture_id': lecture_id, 'feature': feature, 'weight': weight}
+              for lecture_id, vector in vectors.items()
+              for feature, weight in vector + [(DOCUMENTS, 0.0)]], clear)
+
+
+def _counter(name):
+    # Read fresh: the per-request copy in versions.py would hide changes made during a rebuild
+    return db.session.execute(db.select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+
+
+def request_rebuild(version):
+    """Ask the job workers for a full rebuild covering catalog ``version``. Commits."""
+    db.session.execute(
+        db.update(DataVersion).where(DataVersion.name == RELATED_REBUILD, DataVersion.version < version)
+        .values(version=version)
+    )
+    db.session.commit()
+
+
+def rebuild_related(k=None):
+    """Recompute every lecture's list and vector and the feature counts. Returns the number of lectures."""
+    k = k or app.config['RELATED_COUNT']
+    requested = _counter(RELATED_REBUILD)
+    started = _counter(CATALOG)
+    raw = _raw_features()
+    documents = defaultdict(int)
+    for features in raw.values():
+        for feature in features:
+            documents[feature] += 1
+    documents[DOCUMENTS] = len(raw)
+    vectors = {lecture_id: _weigh(features, documents) for lecture_id, features in raw.items()}
+
+    _write_lists(dict(_all_top_k(vectors, k)))
+    _write_vectors(vectors)
+    _replace(RelatedFeature.__table__, 'feature',
+             [{'feature': feature, 'documents': count} for feature, count in documents.items()])
+    # Catalog writes made while this ran may be missing, so they get another rebuild
+    latest = _counter(CATALOG)
+    db.session.execute(
+        db.update(DataVersion).where(DataVersion.name == RELATED_REBUILD, DataVersion.version == requested)
+        .values(version=0 if latest == started else latest)
+    )
+    db.session.commit()
+    return len(vectors)
+
+
+def rebuild_if_requested():
+    """Run a full rebuild if a catalog change asked for one. Returns the number of lectures or None."""
+    if not _counter(RELATED_REBUILD):
+        db.session.rollback()
+        return None
+    return rebuild_related()
+
+
+def _apply_document_counts(deltas):
+    """Add ``deltas`` to the stored feature counts. The caller commits."""
+    for feature, delta in deltas.items():
+        if not delta:
+            continue
+        updated = db.session.execute(
+            db.update(RelatedFeature).where(RelatedFeature.feature == feature)
+            .values(documents=RelatedFeature.documents + delta)
+        ).rowcount
+        if not updated and delta > 0:
+            db.session.execute(db.insert(RelatedFeature).values(feature=feature, documents=delta))
+    for batch in _batches(feature for feature, delta in deltas.items() if delta < 0):
+        db.session.execute(db.delete(RelatedFeature).where(
+            RelatedFeature.feature.in_(batch), RelatedFeature.documents <= 0))
+
+
+def _load_document_counts(features):
+    documents = {}
+    for batch in _batches(features):
+        documents.update(db.session.execute(
+            db.select(RelatedFeature.feature, RelatedFeature.documents).where(RelatedFeature.feature.in_(batch))
+        ).all())
+    return documents
+
+
+def update_related(lecture_ids, k=None):
+    """Refresh the lists affected by writes to ``lecture_ids``.
+
+    Only the changed lectures and the stored vectors sharing a feature with
+    them are read. The changed lectures get new vectors and lists, and the
+    feature counts move by their difference. A list holding a changed
+    lecture takes its new score, unless the list is full and the score fell
+    below its lowest entry (or the lecture is gone); then that list is
+    rescored from its own postings. Any other lecture can only change by
+    taking a changed lecture in; similarity is symmetric, so the changed
+    lecture's own scores say which lists it now beats the lowest entry of.
+    Idf weights of unchanged lectures drift a little until the next full rebuild.
+    Returns the number of lists rewritten.
+    """
+    k = k or app.config['RELATED_COUNT']
+    changed = set(lecture_ids)
+    if not changed:
+        return 0
+    if db.session.get(RelatedFeature, DOCUMENTS) is None:
+        # Nothing stored to update yet; the job worker builds it all first
+        request_rebuild(_counter(CATALOG))
+        return 0
+
+    raw = _raw_features(changed)
+    old = defaultdict(set)
+    for batch in _batches(changed):
+        for lecture_id, feature in db.session.execute(
+                db.select(RelatedVector.lecture_id, RelatedVector.feature)
+                .where(RelatedVector.lecture_id.in_(batch))):
+            old[lecture_id].add(feature)
+    deltas = defaultdict(int)
+    for lecture_id in changed:
+        new = set(raw[lecture_id]) | {DOCUMENTS} if lecture_id in raw else set()
+        for feature in new - old[lecture_id]:
+            deltas[feature] += 1
+        for feature in old[lecture_id] - new:
+            deltas[feature] -= 1
+    _apply_document_counts(deltas)
+    documents = _load_document_counts({DOCUMENTS}.union(*raw.values()))
+    vectors = {lecture_id: _weigh(features, documents) for lecture_id, features in raw.items()}
+    _write_vectors(vectors, clear=changed)
+
+    postings = {}
+    _load_postings({feature for vector in vectors.values() for feature, weight in vector}, postings)
+    scores = {lecture_id: _scores(vector, postings, lecture_id) for lecture_id, vector in vectors.items()}
+    lists = {lecture_id: _best(totals.items(), k) for lecture_id, totals in scores.items()}
+
+    # Lists holding a changed lecture, and lists a changed lecture may now enter
+    holding = defaultdict(set)
+    for batch in _batches(changed):
+        for lecture_id, related_id in db.session.execute(
+                db.select(RelatedLecture.lecture_id, RelatedLecture.related_id)
+                .where(RelatedLecture.related_id.in_(batch))):
+            if lecture_id not in changed:
+                holding[lecture_id].add(related_id)
+    entering = {other_id for totals in scores.values() for other_id in totals} - changed - set(holding)
+    for batch in _batches(entering):
+        for lecture_id, count, lowest in db.session.execute(
+                db.select(RelatedLecture.lecture_id, db.func.count(), db.func.min(RelatedLecture.score))
+                .where(RelatedLecture.lecture_id.in_(batch)).group_by(RelatedLecture.lecture_id)):
+            if count >= k and all(totals.get(lecture_id, 0.0) <= lowest for totals in scores.values()):
+                entering.discard(lecture_id)
+
+    rescore = set()
+    current = _load_lists(set(holding) | entering)
+    for lecture_id in set(holding) | entering:
+        entries = current[lecture_id]
+        full = len(entries) >= k
+        lowest = min(entries.values(), default=0.0)
+        for changed_id in changed:
+            score = scores[changed_id].get(lecture_id, 0.0) if changed_id in scores else 0.0
+            if changed_id in holding.get(lecture_id, ()):
+                if full and score < lowest:
+                    rescore.add(lecture_id)
+                    break
+                entries[changed_id] = score
+            elif score > 0 and (not full or score > lowest):
+                entries[changed_id] = score
+        else:
+            lists[lecture_id] = _best(entries.items(), k)
+
+    own = _load_vectors(rescore)
+    _load_postings({feature for vector in own.values() for feature, weight in vector}, postings)
+    for lecture_id in rescore:
+        lists[lecture_id] = _best(_scores(own[lecture_id], postings, lecture_id).items(), k)
+
+    _write_lists(lists, clear=changed | set(lists))
+    db.session.commit()
+    return len(lists)
+
+
+def related_ids(lecture_id, limit):
+    """Stored neighbours of ``lecture_id``, best first."""
+    return db.session.execute(
+        db.select(RelatedLecture.related_id)
+        .where(RelatedLecture.lecture_id == lecture_id)
+        .order_by(RelatedLecture.score.desc(), RelatedLecture.related_id.desc())
+        .limit(limit)
+    ).scalars().all()
+
+
+class RelatedUpdater:
+    """Applies catalog writes to the related lists on a background thread, once per process.
+
+    Writes naming their lectures are queued for update_related, and queued
+    again if it fails. Any other catalog change (imports, restores) only
+    records a rebuild request, which the next idle job worker picks up, so a
+    full rebuild never runs inside a request or the signal handler.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+        self.pending = set()
+
+    def on_catalog_changed(self, sender, version, lecture_ids=None, **extra):
+        if not app.config['RELATED_AUTO']:
+            return
+        if lecture_ids is None:
+            try:
+                request_rebuild(version)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Error requesting a related lectures rebuild: {str(e)}")
+            return
+        with self.lock:
+            self.pending.update(lecture_ids)
+            if not self.pending:
+                return
+        self.ensure_started()
+        self.wakeup.set()
+
+    def ensure_started(self):
+        # Threads do not survive a fork, so a forked worker process starts its own
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.wakeup = threading.Event()
+            threading.Thread(target=self.loop, name='related-updater', daemon=True).start()
+
+    def loop(self):
+        retry = None
+        while True:
+            self.wakeup.wait(retry)
+            self.wakeup.clear()
+            with self.lock:
+                pending, self.pending = self.pending, set()
+            if not pending:
+                retry = None
+                continue
+            try:
+                with app.app_context():
+                    update_related(pending)
+                retry = None
+            except Exception as e:
+                logging.error(f"Error updating related lectures: {str(e)}")
+                # Retry later together with anything queued meanwhile
+                with self.lock:
+                    self.pending |= pending
+                retry = RETRY_SECONDS
+
+
+updater = RelatedUpdater()
+catalog_changed.connect(updater.on_catalog_changed)
+
+
+@app.cli.command("related-rebuild")
+@click.option('--lecture', 'lecture_ids', type=int, multiple=True,
+              help='Only refresh the lists affected by these lectures.')
+def related_rebuild(lecture_ids):
+    """Recompute the related lectures lists."""
+    started = time.perf_counter()
+    if lecture_ids:
+        count = update_related(lecture_ids)
+    else:
+        count = rebuild_related()
+    print(f"Wrote related lists for {count} lectures in {time.perf_counter() - started:.2f}s")
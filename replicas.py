@@ -0,0 +1,154 @@
+import time
+import logging
+import threading
+import itertools
+import sqlalchemy as sa
+from flask import g, request, session, has_request_context
+from flask_sqlalchemy.session import Session
+import storage
+
+# Optional read replicas for the public read endpoints. Imported by app.py
+# before the app exists (db needs RoutingSession), so hooks are installed
+# by init_replicas() instead of at import time.
+
+# Endpoints whose GET/HEAD requests may be answered from a replica
+READ_ENDPOINTS = {'home', 'search', 'api_search', 'api_facets', 'api_suggest', 'api_related'}
+
+# Session key holding the time until which this client reads from the primary
+PRIMARY_UNTIL = '_primary_until'
+
+# Cheap query that also fails on a replica that has no schema yet
+HEALTH_CHECK_SQL = 'SELECT 1 FROM data_version LIMIT 1'
+
+
+class ReplicaSet:
+    """Replica engines picked round-robin, skipping ones that failed a recent health check."""
+
+    def __init__(self):
+        self.engines = []
+        self.health_interval = 10
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.checked_at = {}
+        self.down_until = {}
+
+    def configure(self, engines, health_interval):
+        self.engines = list(engines)
+        self.health_interval = health_interval
+        self.checked_at.clear()
+        self.down_until.clear()
+
+    def choose(self):
+        """The next healthy replica engine, or None to use the primary."""
+        if not self.engines:
+            return None
+        start = next(self.counter)
+        for offset in range(len(self.engines)):
+            engine = self.engines[(start + offset) % len(self.engines)]
+            if self.healthy(engine):
+                return engine
+        return None
+
+    def healthy(self, engine):
+        now = time.monotonic()
+        with self.lock:
+            if self.down_until.get(engine, 0) > now:
+                return False
+            if now - self.checked_at.get(engine, float('-inf')) < self.health_interval:
+                return True
+            self.checked_at[engine] = now
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql(HEALTH_CHECK_SQL)
+        except Exception as e:
+            self.mark_down(engine)
+            logging.error(f"Read replica {engine.url!r} failed its health check: {str(e)}")
+            return False
+        return True
+
+    def mark_down(self, engine):
+        with self.lock:
+            self.down_until[engine] = time.monotonic() + self.health_interval
+
+    def status(self):
+        now = time.monotonic()
+        with self.lock:
+            return [{'url': repr(engine.url), 'healthy': self.down_until.get(engine, 0) <= now}
+                    for engine in self.engines]
+
+
+replicas = ReplicaSet()
+
+
+def _is_plain_read(clause):
+    # Only SELECTs known not to lock; text(), DML and anything unrecognised may write
+    return (isinstance(clause, (sa.sql.Select, sa.sql.CompoundSelect))
+            and clause._for_update_arg is None)
+
+
+class RoutingSession(Session):
+    """Sends the reads of a replica-routed request to its replica.
+
+    Only plain SELECTs outside a flush go to the replica. Flushes, DML,
+    locking SELECTs and text() statements go to the primary, and once a
+    request has used the primary it stays there.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('_replica') is not None:
+            if not self._flushing and _is_plain_read(clause):
+                return g._replica
+            g._replica = None
+            g._db_wrote = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reads_from_primary(app):
+    # Only clients holding a session cookie can be inside a read-your-writes window
+    if app.config['SESSION_COOKIE_NAME'] not in request.cookies:
+        return False
+    return session.get(PRIMARY_UNTIL, 0) > time.time()
+
+
+def init_replicas(app):
+    """Create replica engines from READ_REPLICA_URLS and install the routing hooks."""
+    engines = []
+    for url in app.config['READ_REPLICA_URLS']:
+        config = dict(app.config, SQLALCHEMY_DATABASE_URI=url)
+        if config['STORAGE_PROFILE'] != storage.DEFAULT:
+            config['STORAGE_PROFILE'] = storage.profile_for(url)
+        engine = sa.create_engine(url, **storage.engine_options(config))
+        try:
+            storage.init_storage(config, engine)
+        except Exception as e:
+            # Start anyway; the health check keeps it out of rotation until it answers
+            logging.error(f"Read replica {engine.url!r} is unavailable: {str(e)}")
+        engines.append(engine)
+    replicas.configure(engines, app.config['REPLICA_HEALTH_INTERVAL'])
+    if not engines:
+        return
+
+    @app.before_request
+    def route_reads():
+        g._replica = None
+        if request.method not in ('GET', 'HEAD') or request.endpoint not in READ_ENDPOINTS:
+            return
+        if _reads_from_primary(app):
+            return
+        g._replica = replicas.choose()
+
+    @app.after_request
+    def remember_writes(response):
+        # Admin writes are POSTs; the window lets that client see its change before replicas catch up
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') or g.get('_db_wrote'):
+            session[PRIMARY_UNTIL] = time.time() + app.config['READ_YOUR_WRITES_SECONDS']
+        # Views turn database errors into a 500 themselves, so teardown never sees those
+        if response.status_code >= 500 and g.get('_replica') is not None:
+            replicas.mark_down(g._replica)
+        return response
+
+    @app.teardown_request
+    def drop_failed_replica(exc):
+        # A replica that errors mid-request sits out until its next health check
+        if exc is not None and g.get('_replica') is not None:
+            replicas.mark_down(g._replica)
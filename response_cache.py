@@ -0,0 +1,176 @@
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, make_response
+from flask_login import current_user
+from app import app
+from versions import get_version
+
+
+class MemoryCache:
+    """Bounded LRU cache local to one worker process."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteCache:
+    """LRU cache in a local SQLite file, shared by every worker on the host.
+
+    Entries are stored as plain columns, never pickled, so whoever can write
+    the file can at worst change a cached page, not run code in the workers.
+    """
+
+    PRUNE_EVERY = 64
+    TOUCH_AFTER = 30
+    COLUMNS = ('body', 'status', 'content_type', 'etag')
+
+    def __init__(self, path, max_entries=4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.writes = 0
+        conn = self._connect()
+        # Earlier versions kept pickled entries in response_cache; never read them
+        conn.execute("DROP TABLE IF EXISTS response_cache")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_entries ("
+            "key TEXT PRIMARY KEY, body BLOB NOT NULL, status INTEGER NOT NULL, "
+            "content_type TEXT NOT NULL, etag TEXT NOT NULL, used REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        # One connection per thread and per process, never shared across a fork
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT body, status, content_type, etag, used FROM response_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[-1] > self.TOUCH_AFTER:
+                conn.execute("UPDATE response_entries SET used = ? WHERE key = ?", (now, key))
+            return dict(zip(self.COLUMNS, row))
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache read failed: {str(e)}")
+            return None
+
+    def set(self, key, entry):
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO response_entries (key, body, status, content_type, etag, used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, bytes(entry['body']), int(entry['status']), str(entry['content_type']),
+                 str(entry['etag']), time.time())
+            )
+            self.writes += 1
+            if self.writes % self.PRUNE_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM response_entries WHERE key NOT IN "
+                    "(SELECT key FROM response_entries ORDER BY used DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache write failed: {str(e)}")
+
+    def clear(self):
+        self._connect().execute("DELETE FROM response_entries")
+
+
+def create_cache(url, max_entries):
+    """Build a cache backend from a RESPONSE_CACHE setting."""
+    if not url or url == 'memory':
+        return MemoryCache(max_entries)
+    if url == 'none':
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(url[len('sqlite:///'):], max_entries)
+    raise ValueError(f'Unknown response cache backend: {url}')
+
+
+cache = create_cache(app.config['RESPONSE_CACHE'], app.config['RESPONSE_CACHE_SIZE'])
+
+
+def cache_key(version):
+    """Route plus normalized query args, scoped to a catalog version."""
+    args = sorted((key, sorted(request.args.getlist(key))) for key in request.args)
+    return repr((request.endpoint, version, args))
+
+
+def _cacheable():
+    # Logged-in pages and pages carrying flash messages are per-user
+    return (cache is not None and request.method == 'GET'
+            and not current_user.is_authenticated and '_flashes' not in session)
+
+
+def cached_response(view):
+    """Serve a public GET view from the response cache with a strong ETag.
+
+    Entries are keyed on the catalog version, so any admin write makes old
+    entries unreachable instead of having to delete them.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _cacheable():
+            return view(*args, **kwargs)
+
+        key = cache_key(get_version())
+        entry = cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = {
+                'body': body,
+                'status': response.status_code,
+                'content_type': response.content_type,
+                'etag': hashlib.blake2b(body, digest_size=16).hexdigest()
+            }
+            cache.set(key, entry)
+
+        response = make_response(entry['body'], entry['status'])
+        response.content_type = entry['content_type']
+        response.set_etag(entry['etag'])
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+    return wrapper
@@ -1,14 +1,25 @@
-from flask import render_template, redirect, url_for, request, jsonify, flash
+from flask import render_template, redirect, url_for, request, jsonify, flash, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app, db
 from models import User, Lecture, Topic, Tag, Rank
-from forms import LoginForm, LectureForm, MetadataForm
-from utils import get_youtube_video_info
-import logging
-import json
+from forms import LoginForm, LectureForm, BulkLectureForm, MetadataForm
+from utils import extract_video_id, cached_video, placeholder_thumbnail, youtube_stats
+from jobs import enqueue_fetch, workers, job_status
+from ingest import bulk_add_lectures
+from thumbnails import thumbnail_urls
+from search_engine import SearchParams, SearchError, run_search, facet_counts, hydrate_lectures
+from suggest_index import suggest_index
+from related import related_ids
+from versions import commit_catalog_change
+from response_cache import cached_response
+from metadata_cache import metadata
+from data_transfer import iter_export_json, iter_export_ndjson, gzip_chunks, buffered, import_file
+from snapshots import SnapshotError, list_snapshots, take_snapshot, restore_snapshot, delete_snapshot, truncate_catalog
 from datetime import datetime
+import logging
 
 @app.route('/')
+@cached_response
 def home():
     # Optimize query by eagerly loading relationships
     lectures = Lecture.query.options(
@@ -16,108 +27,65 @@ def home():
         db.joinedload(Lecture.tags),
         db.joinedload(Lecture.rank)
     ).order_by(Lecture.publish_date.desc()).limit(6).all()
-    return render_template('home.html', lectures=lectures)
+    thumbnails = thumbnail_urls([lecture.youtube_id for lecture in lectures])
+    return render_template('home.html', lectures=lectures, thumbnails=thumbnails)
 
 @app.route('/search')
+@cached_response
 def search():
     # Get only necessary metadata
-    topics = Topic.query.all()
-    tags = Tag.query.all()
-    ranks = Rank.query.all()
-    return render_template('search.html', topics=topics, tags=tags, ranks=ranks)
+    return render_template('search.html',
+                         topics=metadata.all('topics'),
+                         tags=metadata.all('tags'),
+                         ranks=metadata.all('ranks'))
 
 @app.route('/api/search')
+@cached_response
 def api_search():
     try:
-        # Validate and sanitize input parameters
-        try:
-            page = max(1, request.args.get('page', 1, type=int))
-            per_page = min(50, request.args.get('per_page', 12, type=int))
-        except (ValueError, TypeError):
-            page = 1
-            per_page = 12
-            
-        query = request.args.get('q', '')
-        topic_ids = request.args.getlist('topics[]')
-        tag_ids = request.args.getlist('tags[]')
-        rank_id = request.args.get('rank')
-        sort_by = request.args.get('sort', 'date')
-        if sort_by not in ['date', 'rank']:
-            sort_by = 'date'
-
-        # Build efficient query with eager loading
-        lectures_query = Lecture.query.options(
-            db.joinedload(Lecture.topics),
-            db.joinedload(Lecture.tags)
-        )
-
-        # Apply filters
-        if query:
-            lectures_query = lectures_query.filter(Lecture.title.ilike(f'%{query}%'))
-
-        # More efficient topic filtering
-        if topic_ids and any(topic_ids):
-            # Filter only non-empty topic IDs
-            valid_topic_ids = [tid for tid in topic_ids if tid]
-            if valid_topic_ids:
-                lectures_query = lectures_query.join(Lecture.topics).filter(Topic.id.in_(valid_topic_ids))
-
-        # More efficient tag filtering
-        if tag_ids and any(tag_ids):
-            # Filter only non-empty tag IDs
-            valid_tag_ids = [tid for tid in tag_ids if tid]
-            if valid_tag_ids:
-                lectures_query = lectures_query.join(Lecture.tags).filter(Tag.id.in_(valid_tag_ids))
-
-        if rank_id:
-            lectures_query = lectures_query.filter_by(rank_id=rank_id)
-
-        # Apply sorting
-        if sort_by == 'date':
-            lectures_query = lectures_query.order_by(Lecture.publish_date.desc())
-        elif sort_by == 'rank':
-            lectures_query = lectures_query.order_by(Lecture.rank_id)
-
-        # Add pagination
-        pagination = lectures_query.paginate(page=page, per_page=per_page, error_out=False)
-        lectures = pagination.items
-
-        # Cache rank lookups
-        rank_cache = {}
-        
-        # Process results
-        lecture_data = []
-        for l in lectures:
-            # Use cached rank lookup
-            if l.rank_id:
-                if l.rank_id not in rank_cache:
-                    rank = Rank.query.get(l.rank_id)
-                    rank_cache[l.rank_id] = rank.name if rank else None
-                rank_name = rank_cache[l.rank_id]
-            else:
-                rank_name = None
-                
-            lecture_data.append({
-                'id': l.id,
-                'title': l.title,
-                'youtube_id': l.youtube_id,
-                'thumbnail_url': l.thumbnail_url,
-                'publish_date': l.publish_date.isoformat(),
-                'topics': [t.name for t in l.topics],
-                'tags': [t.name for t in l.tags],
-                'rank': rank_name
-            })
-            
-        return jsonify({
-            'lectures': lecture_data,
-            'has_next': pagination.has_next,
-            'total_pages': pagination.pages,
-            'current_page': pagination.page
-        })
+        params = SearchParams(request.args)
+        return jsonify(run_search(params))
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error in api_search: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Not page-cached: the cache would look up the catalog version on every
+# keystroke, while the suggest index only re-checks it once a second
+@app.route('/api/suggest')
+def api_suggest():
+    try:
+        limit = request.args.get('limit', 8, type=int)
+        return jsonify({'suggestions': suggest_index.suggest(request.args.get('q', ''), limit)})
+    except Exception as e:
+        logging.error(f"Error in api_suggest: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Not page-cached: lists are refreshed in the background after the version bump,
+# so a cached response could pin the old list until the next write
+@app.route('/api/lecture/<int:lecture_id>/related')
+def api_related(lecture_id):
+    try:
+        limit = max(1, min(request.args.get('limit', app.config['RELATED_COUNT'], type=int),
+                           app.config['RELATED_COUNT']))
+        return jsonify({'lectures': hydrate_lectures(related_ids(lecture_id, limit))})
+    except Exception as e:
+        logging.error(f"Error in api_related: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/facets')
+@cached_response
+def api_facets():
+    try:
+        params = SearchParams(request.args)
+        return jsonify(facet_counts(params))
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in api_facets: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -142,18 +110,21 @@ def logout():
 @login_required
 def add_lecture():
     form = LectureForm()
-    form.topics.choices = [(t.id, t.name) for t in Topic.query.all()]
-    form.tags.choices = [(t.id, t.name) for t in Tag.query.all()]
-    form.rank.choices = [(r.id, r.name) for r in Rank.query.all()]
+    form.topics.choices = metadata.choices('topics')
+    form.tags.choices = metadata.choices('tags')
+    form.rank.choices = metadata.choices('ranks')
 
     if form.validate_on_submit():
         try:
-            video_info = get_youtube_video_info(form.youtube_url.data)
+            # Save right away; unless the video is already cached, the thumbnail
+            # and publish date are filled in by a background job
+            video_id = extract_video_id(form.youtube_url.data)
+            video_info = cached_video(video_id)
             lecture = Lecture(
                 title=form.title.data,
-                youtube_id=video_info['youtube_id'],
-                thumbnail_url=video_info['thumbnail_url'],
-                publish_date=video_info['publish_date']
+                youtube_id=video_id,
+                thumbnail_url=video_info['thumbnail_url'] if video_info else placeholder_thumbnail(video_id),
+                publish_date=video_info['publish_date'] if video_info else datetime.utcnow()
             )
             
             selected_topics = Topic.query.filter(Topic.id.in_(form.topics.data)).all()
@@ -165,8 +136,15 @@ def add_lecture():
             lecture.rank_id = selected_rank.id if selected_rank else None
 
             db.session.add(lecture)
-            db.session.commit()
-            flash('Lecture added successfully!')
+            db.session.flush()
+            if not video_info:
+                enqueue_fetch(lecture)
+            commit_catalog_change([lecture.id])
+            if video_info:
+                flash('Lecture added successfully!')
+            else:
+                workers.notify()
+                flash('Lecture added successfully! Video details are being fetched in the background.')
             return redirect(url_for('home'))
         except Exception as e:
             logging.error(f"Error adding lecture: {str(e)}")
@@ -174,27 +152,63 @@ def add_lecture():
 
     return render_template('admin/add_lecture.html', form=form)
 
+@app.route('/admin/lecture/bulk-add', methods=['GET', 'POST'])
+@login_required
+def bulk_add_lectures_route():
+    form = BulkLectureForm()
+    form.topics.choices = metadata.choices('topics')
+    form.tags.choices = metadata.choices('tags')
+    form.rank.choices = metadata.choices('ranks')
+
+    if form.validate_on_submit():
+        try:
+            # Titles, thumbnails and dates come from YouTube in batches of 50
+            report = bulk_add_lectures(
+                form.urls.data,
+                topic_ids=form.topics.data,
+                tag_ids=form.tags.data,
+                rank_id=form.rank.data[0] if form.rank.data else None
+            )
+            commit_catalog_change(report.added)
+            flash(report.summary())
+            if report.not_found or report.invalid:
+                flash('Skipped: ' + ', '.join(report.not_found + report.invalid))
+            return redirect(url_for('admin_panel'))
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error bulk adding lectures: {str(e)}")
+            flash(f'Error adding lectures: {str(e)}')
+
+    return render_template('admin/bulk_add.html', form=form)
+
 @app.route('/admin/lecture/edit/<int:lecture_id>', methods=['GET', 'POST'])
 @login_required
 def edit_lecture(lecture_id):
     lecture = Lecture.query.get_or_404(lecture_id)
     form = LectureForm()
-    form.topics.choices = [(t.id, t.name) for t in Topic.query.all()]
-    form.tags.choices = [(t.id, t.name) for t in Tag.query.all()]
-    form.rank.choices = [(r.id, r.name) for r in Rank.query.all()]
+    form.topics.choices = metadata.choices('topics')
+    form.tags.choices = metadata.choices('tags')
+    form.rank.choices = metadata.choices('ranks')
 
     if form.validate_on_submit():
         try:
+            # Only look the video up if the URL points at a different one
+            video_id = extract_video_id(form.youtube_url.data)
+            fetch_queued = False
+            if video_id != lecture.youtube_id:
+                video_info = cached_video(video_id)
+                lecture.youtube_id = video_id
+                if video_info:
+                    lecture.thumbnail_url = video_info['thumbnail_url']
+                    lecture.publish_date = video_info['publish_date']
+                else:
+                    lecture.thumbnail_url = placeholder_thumbnail(video_id)
+                    enqueue_fetch(lecture)
+                    fetch_queued = True
+
             # Update basic info
             lecture.title = form.title.data
 
-            # Only update YouTube info if URL changed
-            if form.youtube_url.data != f"https://youtu.be/{lecture.youtube_id}":
-                video_info = get_youtube_video_info(form.youtube_url.data)
-                lecture.youtube_id = video_info['youtube_id']
-                lecture.thumbnail_url = video_info['thumbnail_url']
-                lecture.publish_date = video_info['publish_date']
-
             # Update relationships
             selected_topics = Topic.query.filter(Topic.id.in_(form.topics.data)).all()
             selected_tags = Tag.query.filter(Tag.id.in_(form.tags.data)).all()
@@ -204,7 +218,9 @@ def edit_lecture(lecture_id):
             lecture.tags = selected_tags
             lecture.rank_id = selected_rank.id if selected_rank else None
 
-            db.session.commit()
+            commit_catalog_change([lecture.id])
+            if fetch_queued:
+                workers.notify()
             flash('Lecture updated successfully!')
             return redirect(url_for('home'))
         except Exception as e:
@@ -231,19 +247,19 @@ def manage_metadata():
         if 'add_topic' in request.form and topic_form.validate():
             topic = Topic(name=topic_form.name.data)
             db.session.add(topic)
-            db.session.commit()
+            commit_catalog_change([], metadata=True)
         elif 'add_tag' in request.form and tag_form.validate():
             tag = Tag(name=tag_form.name.data)
             db.session.add(tag)
-            db.session.commit()
+            commit_catalog_change([], metadata=True)
         elif 'add_rank' in request.form and rank_form.validate():
             rank = Rank(name=rank_form.name.data)
             db.session.add(rank)
-            db.session.commit()
+            commit_catalog_change([], metadata=True)
 
-    topics = Topic.query.all()
-    tags = Tag.query.all()
-    ranks = Rank.query.all()
+    topics = metadata.all('topics')
+    tags = metadata.all('tags')
+    ranks = metadata.all('ranks')
 
     return render_template('admin/manage_metadata.html',
                          topic_form=topic_form,
@@ -257,57 +273,22 @@ def manage_metadata():
 @login_required
 def export_data():
     try:
-        # Get all data
-        lectures = Lecture.query.all()
-        topics = Topic.query.all()
-        tags = Tag.query.all()
-        ranks = Rank.query.all()
-        
-        # Prepare data for export
-        export_data = {
-            'lectures': [],
-            'topics': [],
-            'tags': [],
-            'ranks': []
-        }
-        
-        # Add topics
-        for topic in topics:
-            export_data['topics'].append({
-                'id': topic.id,
-                'name': topic.name
-            })
-            
-        # Add tags
-        for tag in tags:
-            export_data['tags'].append({
-                'id': tag.id,
-                'name': tag.name
-            })
-            
-        # Add ranks
-        for rank in ranks:
-            export_data['ranks'].append({
-                'id': rank.id,
-                'name': rank.name
-            })
-            
-        # Add lectures
-        for lecture in lectures:
-            lecture_data = {
-                'id': lecture.id,
-                'title': lecture.title,
-                'youtube_id': lecture.youtube_id,
-                'thumbnail_url': lecture.thumbnail_url,
-                'publish_date': lecture.publish_date.isoformat(),
-                'rank_id': lecture.rank_id,
-                'topic_ids': [topic.id for topic in lecture.topics],
-                'tag_ids': [tag.id for tag in lecture.tags]
-            }
-            export_data['lectures'].append(lecture_data)
-        
-        # Return JSON file for download
-        return jsonify(export_data)
+        # Stream the export so memory stays flat however large the catalog is
+        if request.args.get('format') == 'ndjson':
+            chunks = iter_export_ndjson()
+            filename, mimetype = 'baduk_lectures_export.ndjson', 'application/x-ndjson'
+        else:
+            chunks = iter_export_json()
+            filename, mimetype = 'baduk_lectures_export.json', 'application/json'
+
+        chunks = buffered(chunks)
+        if request.args.get('gzip') in ['1', 'true']:
+            chunks = gzip_chunks(chunks)
+            filename, mimetype = filename + '.gz', 'application/gzip'
+
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
     except Exception as e:
         logging.error(f"Error exporting data: {str(e)}")
         flash('Error exporting data')
@@ -328,89 +309,12 @@ def import_data():
                 return redirect(request.url)
                 
             if file:
-                import_data = json.loads(file.read().decode('utf-8'))
-                
-                # Process topics
-                topic_id_map = {}
-                if 'topics' in import_data:
-                    for topic_data in import_data['topics']:
-                        # Check if topic already exists
-                        existing_topic = Topic.query.filter_by(name=topic_data['name']).first()
-                        if not existing_topic:
-                            new_topic = Topic(name=topic_data['name'])
-                            db.session.add(new_topic)
-                            db.session.flush()
-                            topic_id_map[topic_data['id']] = new_topic.id
-                        else:
-                            topic_id_map[topic_data['id']] = existing_topic.id
-                
-                # Process tags
-                tag_id_map = {}
-                if 'tags' in import_data:
-                    for tag_data in import_data['tags']:
-                        # Check if tag already exists
-                        existing_tag = Tag.query.filter_by(name=tag_data['name']).first()
-                        if not existing_tag:
-                            new_tag = Tag(name=tag_data['name'])
-                            db.session.add(new_tag)
-                            db.session.flush()
-                            tag_id_map[tag_data['id']] = new_tag.id
-                        else:
-                            tag_id_map[tag_data['id']] = existing_tag.id
-                
-                # Process ranks
-                rank_id_map = {}
-                if 'ranks' in import_data:
-                    for rank_data in import_data['ranks']:
-                        # Check if rank already exists
-                        existing_rank = Rank.query.filter_by(name=rank_data['name']).first()
-                        if not existing_rank:
-                            new_rank = Rank(name=rank_data['name'])
-                            db.session.add(new_rank)
-                            db.session.flush()
-                            rank_id_map[rank_data['id']] = new_rank.id
-                        else:
-                            rank_id_map[rank_data['id']] = existing_rank.id
-                
-                # Process lectures
-                if 'lectures' in import_data:
-                    for lecture_data in import_data['lectures']:
-                        # Check if lecture already exists by YouTube ID
-                        existing_lecture = Lecture.query.filter_by(youtube_id=lecture_data['youtube_id']).first()
-                        if not existing_lecture:
-                            new_lecture = Lecture(
-                                title=lecture_data['title'],
-                                youtube_id=lecture_data['youtube_id'],
-                                thumbnail_url=lecture_data['thumbnail_url'],
-                                publish_date=datetime.fromisoformat(lecture_data['publish_date'])
-                            )
-                            
-                            # Set rank
-                            if lecture_data.get('rank_id') and lecture_data['rank_id'] in rank_id_map:
-                                new_lecture.rank_id = rank_id_map[lecture_data['rank_id']]
-                            
-                            # Add topics
-                            if 'topic_ids' in lecture_data:
-                                for old_topic_id in lecture_data['topic_ids']:
-                                    if old_topic_id in topic_id_map:
-                                        topic = Topic.query.get(topic_id_map[old_topic_id])
-                                        if topic:
-                                            new_lecture.topics.append(topic)
-                            
-                            # Add tags
-                            if 'tag_ids' in lecture_data:
-                                for old_tag_id in lecture_data['tag_ids']:
-                                    if old_tag_id in tag_id_map:
-                                        tag = Tag.query.get(tag_id_map[old_tag_id])
-                                        if tag:
-                                            new_lecture.tags.append(tag)
-                            
-                            db.session.add(new_lecture)
-                
-                db.session.commit()
-                flash('Data imported successfully')
+                # Parse the upload incrementally and write it with set-based inserts
+                report = import_file(file.stream, file.filename)
+                commit_catalog_change(metadata=True)
+                flash(f'Data imported successfully: {report.summary()}')
                 return redirect(url_for('admin_panel'))
-                
+
         except Exception as e:
             db.session.rollback()
             logging.error(f"Error importing data: {str(e)}")
@@ -423,73 +327,66 @@ def import_data():
 @login_required
 def reset_data():
     try:
-        # Get all data first for backup
-        lectures = Lecture.query.all()
-        topics = Topic.query.all()
-        tags = Tag.query.all()
-        ranks = Rank.query.all()
-        
-        # Prepare data for export (same as in export_data)
-        export_data = {
-            'lectures': [],
-            'topics': [],
-            'tags': [],
-            'ranks': []
-        }
-        
-        # Add topics
-        for topic in topics:
-            export_data['topics'].append({
-                'id': topic.id,
-                'name': topic.name
-            })
-            
-        # Add tags
-        for tag in tags:
-            export_data['tags'].append({
-                'id': tag.id,
-                'name': tag.name
-            })
-            
-        # Add ranks
-        for rank in ranks:
-            export_data['ranks'].append({
-                'id': rank.id,
-                'name': rank.name
-            })
-            
-        # Add lectures
-        for lecture in lectures:
-            lecture_data = {
-                'id': lecture.id,
-                'title': lecture.title,
-                'youtube_id': lecture.youtube_id,
-                'thumbnail_url': lecture.thumbnail_url,
-                'publish_date': lecture.publish_date.isoformat(),
-                'rank_id': lecture.rank_id,
-                'topic_ids': [topic.id for topic in lecture.topics],
-                'tag_ids': [tag.id for tag in lecture.tags]
-            }
-            export_data['lectures'].append(lecture_data)
-        
-        # Clear database
-        # Use raw SQL for faster deletion of many records
-        db.session.execute(db.text("DELETE FROM lecture_topic"))
-        db.session.execute(db.text("DELETE FROM lecture_tag"))
-        db.session.execute(db.text("DELETE FROM lecture"))
-        db.session.execute(db.text("DELETE FROM topic"))
-        db.session.execute(db.text("DELETE FROM tag"))
-        db.session.execute(db.text("DELETE FROM rank"))
-        db.session.commit()
-        
-        flash('All data has been reset successfully')
-        # Return JSON for download
-        return jsonify(export_data)
+        # Snapshot first so the reset can be undone from the snapshots page
+        name = take_snapshot('reset')
+        truncate_catalog()
+        flash(f'All data has been reset successfully. Backup saved as snapshot {name}')
+        return jsonify({'snapshot': name})
+    except SnapshotError as e:
+        flash(f'Error resetting data: {str(e)}')
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         logging.error(f"Error resetting data: {str(e)}")
         flash(f'Error resetting data: {str(e)}')
-        return redirect(url_for('admin_panel'))
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/snapshots', methods=['GET', 'POST'])
+@login_required
+def manage_snapshots():
+    if request.method == 'POST':
+        try:
+            name = take_snapshot(request.form.get('label'))
+            flash(f'Snapshot {name} created')
+        except Exception as e:
+            logging.error(f"Error taking snapshot: {str(e)}")
+            flash(f'Error taking snapshot: {str(e)}')
+        return redirect(url_for('manage_snapshots'))
+
+    return render_template('admin/snapshots.html', snapshots=list_snapshots())
+
+@app.route('/admin/snapshots/<name>/restore', methods=['POST'])
+@login_required
+def restore_snapshot_route(name):
+    try:
+        restore_snapshot(name)
+        flash(f'Snapshot {name} restored successfully')
+    except SnapshotError as e:
+        flash(str(e))
+    except Exception as e:
+        logging.error(f"Error restoring snapshot: {str(e)}")
+        flash(f'Error restoring snapshot: {str(e)}')
+    return redirect(url_for('manage_snapshots'))
+
+@app.route('/admin/snapshots/<name>/delete', methods=['POST'])
+@login_required
+def delete_snapshot_route(name):
+    try:
+        delete_snapshot(name)
+        flash(f'Snapshot {name} deleted')
+    except SnapshotError as e:
+        flash(str(e))
+    return redirect(url_for('manage_snapshots'))
+
+@app.route('/admin/jobs')
+@login_required
+def ingest_job_status():
+    return jsonify(job_status())
+
+@app.route('/admin/youtube/stats')
+@login_required
+def youtube_client_stats():
+    return jsonify(youtube_stats.as_dict())
 
 @app.route('/admin')
 @login_required
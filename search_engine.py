@@ -0,0 +1,325 @@
+import math
+from app import app, db
+from models import Lecture, lecture_topic, lecture_tag
+from search_index import text_matches
+from pagination import KEYSET_SORTS, encode_cursor, decode_cursor, keyset_order, keyset_after
+from facet_index import facet_index, ids_to_bits, date_key
+from metadata_cache import metadata
+from thumbnails import thumbnail_urls
+
+
+class SearchError(ValueError):
+    """Invalid search parameters, reported to the client as a 400."""
+
+
+def _int_list(values):
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+class SearchParams:
+    """Validated /api/search query arguments."""
+
+    def __init__(self, args):
+        try:
+            self.page = max(1, args.get('page', 1, type=int))
+            self.per_page = max(1, min(50, args.get('per_page', 12, type=int)))
+        except (ValueError, TypeError):
+            self.page = 1
+            self.per_page = 12
+
+        self.query = args.get('q', '')
+        self.topic_ids = _int_list(args.getlist('topics[]'))
+        self.tag_ids = _int_list(args.getlist('tags[]'))
+        self.topic_match = 'all' if args.get('topic_match') == 'all' else 'any'
+        self.tag_match = 'all' if args.get('tag_match') == 'all' else 'any'
+        rank_ids = _int_list([args.get('rank')])
+        self.rank_id = rank_ids[0] if rank_ids else None
+
+        self.sort_by = args.get('sort')
+        if self.sort_by not in ['date', 'rank', 'relevance']:
+            # Text searches are ranked by relevance unless a sort is asked for
+            self.sort_by = 'relevance' if self.query else 'date'
+        # Passing cursor (even empty) switches to keyset pagination
+        self.cursor = args.get('cursor')
+        self.with_count = args.get('count', '1').lower() not in ['0', 'false', 'no']
+        self.facets = args.get('facets', '0').lower() in ['1', 'true', 'yes']
+
+        if self.cursor is not None and self.sort_by not in KEYSET_SORTS:
+            raise SearchError('Cursor pagination supports date and relevance sorting only')
+
+
+def run_search(params):
+    """Run a search and return the /api/search response payload."""
+    matches = text_matches(params.query) if params.query else None
+    if matches is None and params.sort_by == 'relevance':
+        # Nothing to rank by, so newest first; cursors carry and are checked against this effective sort
+        params.sort_by = 'date'
+
+    after = None
+    if params.cursor:
+        try:
+            after = decode_cursor(params.cursor, params.sort_by)
+        except ValueError as e:
+            raise SearchError(str(e))
+
+    # Phase one picks the page of ids, phase two loads only those rows
+    if app.config['FACET_INDEX']:
+        ids, sort_values, page_info = _index_search(params, matches, after)
+    else:
+        ids, sort_values, page_info = _sql_search(params, matches, after)
+
+    if params.cursor is not None:
+        next_cursor = None
+        if page_info['has_next'] and ids:
+            next_cursor = encode_cursor(params.sort_by, sort_values[ids[-1]], ids[-1])
+        page_info = {'has_next': page_info['has_next'], 'next_cursor': next_cursor}
+
+    payload = {'lectures': hydrate_lectures(ids), **page_info}
+    if params.facets:
+        # In index mode relevance sort values cover every text match, not just this page
+        text_ids = None
+        if app.config['FACET_INDEX'] and matches is not None:
+            text_ids = sort_values if params.sort_by == 'relevance' else None
+        payload['facets'] = facet_counts(params, matches, text_ids)
+    return payload
+
+
+def facet_counts(params, matches=None, text_ids=None):
+    """Lecture counts per topic, tag and rank for the search in ``params``.
+
+    Each facet ignores its own filter, so counts show what selecting a value
+    would return. Index mode does bitset ANDs; SQL mode runs one GROUP BY per
+    facet.
+    """
+    if params.query and matches is None and text_ids is None:
+        matches = text_matches(params.query)
+
+    if app.config['FACET_INDEX']:
+        facet_index.ensure_current()
+        text_bits = None
+        if matches is not None or text_ids is not None:
+            if text_ids is None:
+                text_ids = db.session.execute(db.select(matches.c.lecture_id)).scalars().all()
+            text_bits = ids_to_bits(text_ids)
+        counts = facet_index.counts(text_bits, params.topic_ids, params.tag_ids, params.rank_id,
+                                    params.topic_match, params.tag_match)
+        total = facet_index.select(params.topic_ids, params.tag_ids, params.rank_id,
+                                   params.topic_match, params.tag_match)
+        if text_bits is not None:
+            total &= text_bits
+        total = total.bit_count()
+    else:
+        counts = {}
+        for name, assoc, column in (('topics', lecture_topic, lecture_topic.c.topic_id),
+                                    ('tags', lecture_tag, lecture_tag.c.tag_id)):
+            rows = db.session.execute(
+                db.select(column, db.func.count(db.distinct(assoc.c.lecture_id)))
+                .join(Lecture, Lecture.id == assoc.c.lecture_id)
+                .where(*sql_conditions(params, matches, exclude=name))
+                .group_by(column)
+            ).all()
+            counts[name] = dict(rows)
+        rows = db.session.execute(
+            db.select(Lecture.rank_id, db.func.count(Lecture.id))
+            .where(Lecture.rank_id.isnot(None), *sql_conditions(params, matches, exclude='ranks'))
+            .group_by(Lecture.rank_id)
+        ).all()
+        counts['ranks'] = dict(rows)
+        total = db.session.execute(
+            db.select(db.func.count(Lecture.id)).where(*sql_conditions(params, matches))
+        ).scalar()
+
+    result = {'total': total}
+    for name in ('topics', 'tags', 'ranks'):
+        result[name] = [
+            {'id': item.id, 'name': item.name, 'count': counts[name].get(item.id, 0)}
+            for item in metadata.all(name)
+        ]
+    return result
+
+
+def _membership(table, column_name, ids, match):
+    # IN subqueries rather than correlated EXISTS, so the planner starts from the
+    # (topic_id, lecture_id)/(tag_id, lecture_id) indexes instead of probing the
+    # association table once per lecture. Aliased so the subquery never
+    # correlates with the same table in an outer FROM.
+    assoc = table.alias()
+    column = assoc.c[column_name]
+    if match == 'all':
+        return db.and_(*[
+            Lecture.id.in_(db.select(assoc.c.lecture_id).where(column == i)) for i in ids
+        ])
+    return Lecture.id.in_(db.select(assoc.c.lecture_id).where(column.in_(ids)))
+
+
+def sql_conditions(params, matches=None, exclude=None):
+    """WHERE clauses on Lecture for the search filters, optionally leaving one facet out."""
+    conditions = []
+    if matches is not None:
+        conditions.append(Lecture.id.in_(db.select(matches.c.lecture_id)))
+    if params.topic_ids and exclude != 'topics':
+        conditions.append(_membership(lecture_topic, 'topic_id',
+                                      params.topic_ids, params.topic_match))
+    if params.tag_ids and exclude != 'tags':
+        conditions.append(_membership(lecture_tag, 'tag_id',
+                                      params.tag_ids, params.tag_match))
+    if params.rank_id is not None and exclude != 'ranks':
+        conditions.append(Lecture.rank_id == params.rank_id)
+    return conditions
+
+
+def _page_info(params, has_next, total):
+    if total is None:
+        total_pages = None
+    else:
+        total_pages = math.ceil(total / params.per_page)
+    return {'has_next': has_next, 'total_pages': total_pages, 'current_page': params.page}
+
+
+def _index_search(params, matches, after):
+    """Resolve filters and ordering with the in-memory facet index.
+
+    Returns (page ids, sort value per id, page info).
+    """
+    facet_index.ensure_current()
+    bits = facet_index.select(params.topic_ids, params.tag_ids, params.rank_id,
+                              params.topic_match, params.tag_match)
+    offset = 0 if params.cursor is not None else (params.page - 1) * params.per_page
+    limit = params.per_page
+
+    if matches is not None:
+        rows = db.session.execute(
+            db.select(matches.c.lecture_id, matches.c.score)
+            .order_by(matches.c.score, matches.c.lecture_id.desc())
+        ).all()
+
+    if params.sort_by == 'relevance':
+        contains = facet_index.contains(bits)
+        ranked = [(score, lecture_id) for lecture_id, score in rows if contains(lecture_id)]
+        total = len(ranked)
+        if after is not None:
+            last_score, last_id = after
+            ranked = [item for item in ranked
+                      if item[0] > last_score or (item[0] == last_score and item[1] < last_id)]
+        window = [lecture_id for score, lecture_id in ranked[offset:offset + limit + 1]]
+        ids, has_next = window[:limit], len(window) > limit
+        sort_values = {lecture_id: score for lecture_id, score in rows}
+    else:
+        if matches is not None:
+            bits &= ids_to_bits(lecture_id for lecture_id, score in rows)
+        total = bits.bit_count()
+        after_key = date_key(*after) if after is not None else None
+        ids, has_next = facet_index.page(bits, params.sort_by, offset, limit, after_key)
+        sort_values = {lecture_id: facet_index.lectures[lecture_id][3] for lecture_id in ids}
+
+    return ids, sort_values, _page_info(params, has_next, total if params.with_count else None)
+
+
+def sql_queries(params, matches=None, after=None):
+    """The page and count SELECTs for a search, before OFFSET/LIMIT.
+
+    Filters are IN semi-joins, so every lecture appears once and
+    LIMIT/OFFSET count lectures rather than joined rows.
+    """
+    conditions = sql_conditions(params)
+    if params.sort_by == 'relevance':
+        sort_column = matches.c.score
+    else:
+        sort_column = Lecture.publish_date
+
+    ids_query = db.select(Lecture.id, sort_column).select_from(Lecture).where(*conditions)
+    count_query = db.select(db.func.count(Lecture.id)).select_from(Lecture).where(*conditions)
+    if matches is not None:
+        ids_query = ids_query.join(matches, matches.c.lecture_id == Lecture.id)
+        count_query = count_query.join(matches, matches.c.lecture_id == Lecture.id)
+
+    # Apply sorting
+    if params.sort_by == 'rank':
+        ids_query = ids_query.order_by(Lecture.rank_id, *keyset_order('date', Lecture.publish_date))
+    else:
+        ids_query = ids_query.order_by(*keyset_order(params.sort_by, sort_column))
+    if params.cursor is not None and after is not None:
+        ids_query = ids_query.where(keyset_after(params.sort_by, sort_column, *after))
+    return ids_query, count_query
+
+
+def _sql_search(params, matches, after):
+    """Select the page of lecture ids in SQL.
+
+    Returns (page ids, sort value per id, page info).
+    """
+    ids_query, count_query = sql_queries(params, matches, after)
+    if params.cursor is not None:
+        # Keyset pagination: only the rows after the cursor are read, no COUNT
+        total = None
+    else:
+        ids_query = ids_query.offset((params.page - 1) * params.per_page)
+        total = db.session.execute(count_query).scalar() if params.with_count else None
+
+    # Look one row ahead for has_next
+    rows = db.session.execute(ids_query.limit(params.per_page + 1)).all()
+    has_next = len(rows) > params.per_page
+    rows = rows[:params.per_page]
+
+    ids = [lecture_id for lecture_id, value in rows]
+    sort_values = {lecture_id: value for lecture_id, value in rows}
+    if params.cursor is not None:
+        return ids, sort_values, {'has_next': has_next}
+    return ids, sort_values, _page_info(params, has_next, total)
+
+
+def hydrate_lectures(ids):
+    """Response dicts for ``ids``, in order, loaded with four queries.
+
+    Lecture rows, the topic and tag links and the cached thumbnails are
+    fetched in one batch each, however many lectures are on the page; names
+    come from the metadata cache.
+    """
+    if not ids:
+        return []
+    rows = db.session.execute(
+        db.select(Lecture.id, Lecture.title, Lecture.youtube_id, Lecture.thumbnail_url,
+                  Lecture.publish_date, Lecture.rank_id)
+        .where(Lecture.id.in_(ids))
+    ).all()
+
+    rank_names = metadata.name_map('ranks')
+    lecture_data = {}
+    for lecture_id, title, youtube_id, thumbnail_url, publish_date, rank_id in rows:
+        lecture_data[lecture_id] = {
+            'id': lecture_id,
+            'title': title,
+            'youtube_id': youtube_id,
+            'thumbnail_url': thumbnail_url,
+            'publish_date': publish_date.isoformat(),
+            'topics': [],
+            'tags': [],
+            'rank': rank_names.get(rank_id)
+        }
+
+    for key, assoc, column in (('topics', lecture_topic, lecture_topic.c.topic_id),
+                               ('tags', lecture_tag, lecture_tag.c.tag_id)):
+        names = metadata.name_map(key)
+        links = db.session.execute(
+            db.select(assoc.c.lecture_id, column)
+            .where(assoc.c.lecture_id.in_(ids))
+            .order_by(column)
+        ).all()
+        for lecture_id, item_id in links:
+            if item_id in names:
+                lecture_data[lecture_id][key].append(names[item_id])
+
+    # Locally cached, resized thumbnails where available; thumbnail_url stays the original
+    thumbs = thumbnail_urls([data['youtube_id'] for data in lecture_data.values()])
+    for data in lecture_data.values():
+        thumb = thumbs.get(data['youtube_id'])
+        data['thumbnail_src'] = thumb['src'] if thumb else data['thumbnail_url']
+        data['thumbnail_srcset'] = thumb['srcset'] if thumb else None
+
+    return [lecture_data[i] for i in ids if i in lecture_data]
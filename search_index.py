@@ -0,0 +1,143 @@
+import re
+import logging
+from app import app, db
+from models import Lecture
+
+# Full-text index over lecture titles.
+# SQLite uses an external-content FTS5 table kept in sync by triggers,
+# Postgres uses a GIN expression index over to_tsvector('simple', title).
+FTS_TABLE = 'lecture_fts'
+PG_FTS_INDEX = 'ix_lecture_title_fts'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_TABLE = f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    title, content='lecture', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)"""
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON lecture BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END""",
+    f'{FTS_TABLE}_ad': f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON lecture BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title);
+    END""",
+    f'{FTS_TABLE}_au': f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title ON lecture BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END""",
+}
+
+POSTGRES_SCHEMA = [
+    f"CREATE INDEX IF NOT EXISTS {PG_FTS_INDEX} ON lecture USING GIN (to_tsvector('simple', title))",
+]
+
+
+def backend():
+    """Return the full-text backend for the configured database, or None."""
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        return dialect
+    return None
+
+
+def init_search_index():
+    """Create the full-text index if it is missing and fill it from existing rows."""
+    kind = backend()
+    if kind == 'sqlite':
+        existed = db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+            {'name': FTS_TABLE}
+        ).first() is not None
+        for statement in [SQLITE_TABLE, *SQLITE_TRIGGERS.values()]:
+            db.session.execute(db.text(statement))
+        if not existed:
+            rebuild_search_index()
+        db.session.commit()
+    elif kind == 'postgresql':
+        for statement in POSTGRES_SCHEMA:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+    else:
+        logging.warning("No full-text backend for this database, falling back to LIKE search")
+
+
+def rebuild_search_index():
+    """Re-read every lecture title into the index. The caller commits."""
+    if backend() == 'sqlite':
+        db.session.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif backend() == 'postgresql':
+        db.session.execute(db.text(f"REINDEX INDEX {PG_FTS_INDEX}"))
+
+
+def suspend_sqlite_sync(conn):
+    """Drop the sync triggers on ``conn`` ahead of a bulk rewrite of the lecture table.
+
+    Without them SQLite can truncate and bulk-insert without per-row index
+    writes. Call resume_sqlite_sync in the same transaction afterwards.
+    """
+    for name in SQLITE_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def resume_sqlite_sync(conn):
+    """Rebuild the index from the lecture table and put the sync triggers back."""
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    for statement in SQLITE_TRIGGERS.values():
+        conn.exec_driver_sql(statement)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text or '')
+
+
+def build_match_query(text):
+    """Turn user input into a prefix-matching query, or None if it has no words."""
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    if backend() == 'postgresql':
+        return ' & '.join(f"{token}:*" for token in tokens)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def text_matches(text):
+    """Subquery of (lecture_id, score) rows matching ``text``.
+
+    Lower scores are better on every backend so callers can always sort
+    ascending. Returns None when ``text`` is blank; text without any words
+    (only punctuation, say) matches nothing.
+    """
+    if not text.strip():
+        return None
+    kind = backend()
+    if kind is None:
+        return db.select(
+            Lecture.id.label('lecture_id'), db.literal(0.0).label('score')
+        ).where(Lecture.title.ilike(f'%{text}%')).subquery('matches')
+
+    match = build_match_query(text)
+    if match is None:
+        return db.select(
+            Lecture.id.label('lecture_id'), db.literal(0.0).label('score')
+        ).where(db.false()).subquery('matches')
+    if kind == 'sqlite':
+        sql = (f"SELECT rowid AS lecture_id, bm25({FTS_TABLE}) AS score "
+               f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match")
+    else:
+        sql = ("SELECT id AS lecture_id, "
+               "-ts_rank(to_tsvector('simple', title), to_tsquery('simple', :match)) AS score "
+               "FROM lecture WHERE to_tsvector('simple', title) @@ to_tsquery('simple', :match)")
+    return db.text(sql).bindparams(match=match).columns(
+        lecture_id=db.Integer, score=db.Float
+    ).subquery('matches')
+
+
+@app.cli.command("search-reindex")
+def search_reindex():
+    """Rebuild the lecture title full-text index."""
+    init_search_index()
+    rebuild_search_index()
+    db.session.commit()
+    print("Search index rebuilt successfully!")
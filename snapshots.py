@@ -0,0 +1,253 @@
+import os
+import re
+import gzip
+import shutil
+import logging
+from datetime import datetime
+import click
+from app import app, db
+from models import (Lecture, Topic, Tag, Rank, RelatedLecture, RelatedVector, RelatedFeature,
+                    lecture_topic, lecture_tag)
+from search_index import suspend_sqlite_sync, resume_sqlite_sync
+from versions import commit_catalog_change
+
+# Catalog tables in insert order; users and version counters are left alone
+CATALOG_TABLES = [Topic.__table__, Tag.__table__, Rank.__table__, Lecture.__table__, lecture_topic, lecture_tag]
+# Computed from the catalog and keyed by lecture id, so they are emptied along with it;
+# lecture ids are reused after a reset and would otherwise inherit old related lists
+DERIVED_TABLES = [RelatedLecture.__table__, RelatedVector.__table__, RelatedFeature.__table__]
+
+# Microseconds in the stamp keep snapshots taken within the same second apart
+SNAPSHOT_NAME_RE = re.compile(r'^snapshot-\d{8}-\d{6}(\.\d{6})?(-[\w-]+)?\.(sqlite|pgcopy)$')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def snapshot_dir():
+    path = app.config['SNAPSHOT_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def snapshot_path(name):
+    """Path of an existing snapshot, refusing anything that is not one of ours."""
+    if not SNAPSHOT_NAME_RE.match(name or ''):
+        raise SnapshotError(f'Invalid snapshot name: {name}')
+    path = os.path.join(snapshot_dir(), name)
+    if not os.path.exists(path):
+        raise SnapshotError(f'Snapshot not found: {name}')
+    return path
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def list_snapshots():
+    """Snapshots on disk, newest first."""
+    snapshots = []
+    for name in os.listdir(snapshot_dir()):
+        if not SNAPSHOT_NAME_RE.match(name):
+            continue
+        path = os.path.join(snapshot_dir(), name)
+        snapshots.append({
+            'name': name,
+            'size': _size(path),
+            'created': datetime.fromtimestamp(os.path.getmtime(path))
+        })
+    return sorted(snapshots, key=lambda s: (s['created'], s['name']), reverse=True)
+
+
+def _autocommit_connection():
+    # Release whatever the request session holds so the snapshot sees committed data
+    # and SQLite can take its write lock
+    db.session.close()
+    return db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+
+def take_snapshot(label=None):
+    """Write the whole catalog to a new timestamped snapshot and return its name."""
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S.%f')
+    label = re.sub(r'[^\w-]', '', label or '')
+    suffix = f'-{label}' if label else ''
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        name = f'snapshot-{stamp}{suffix}.sqlite'
+        path = os.path.join(snapshot_dir(), name)
+        # Claim the name first; VACUUM INTO accepts an empty file
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            raise SnapshotError(f'Snapshot {name} already exists')
+        try:
+            with _autocommit_connection() as conn:
+                # A consistent, compacted copy of the live database in one statement
+                conn.exec_driver_sql('VACUUM INTO ?', (path,))
+        except Exception:
+            os.remove(path)
+            raise
+    elif dialect == 'postgresql':
+        name = f'snapshot-{stamp}{suffix}.pgcopy'
+        path = os.path.join(snapshot_dir(), name)
+        try:
+            os.makedirs(path)
+        except FileExistsError:
+            raise SnapshotError(f'Snapshot {name} already exists')
+        raw = db.engine.raw_connection()
+        try:
+            # One repeatable-read transaction so every table comes from the same moment;
+            # set on the session because the driver opens the transaction implicitly
+            raw.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            cursor = raw.cursor()
+            for table in CATALOG_TABLES:
+                columns = ', '.join(table.columns.keys())
+                with gzip.open(os.path.join(path, f'{table.name}.csv.gz'), 'wt', encoding='utf-8') as out:
+                    cursor.copy_expert(f'COPY "{table.name}" ({columns}) TO STDOUT WITH (FORMAT csv, HEADER true)', out)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        finally:
+            raw.close()
+    else:
+        raise SnapshotError(f'Snapshots are not supported on {dialect}')
+
+    logging.info(f"Snapshot {name} written")
+    return name
+
+
+def _sqlite_restore(conn, path):
+    conn.exec_driver_sql('ATTACH DATABASE ? AS snapshot', (path,))
+    try:
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            suspend_sqlite_sync(conn)
+            for table in DERIVED_TABLES + CATALOG_TABLES[::-1]:
+                conn.exec_driver_sql(f'DELETE FROM main."{table.name}"')
+            for table in CATALOG_TABLES:
+                snapshot_columns = {row[1] for row in conn.exec_driver_sql(f'PRAGMA snapshot.table_info("{table.name}")')}
+                columns = ', '.join(c for c in table.columns.keys() if c in snapshot_columns)
+                # OR IGNORE drops duplicate links kept by snapshots taken before migration 1
+                conn.exec_driver_sql(
+                    f'INSERT OR IGNORE INTO main."{table.name}" ({columns}) SELECT {columns} FROM snapshot."{table.name}"'
+                )
+            resume_sqlite_sync(conn)
+            conn.exec_driver_sql('COMMIT')
+        except Exception:
+            conn.exec_driver_sql('ROLLBACK')
+            raise
+    finally:
+        conn.exec_driver_sql('DETACH DATABASE snapshot')
+
+
+def _postgres_restore(path):
+    raw = db.engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        names = ', '.join(f'"{table.name}"' for table in CATALOG_TABLES + DERIVED_TABLES)
+        cursor.execute(f'TRUNCATE {names} RESTART IDENTITY')
+        for table in CATALOG_TABLES:
+            columns = ', '.join(table.columns.keys())
+            with gzip.open(os.path.join(path, f'{table.name}.csv.gz'), 'rt', encoding='utf-8') as source:
+                cursor.copy_expert(f'COPY "{table.name}" ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true)', source)
+            if 'id' in table.columns:
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+                    f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM \"{table.name}\""
+                )
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def restore_snapshot(name):
+    """Replace the catalog with the contents of a snapshot in one transaction."""
+    path = snapshot_path(name)
+    if name.endswith('.sqlite'):
+        if db.engine.dialect.name != 'sqlite':
+            raise SnapshotError('SQLite snapshots can only be restored into SQLite')
+        with _autocommit_connection() as conn:
+            _sqlite_restore(conn, path)
+    else:
+        if db.engine.dialect.name != 'postgresql':
+            raise SnapshotError('Postgres snapshots can only be restored into Postgres')
+        db.session.close()
+        _postgres_restore(path)
+    commit_catalog_change(metadata=True)
+    logging.info(f"Snapshot {name} restored")
+
+
+def truncate_catalog():
+    """Delete every lecture, topic, tag and rank, and their related lists, in one transaction."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.close()
+        names = ', '.join(f'"{table.name}"' for table in CATALOG_TABLES + DERIVED_TABLES)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f'TRUNCATE {names} RESTART IDENTITY')
+    elif db.engine.dialect.name == 'sqlite':
+        with _autocommit_connection() as conn:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                suspend_sqlite_sync(conn)
+                for table in DERIVED_TABLES + CATALOG_TABLES[::-1]:
+                    conn.exec_driver_sql(f'DELETE FROM "{table.name}"')
+                resume_sqlite_sync(conn)
+                conn.exec_driver_sql('COMMIT')
+            except Exception:
+                conn.exec_driver_sql('ROLLBACK')
+                raise
+    else:
+        for table in DERIVED_TABLES + CATALOG_TABLES[::-1]:
+            db.session.execute(table.delete())
+    commit_catalog_change(metadata=True)
+
+
+def delete_snapshot(name):
+    path = snapshot_path(name)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+@app.cli.group()
+def snapshot():
+    """Take, list and restore catalog snapshots."""
+
+
+@snapshot.command('list')
+def snapshot_list():
+    """List snapshots, newest first."""
+    for item in list_snapshots():
+        print(f"{item['name']}\t{item['size']} bytes\t{item['created']:%Y-%m-%d %H:%M:%S}")
+
+
+@snapshot.command('take')
+@click.option('--label', help='Short label appended to the snapshot name.')
+def snapshot_take(label):
+    """Snapshot the current catalog."""
+    try:
+        name = take_snapshot(label)
+    except SnapshotError as e:
+        raise click.ClickException(str(e))
+    print(f"Snapshot {name} created")
+
+
+@snapshot.command('restore')
+@click.argument('name')
+def snapshot_restore(name):
+    """Replace the catalog with a snapshot."""
+    try:
+        restore_snapshot(name)
+    except SnapshotError as e:
+        raise click.ClickException(str(e))
+    print(f"Snapshot {name} restored successfully!")
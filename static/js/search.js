@@ -7,23 +7,45 @@ document.addEventListener('DOMContentLoaded', function() {
     const resultsContainer = document.getElementById('results-container');
     const loadMoreBtn = document.getElementById('load-more');
 
-    let currentPage = 1;
-    let isLoading = false;
-    let debounceTimer;
+    const suggestionList = document.getElementById('search-suggestions');
+    // Set when the site is also exported as static files (see static_export.py)
+    const staticSearchUrl = resultsContainer.dataset.staticSearch;
 
-    // Debounce function
-    function debounce(func, wait) {
-        clearTimeout(debounceTimer);
-        debounceTimer = setTimeout(func, wait);
-    }
+    let nextCursor = '';
+    let isLoading = false;
+    let suggestTimer;
+    let suggestRequest = null;
+    let suggestions = [];
+    let activeSuggestion = -1;
 
     // Reset search
     function resetSearch() {
-        currentPage = 1;
+        nextCursor = '';
         resultsContainer.innerHTML = '';
         loadMoreBtn.style.display = 'none';
     }
 
+    // Show result counts next to each filter option and disable dead ends
+    function updateFacetCounts(select, counts) {
+        const byId = {};
+        counts.forEach(item => { byId[item.id] = item.count; });
+        Array.from(select.options).forEach(option => {
+            if (!option.value || !option.dataset.name) return;
+            const count = byId[option.value] || 0;
+            option.textContent = `${option.dataset.name} (${count})`;
+            option.disabled = count === 0 && !option.selected;
+        });
+    }
+
+    // Pre-rendered first batch for the default listing and single-filter views, if any
+    function staticSearchPath(searchQuery, selectedTopic, selectedTag, selectedRank) {
+        if (!staticSearchUrl || searchQuery) return null;
+        const filters = [['topic', selectedTopic], ['tag', selectedTag], ['rank', selectedRank]]
+            .filter(([, value]) => value);
+        if (filters.length > 1) return null;
+        return staticSearchUrl + (filters.length ? `${filters[0][0]}-${filters[0][1]}` : 'index') + '.json';
+    }
+
     // Search function
     function performSearch(resetPage = true) {
         if (isLoading) return;
@@ -39,7 +61,14 @@ document.addEventListener('DOMContentLoaded', function() {
         const selectedRank = rankFilter.value;
         //const sortBy = sortSelect.value; // Removed sortBy
 
-        let url = `/api/search?page=${currentPage}&q=${encodeURIComponent(searchQuery)}&sort=-publish_date`; //Always sort by newest
+        // Keyset pagination: the server hands back the cursor for the next batch
+        const isFirstPage = nextCursor === '';
+        let url = `/api/search?cursor=${encodeURIComponent(nextCursor)}&q=${encodeURIComponent(searchQuery)}`;
+
+        // Ask for facet counts with the first batch so the dropdowns show what each choice would return
+        if (isFirstPage) {
+            url += '&facets=1';
+        }
 
         if (selectedTopic) {
             url += `&topics[]=${selectedTopic}`;
@@ -54,11 +83,17 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         // Show loading state
-        if (currentPage === 1) {
+        if (isFirstPage) {
             resultsContainer.innerHTML = '<div class="text-center my-5"><div class="spinner-border" role="status"><span class="visually-hidden">Loading...</span></div></div>';
         }
 
-        fetch(url)
+        // A missing static file just means the live API answers instead
+        const staticPath = isFirstPage ? staticSearchPath(searchQuery, selectedTopic, selectedTag, selectedRank) : null;
+        const request = staticPath
+            ? fetch(staticPath).then(response => response.ok ? response : fetch(url), () => fetch(url))
+            : fetch(url);
+
+        request
             .then(response => {
                 if (!response.ok) {
                     throw new Error('Network response was not ok');
@@ -67,13 +102,20 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(data => {
                 // Remove loading indicator if it's the first page
-                if (currentPage === 1) {
+                if (isFirstPage) {
                     resultsContainer.innerHTML = '';
                 }
 
-                if (data.lectures.length === 0 && currentPage === 1) {
+                if (data.facets) {
+                    updateFacetCounts(topicFilter, data.facets.topics);
+                    updateFacetCounts(tagFilter, data.facets.tags);
+                    updateFacetCounts(rankFilter, data.facets.ranks);
+                }
+
+                if (data.lectures.length === 0 && isFirstPage) {
                     resultsContainer.innerHTML = '<div class="col-12 text-center my-5"><p>No lectures found matching your criteria.</p></div>';
                     loadMoreBtn.style.display = 'none';
+                    isLoading = false;
                     return;
                 }
 
@@ -83,11 +125,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     lectureEl.className = 'col-md-4 mb-4';
                     lectureEl.innerHTML = `
                         <div class="lecture-card">
-                            <div class="lecture-thumbnail" onclick="openVideoModal('${lecture.youtube_id}')" style="cursor: pointer;">
-                                <img src="${lecture.thumbnail_url}" alt="${lecture.title}">
+                            <div class="lecture-thumbnail" onclick="openVideoModal('${lecture.youtube_id}', ${lecture.id})" style="cursor: pointer;">
+                                <img src="${lecture.thumbnail_src || lecture.thumbnail_url}"${lecture.thumbnail_srcset ? ` srcset="${lecture.thumbnail_srcset}" sizes="(min-width: 768px) 33vw, 100vw"` : ''} alt="${lecture.title}" loading="lazy">
                                 <i class="fas fa-play-circle play-button"></i>
                             </div>
-                            <h3 class="lecture-title" onclick="openVideoModal('${lecture.youtube_id}')" style="cursor: pointer;">
+                            <h3 class="lecture-title" onclick="openVideoModal('${lecture.youtube_id}', ${lecture.id})" style="cursor: pointer;">
                                 ${lecture.title}
                             </h3>
                             <div class="lecture-meta">
@@ -110,6 +152,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
 
                 // Show/hide load more button
+                nextCursor = data.next_cursor || '';
                 if (data.has_next) {
                     loadMoreBtn.style.display = 'inline-block';
                 } else {
@@ -125,15 +168,128 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // Typeahead: /api/suggest answers from an in-memory index, the full search only runs on commit
+    function hideSuggestions() {
+        suggestions = [];
+        activeSuggestion = -1;
+        suggestionList.classList.remove('show');
+        suggestionList.innerHTML = '';
+        searchInput.setAttribute('aria-expanded', 'false');
+    }
+
+    function renderSuggestions() {
+        suggestionList.innerHTML = '';
+        if (suggestions.length === 0) {
+            hideSuggestions();
+            return;
+        }
+        const labels = { topic: ['Topic', 'bg-primary'], tag: ['Tag', 'bg-info'] };
+        suggestions.forEach((item, index) => {
+            const li = document.createElement('li');
+            const entry = document.createElement('a');
+            entry.className = 'dropdown-item' + (index === activeSuggestion ? ' active' : '');
+            entry.setAttribute('role', 'option');
+            if (labels[item.type]) {
+                const badge = document.createElement('span');
+                badge.className = `badge ${labels[item.type][1]} suggestion-kind`;
+                badge.textContent = labels[item.type][0];
+                entry.appendChild(badge);
+            }
+            entry.appendChild(document.createTextNode(item.text));
+            // mousedown fires before the input loses focus
+            entry.addEventListener('mousedown', event => {
+                event.preventDefault();
+                chooseSuggestion(item);
+            });
+            li.appendChild(entry);
+            suggestionList.appendChild(li);
+        });
+        suggestionList.classList.add('show');
+        searchInput.setAttribute('aria-expanded', 'true');
+    }
+
+    function fetchSuggestions() {
+        const query = searchInput.value.trim();
+        if (suggestRequest) suggestRequest.abort();
+        if (!query) {
+            hideSuggestions();
+            return;
+        }
+        suggestRequest = new AbortController();
+        fetch(`/api/suggest?q=${encodeURIComponent(query)}`, { signal: suggestRequest.signal })
+            .then(response => response.ok ? response.json() : { suggestions: [] })
+            .then(data => {
+                suggestions = data.suggestions || [];
+                activeSuggestion = -1;
+                renderSuggestions();
+            })
+            .catch(() => {});
+    }
+
+    function selectFilter(select, id) {
+        const option = Array.from(select.options).find(opt => opt.value === String(id));
+        if (option) {
+            option.disabled = false;
+            select.value = option.value;
+        }
+    }
+
+    function chooseSuggestion(item) {
+        hideSuggestions();
+        if (item.type === 'topic' || item.type === 'tag') {
+            selectFilter(item.type === 'topic' ? topicFilter : tagFilter, item.id);
+            searchInput.value = '';
+            performSearch(true);
+        } else if (typeof window.openVideoModal === 'function') {
+            window.openVideoModal(item.youtube_id, item.id);
+        } else {
+            searchInput.value = item.text;
+            performSearch(true);
+        }
+    }
+
+    function commitSearch() {
+        clearTimeout(suggestTimer);
+        if (suggestRequest) suggestRequest.abort();
+        hideSuggestions();
+        performSearch(true);
+    }
+
     // Event listeners
-    searchInput.addEventListener('input', () => debounce(() => performSearch(true), 300));
+    searchInput.addEventListener('input', () => {
+        if (!searchInput.value.trim()) {
+            // Clearing the box goes straight back to the unfiltered list
+            commitSearch();
+            return;
+        }
+        clearTimeout(suggestTimer);
+        suggestTimer = setTimeout(fetchSuggestions, 120);
+    });
+    searchInput.addEventListener('keydown', event => {
+        if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+            if (suggestions.length === 0) return;
+            event.preventDefault();
+            const step = event.key === 'ArrowDown' ? 1 : -1;
+            activeSuggestion = (activeSuggestion + 1 + step + suggestions.length + 1) % (suggestions.length + 1) - 1;
+            renderSuggestions();
+        } else if (event.key === 'Enter') {
+            event.preventDefault();
+            if (activeSuggestion >= 0) {
+                chooseSuggestion(suggestions[activeSuggestion]);
+            } else {
+                commitSearch();
+            }
+        } else if (event.key === 'Escape') {
+            hideSuggestions();
+        }
+    });
+    searchInput.addEventListener('blur', hideSuggestions);
     topicFilter.addEventListener('change', () => performSearch(true));
     tagFilter.addEventListener('change', () => performSearch(true));
     rankFilter.addEventListener('change', () => performSearch(true));
     //sortSelect.addEventListener('change', () => performSearch(true)); //Removed sortSelect listener
 
     loadMoreBtn.addEventListener('click', () => {
-        currentPage++;
         performSearch(false);
     });
 
@@ -143,11 +299,11 @@ document.addEventListener('DOMContentLoaded', function() {
     const tag = urlParams.get('tag');
 
     if (topic) {
-        const option = Array.from(topicFilter.options).find(opt => opt.text === topic);
+        const option = Array.from(topicFilter.options).find(opt => opt.dataset.name === topic);
         if (option) option.selected = true;
     }
     if (tag) {
-        const option = Array.from(tagFilter.options).find(opt => opt.text === tag);
+        const option = Array.from(tagFilter.options).find(opt => opt.dataset.name === tag);
         if (option) option.selected = true;
     }
 
@@ -7,7 +7,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const firstScriptTag = document.getElementsByTagName('script')[0];
     firstScriptTag.parentNode.insertBefore(tag, firstScriptTag);
 
-    window.openVideoModal = function(videoId) {
+    window.openVideoModal = function(videoId, lectureId) {
         const modal = document.createElement('div');
         modal.className = 'video-modal';
         modal.innerHTML = `
@@ -15,11 +15,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 <div id="youtube-player"></div>
                 <button class="close-video">&times;</button>
             </div>
+            <div class="related-lectures"></div>
         `;
 
         document.body.appendChild(modal);
         modal.style.display = 'flex';
 
+        // Related lectures play in a fresh modal in place of this one
+        loadRelatedLectures(modal.querySelector('.related-lectures'), lectureId, function(lecture) {
+            closeModal();
+            window.openVideoModal(lecture.youtube_id, lecture.id);
+        });
+
         // Create YouTube player
         if (window.YT && window.YT.Player) {
             createPlayer();
@@ -53,22 +60,65 @@ document.addEventListener('DOMContentLoaded', function() {
         };
 
         // Close on escape key
-        document.addEventListener('keydown', function(e) {
+        function closeOnEscape(e) {
             if (e.key === 'Escape') {
                 closeModal();
             }
-        });
+        }
+        document.addEventListener('keydown', closeOnEscape);
 
         function closeModal() {
             if (player) {
                 player.destroy();
                 player = null;
             }
+            document.removeEventListener('keydown', closeOnEscape);
             modal.remove();
         }
     };
 });
-function openVideoModal(videoId) {
+
+// Fill `container` with the precomputed related lectures of `lectureId`;
+// clicking one calls onSelect with its lecture object
+function loadRelatedLectures(container, lectureId, onSelect) {
+    container.replaceChildren();
+    if (!lectureId) {
+        return;
+    }
+    fetch(`/api/lecture/${lectureId}/related`)
+        .then(response => response.ok ? response.json() : { lectures: [] })
+        .then(data => {
+            const lectures = data.lectures || [];
+            if (!lectures.length) {
+                return;
+            }
+            const heading = document.createElement('h6');
+            heading.textContent = 'Related lectures';
+            const list = document.createElement('div');
+            list.className = 'related-list';
+            lectures.forEach(lecture => {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'related-item';
+                const img = document.createElement('img');
+                img.src = lecture.thumbnail_src || lecture.thumbnail_url;
+                img.alt = '';
+                img.loading = 'lazy';
+                const title = document.createElement('span');
+                title.textContent = lecture.title;
+                item.append(img, title);
+                item.onclick = function(e) {
+                    e.stopPropagation();
+                    onSelect(lecture);
+                };
+                list.appendChild(item);
+            });
+            container.append(heading, list);
+        })
+        .catch(() => {});
+}
+
+function openVideoModal(videoId, lectureId) {
     // Check if modal already exists, if not create it
     let videoModal = document.getElementById('videoModal');
     
@@ -94,6 +144,7 @@ function openVideoModal(videoId) {
                                 allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture" 
                                 allowfullscreen></iframe>
                         </div>
+                        <div class="related-lectures mt-3"></div>
                     </div>
                 </div>
             </div>
@@ -105,6 +156,12 @@ function openVideoModal(videoId) {
     // Set the video source
     const videoFrame = document.getElementById('videoFrame');
     videoFrame.src = `https://www.youtube.com/embed/${videoId}?autoplay=1`;
+    const related = videoModal.querySelector('.related-lectures');
+    function playRelated(lecture) {
+        videoFrame.src = `https://www.youtube.com/embed/${lecture.youtube_id}?autoplay=1`;
+        loadRelatedLectures(related, lecture.id, playRelated);
+    }
+    loadRelatedLectures(related, lectureId, playRelated);
     
     // Initialize and show the modal
     const modal = new bootstrap.Modal(videoModal);
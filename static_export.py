@@ -0,0 +1,207 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import inspect
+import logging
+import tempfile
+import threading
+from datetime import datetime
+import click
+from flask import g, request
+from app import app
+from metadata_cache import metadata
+from versions import get_version, catalog_changed
+
+# Pre-rendered copies of the public pages, for nginx or a CDN to serve without
+# the app. STATIC_EXPORT_DIR holds builds/<version>-<ns>/ plus a "current"
+# symlink that is swapped atomically once a build is complete:
+#
+#     location / {
+#         root /srv/baduk/static/current;
+#         gzip_static on;
+#         try_files $uri $uri/index.html @app;
+#     }
+#
+# Clients with a session cookie (admins) should be sent to @app instead.
+# On exported pages search.js asks for api/search/<key>.json first and falls
+# back to the live /api/search when the file is missing, so uncommon queries
+# still work. Pages served by the app go straight to the live API.
+BUILDS = 'builds'
+CURRENT = 'current'
+MANIFEST_NAME = 'manifest.json'
+KEEP_BUILDS = 2
+
+PAGES = {'index.html': '/', 'search/index.html': '/search'}
+# Exactly what search.js requests for the first batch of results
+SEARCH_URL = '/api/search?cursor=&q=&facets=1'
+STATIC_SEARCH_URL = '/api/search/'
+# File prefix -> metadata kind and the query argument search.js sends for it
+FACET_FILES = {'topic': ('topics', 'topics[]'), 'tag': ('tags', 'tags[]'), 'rank': ('ranks', 'rank')}
+
+
+class StaticExportError(Exception):
+    pass
+
+
+def export_dir(output=None):
+    path = output or app.config['STATIC_EXPORT_DIR']
+    if not path:
+        raise StaticExportError('STATIC_EXPORT_DIR is not set')
+    return path
+
+
+def export_paths():
+    """Output file -> app path for every pre-rendered page."""
+    paths = dict(PAGES)
+    paths['api/search/index.json'] = SEARCH_URL
+    for prefix, (kind, arg) in FACET_FILES.items():
+        for item in metadata.all(kind):
+            paths[f'api/search/{prefix}-{item.id}.json'] = f'{SEARCH_URL}&{arg}={item.id}'
+    return paths
+
+
+def render(path):
+    """Body of a GET for ``path`` as an anonymous visitor would get it, marked as exported.
+
+    The view is called directly, skipping the request hooks, so an export
+    from the CLI does not start job workers or count in the metrics. The
+    response cache is skipped too, since exported pages differ from served ones.
+    """
+    with app.test_request_context(path):
+        g._static_export = True
+        view = inspect.unwrap(app.view_functions[request.endpoint])
+        response = app.make_response(view(**request.view_args))
+        if response.status_code != 200:
+            raise StaticExportError(f'{path} returned {response.status_code}')
+        return response.get_data()
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as out:
+        out.write(data)
+    # nginx gzip_static picks up the sibling; only kept when it saves bytes
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + '.gz', 'wb') as out:
+            out.write(compressed)
+
+
+def current_version(output=None):
+    """Catalog version of the build currently swapped in, or None."""
+    try:
+        with open(os.path.join(export_dir(output), CURRENT, MANIFEST_NAME)) as f:
+            return json.load(f)['version']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def export_site(output=None):
+    """Render every page into a new build and swap it in. Returns the manifest."""
+    root = export_dir(output)
+    builds = os.path.join(root, BUILDS)
+    os.makedirs(builds, exist_ok=True)
+    version = get_version()
+    # Built under a hidden name, so pruning and the swap only ever see complete builds
+    tmp = tempfile.mkdtemp(dir=builds, prefix='.tmp-')
+    try:
+        paths = export_paths()
+        for filename, path in paths.items():
+            _write(os.path.join(tmp, filename), render(path))
+        manifest = {'version': version, 'generated_at': datetime.utcnow().isoformat(),
+                    'files': sorted(paths)}
+        with open(os.path.join(tmp, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        name = f'{version:010d}-{time.time_ns()}'
+        os.replace(tmp, os.path.join(builds, name))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # Another worker may have exported a newer catalog meanwhile; never swap back
+    live = current_version(output)
+    if live is None or live <= version:
+        link = os.path.join(root, f'.{CURRENT}-{os.getpid()}')
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.join(BUILDS, name), link)
+        os.replace(link, os.path.join(root, CURRENT))
+    _prune(root)
+    return manifest
+
+
+def _prune(root):
+    builds = os.path.join(root, BUILDS)
+    try:
+        current = os.path.basename(os.readlink(os.path.join(root, CURRENT)))
+    except OSError:
+        current = None
+    names = sorted((name for name in os.listdir(builds) if not name.startswith('.')), reverse=True)
+    for name in names[KEEP_BUILDS:]:
+        if name != current:
+            shutil.rmtree(os.path.join(builds, name), ignore_errors=True)
+
+
+@app.context_processor
+def static_export_context():
+    # Only exported pages have the static search files next to them
+    return {'static_search_url': STATIC_SEARCH_URL if g.get('_static_export') else None}
+
+
+class StaticExporter:
+    """Re-exports the site on a background thread after catalog writes, once per process.
+
+    Writes arriving during an export are coalesced into one more export.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+
+    def on_catalog_changed(self, sender, version, **extra):
+        if not app.config['STATIC_EXPORT_DIR'] or not app.config['STATIC_EXPORT_AUTO']:
+            return
+        self.ensure_started()
+        self.wakeup.set()
+
+    def ensure_started(self):
+        # Threads do not survive a fork, so a forked worker process starts its own
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.wakeup = threading.Event()
+            threading.Thread(target=self.loop, name='static-exporter', daemon=True).start()
+
+    def loop(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                with app.app_context():
+                    manifest = export_site()
+                logging.info(f"Static export of version {manifest['version']}: {len(manifest['files'])} files")
+            except Exception as e:
+                logging.error(f"Error exporting static pages: {str(e)}")
+
+
+exporter = StaticExporter()
+catalog_changed.connect(exporter.on_catalog_changed)
+
+
+@app.cli.command("static-export")
+@click.option('--output', help='Directory to export into (default STATIC_EXPORT_DIR).')
+def static_export(output):
+    """Pre-render the public pages and search results for a static web server."""
+    started = time.perf_counter()
+    try:
+        manifest = export_site(output)
+    except StaticExportError as e:
+        raise click.ClickException(str(e))
+    print(f"Exported {len(manifest['files'])} files for catalog version {manifest['version']} "
+          f"into {os.path.join(export_dir(output), CURRENT)} in {time.perf_counter() - started:.2f}s")
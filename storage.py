@@ -0,0 +1,106 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Engine settings per database backend, picked from DATABASE_URL.
+# This module is imported by app.py before the app exists, so it takes
+# the config as an argument instead of importing app.
+SQLITE = 'sqlite'
+POSTGRES = 'postgresql'
+DEFAULT = 'default'
+PROFILES = (SQLITE, POSTGRES, DEFAULT)
+
+
+def profile_for(url, override=None):
+    """Profile name for a database URL; DB_PROFILE=default opts out of tuning."""
+    if override in PROFILES:
+        return override
+    backend = make_url(url).get_backend_name()
+    return backend if backend in (SQLITE, POSTGRES) else DEFAULT
+
+
+def _is_memory(url):
+    database = make_url(url).database
+    return not database or database == ':memory:' or database.startswith('file::memory:')
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the profile in config['STORAGE_PROFILE']."""
+    profile = config['STORAGE_PROFILE']
+    url = config['SQLALCHEMY_DATABASE_URI']
+    if profile == SQLITE:
+        if _is_memory(url):
+            # Flask-SQLAlchemy shares one connection for in-memory databases
+            return {}
+        # Connections to a local file are cheap to keep and never go stale, so no
+        # pre-ping or recycling; WAL lets every pooled connection read concurrently.
+        # The pysqlite timeout matches busy_timeout for locks taken outside SQL.
+        return {
+            'poolclass': QueuePool,
+            'pool_size': config['SQLITE_POOL_SIZE'],
+            'max_overflow': config['SQLITE_POOL_SIZE'] * 2,
+            'pool_timeout': 30,
+            'connect_args': {
+                'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                'check_same_thread': False,
+            },
+        }
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 30
+    }
+    if profile == POSTGRES and config['DB_STATEMENT_TIMEOUT_MS']:
+        # Runaway queries are cancelled by the server instead of holding a pooled connection
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+def sqlite_pragmas(config):
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        # Negative cache_size is in KiB rather than pages
+        'cache_size': -config['SQLITE_CACHE_SIZE_KB'],
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT_MS'],
+        'temp_store': 'MEMORY',
+    }
+
+
+def init_storage(config, engine):
+    """Apply per-connection settings for the active profile and log a self-check."""
+    profile = config['STORAGE_PROFILE']
+    if profile == SQLITE:
+        pragmas = sqlite_pragmas(config)
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.close()
+
+    settings = storage_settings(engine, profile)
+    # WARNING so the self-check shows at the app's default log level
+    logging.warning(f"Storage profile {profile} for {engine.url!r}: {settings}")
+    if profile == SQLITE and settings.get('journal_mode') != 'wal':
+        # WAL is refused on some network filesystems and for in-memory databases
+        logging.error(f"SQLite is running in {settings.get('journal_mode')} journal mode, not WAL")
+    return settings
+
+
+def storage_settings(engine, profile):
+    """The settings a fresh connection actually ended up with."""
+    with engine.connect() as conn:
+        if profile == SQLITE:
+            return {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+                    for name in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size',
+                                 'busy_timeout', 'temp_store')}
+        if engine.dialect.name == POSTGRES:
+            return {'statement_timeout': conn.exec_driver_sql('SHOW statement_timeout').scalar(),
+                    'pool_size': engine.pool.size()}
+    return {'dialect': engine.dialect.name}
@@ -0,0 +1,206 @@
+import time
+import bisect
+import heapq
+import logging
+import threading
+import unicodedata
+from app import db
+from models import Lecture, Topic, Tag, lecture_topic, lecture_tag
+from search_index import TOKEN_RE
+from versions import get_version, catalog_changed
+
+# Keys are cut to this many characters so long titles do not multiply memory
+KEY_CHARS = 32
+# Ranges up to this size are ranked on every request; wider ones are memoized
+SCAN_LIMIT = 256
+MEMO_SIZE = 4096
+MAX_LIMIT = 20
+# Writes by other workers show up after at most this long; local writes apply at once
+VERSION_CHECK_SECONDS = 1.0
+
+
+def normalize(text):
+    """Lowercase words without accents, separated by single spaces."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(TOKEN_RE.findall(text.casefold()))
+
+
+def word_keys(text):
+    """One key per word start, so "joseki" completes "Opening joseki review" too."""
+    normalized = normalize(text)
+    starts = [0] + [i + 1 for i, ch in enumerate(normalized) if ch == ' ']
+    return {normalized[start:start + KEY_CHARS] for start in starts if normalized[start:]}
+
+
+class PrefixIndex:
+    """Sorted (key, item id) pairs searched with bisect, ranked by a per-item score."""
+
+    def __init__(self, items=()):
+        self.texts = {}
+        self.scores = {}
+        pairs = []
+        for item_id, text, score in items:
+            self.texts[item_id] = text
+            self.scores[item_id] = score
+            pairs.extend((key, item_id) for key in word_keys(text))
+        pairs.sort()
+        self.keys = [key for key, item_id in pairs]
+        self.ids = [item_id for key, item_id in pairs]
+        self.memo = {}
+
+    def remove(self, item_id):
+        text = self.texts.pop(item_id, None)
+        self.scores.pop(item_id, None)
+        if text is None:
+            return
+        for key in word_keys(text):
+            pos = bisect.bisect_left(self.keys, key)
+            while pos < len(self.keys) and self.keys[pos] == key:
+                if self.ids[pos] == item_id:
+                    del self.keys[pos]
+                    del self.ids[pos]
+                    break
+                pos += 1
+        self.memo.clear()
+
+    def add(self, item_id, text, score):
+        self.remove(item_id)
+        self.texts[item_id] = text
+        self.scores[item_id] = score
+        for key in word_keys(text):
+            pos = bisect.bisect_left(self.keys, key)
+            self.keys.insert(pos, key)
+            self.ids.insert(pos, item_id)
+        self.memo.clear()
+
+    def search(self, prefix, limit):
+        """Ids of the best scored items with a word starting with ``prefix``."""
+        prefix = prefix[:KEY_CHARS]
+        memo_key = (prefix, limit)
+        if memo_key in self.memo:
+            return self.memo[memo_key]
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        candidates = set(self.ids[lo:hi])
+        scores = self.scores
+        ids = heapq.nlargest(limit, candidates, key=lambda item_id: (scores[item_id], item_id))
+        if hi - lo > SCAN_LIMIT:
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            self.memo[memo_key] = ids
+        return ids
+
+    def __len__(self):
+        return len(self.texts)
+
+
+class SuggestIndex:
+    """Typeahead completions over lecture titles and topic and tag names.
+
+    Lectures rank by recency, topics and tags by how many lectures use them.
+    Like the facet index, writes made in this process are applied
+    incrementally through catalog_changed and any other version change
+    triggers a rebuild on next use.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+        self.checked_at = 0.0
+        self.lectures = PrefixIndex()
+        self.topics = PrefixIndex()
+        self.tags = PrefixIndex()
+        self.youtube_ids = {}
+
+    def ensure_current(self):
+        # Skipping the version query on most keystrokes keeps a suggestion off the database
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < VERSION_CHECK_SECONDS:
+            return
+        version = get_version()
+        with self.lock:
+            if self.version != version:
+                self.rebuild(version)
+            self.checked_at = now
+
+    def rebuild(self, version=None):
+        if version is None:
+            version = get_version()
+        with self.lock:
+            rows = db.session.execute(
+                db.select(Lecture.id, Lecture.title, Lecture.youtube_id, Lecture.publish_date)
+            ).all()
+            self.lectures = PrefixIndex(
+                (lecture_id, title, _recency(publish_date)) for lecture_id, title, youtube_id, publish_date in rows
+            )
+            self.youtube_ids = {lecture_id: youtube_id for lecture_id, title, youtube_id, publish_date in rows}
+            self._rebuild_metadata()
+            self.version = version
+            logging.info(f"Suggest index rebuilt with {len(self.lectures)} lectures at version {version}")
+
+    def _rebuild_metadata(self):
+        for name, model, column in (('topics', Topic, lecture_topic.c.topic_id),
+                                    ('tags', Tag, lecture_tag.c.tag_id)):
+            counts = dict(db.session.execute(
+                db.select(column, db.func.count()).group_by(column)
+            ).all())
+            rows = db.session.execute(db.select(model.id, model.name)).all()
+            setattr(self, name, PrefixIndex(
+                (item_id, item_name, counts.get(item_id, 0)) for item_id, item_name in rows
+            ))
+
+    def update_lectures(self, lecture_ids):
+        rows = db.session.execute(
+            db.select(Lecture.id, Lecture.title, Lecture.youtube_id, Lecture.publish_date)
+            .where(Lecture.id.in_(lecture_ids))
+        ).all()
+        with self.lock:
+            for lecture_id in lecture_ids:
+                self.lectures.remove(lecture_id)
+                self.youtube_ids.pop(lecture_id, None)
+            for lecture_id, title, youtube_id, publish_date in rows:
+                self.lectures.add(lecture_id, title, _recency(publish_date))
+                self.youtube_ids[lecture_id] = youtube_id
+            # Topic and tag popularity moves with every lecture write; both lists are short
+            self._rebuild_metadata()
+
+    def on_catalog_changed(self, sender, version, lecture_ids=None, **extra):
+        with self.lock:
+            if self.version is None:
+                return
+            if lecture_ids is not None and self.version == version - 1:
+                self.update_lectures(list(lecture_ids))
+                self.version = version
+            else:
+                self.version = None
+
+    def suggest(self, text, limit=8):
+        """Up to ``limit`` completions: matching topics and tags first, then lectures."""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        limit = max(1, min(MAX_LIMIT, limit))
+        self.ensure_current()
+        with self.lock:
+            suggestions = []
+            # Filters are few and worth offering first, but never crowd out lectures entirely
+            facet_limit = max(1, limit // 4)
+            for kind, index in (('topic', self.topics), ('tag', self.tags)):
+                for item_id in index.search(prefix, facet_limit):
+                    suggestions.append({'type': kind, 'id': item_id, 'text': index.texts[item_id]})
+            suggestions = suggestions[:limit]
+            if len(suggestions) < limit:
+                for lecture_id in self.lectures.search(prefix, limit - len(suggestions)):
+                    suggestions.append({'type': 'lecture', 'id': lecture_id,
+                                        'text': self.lectures.texts[lecture_id],
+                                        'youtube_id': self.youtube_ids[lecture_id]})
+            return suggestions
+
+
+def _recency(publish_date):
+    return publish_date.timestamp() if publish_date else 0.0
+
+
+suggest_index = SuggestIndex()
+catalog_changed.connect(suggest_index.on_catalog_changed)
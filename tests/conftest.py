@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# app.py reads its settings at import time, so point it at throwaway files and
+# keep background threads and the page cache out of the measurements
+_tmp = tempfile.mkdtemp(prefix='baduk-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'test.db')
+os.environ.pop('APP_FACTORY', None)
+os.environ.update(
+    JOB_WORKERS='0',
+    RELATED_AUTO='0',
+    STATIC_EXPORT_DIR='',
+    RESPONSE_CACHE='none',
+    READ_REPLICA_URLS='',
+    ASSET_BUILD_DIR=os.path.join(_tmp, 'assets'),
+    SNAPSHOT_DIR=os.path.join(_tmp, 'snapshots'),
+)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from catalog import generate_catalog
+    with app.app_context():
+        generate_catalog(400, topics=8, tags=20, ranks=6, seed=1)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """Call with a function; returns how many SQL statements it executed."""
+    from app import db
+
+    def count(fn):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            fn()
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        return len(statements)
+    return count
@@ -0,0 +1,21 @@
+import brotli
+
+
+def test_built_assets_are_served_brotli_compressed(app, client):
+    import assets
+    with app.app_context():
+        built = assets.build_assets()
+    entry = built['js/search.js']
+    assert entry['encodings'] == ['br', 'gzip']
+    with open(f'{app.static_folder}/js/search.js', 'rb') as f:
+        source = f.read()
+
+    response = client.get(f"/assets/{entry['path']}", headers={'Accept-Encoding': 'br, gzip'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == source
+
+
+def test_pages_are_brotli_compressed_when_accepted(client):
+    response = client.get('/api/search?per_page=20', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == client.get('/api/search?per_page=20').data
@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture
+def cached_pages(monkeypatch):
+    import response_cache
+    # Cached pages are the ones carrying a strong ETag
+    monkeypatch.setattr(response_cache, 'cache', response_cache.MemoryCache(16))
+
+
+def test_identity_response_keeps_its_strong_etag(client, cached_pages):
+    response = client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    etag, weak = response.get_etag()
+    assert etag and not weak
+    assert client.get('/', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+
+def test_compressed_response_has_its_own_strong_etag(client, cached_pages):
+    etag, _ = client.get('/', headers={'Accept-Encoding': 'identity'}).get_etag()
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == (f'{etag}-gzip', False)
+
+    revalidated = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}-gzip"'})
+    assert revalidated.status_code == 304
+    assert revalidated.get_etag() == (f'{etag}-gzip', False)
@@ -0,0 +1,54 @@
+import io
+import json
+import pytest
+
+
+def lectures(count, prefix):
+    return [{'title': f'Imported lecture {n}', 'youtube_id': f'{prefix}{n:03d}',
+             'publish_date': '2024-01-01T00:00:00', 'rank_id': 1, 'topic_ids': [1], 'tag_ids': []}
+            for n in range(count)]
+
+
+@pytest.fixture
+def run_import(app, monkeypatch):
+    from app import db
+    import data_transfer
+    passes = []
+    original = data_transfer.open_import_stream
+    monkeypatch.setattr(data_transfer, 'open_import_stream', lambda file: passes.append(file) or original(file))
+
+    def run(document, filename='export.json'):
+        passes.clear()
+        report = data_transfer.import_file(io.BytesIO(document.encode()), filename)
+        return report.counts, len(passes)
+
+    with app.app_context():
+        yield run
+        db.session.rollback()
+
+
+def test_empty_metadata_section_does_not_defer_lectures(run_import):
+    document = json.dumps({'topics': [{'id': 1, 'name': 'Imported topic'}], 'tags': [],
+                           'ranks': [{'id': 1, 'name': 'Imported rank'}], 'lectures': lectures(3, 'emptytags')})
+    counts, passes = run_import(document)
+    assert passes == 1
+    assert counts['lectures'] == {'inserted': 3, 'skipped': 0, 'invalid': 0}
+
+
+def test_empty_metadata_section_in_ndjson(run_import):
+    lines = [{'type': 'topic', 'id': 1, 'name': 'Imported topic'}, {'type': 'rank', 'id': 1, 'name': 'Imported rank'}]
+    lines += [{'type': 'lecture', **lecture} for lecture in lectures(3, 'ndjsontags')]
+    counts, passes = run_import(''.join(json.dumps(line) + '\n' for line in lines), 'export.ndjson')
+    assert passes == 1
+    assert counts['lectures'] == {'inserted': 3, 'skipped': 0, 'invalid': 0}
+
+
+def test_second_pass_only_reads_deferred_lectures(run_import):
+    # Lectures before the metadata, as in older exports, one of them listed twice
+    early = lectures(3, 'deferred')
+    early.append(early[0])
+    document = ('{"lectures": ' + json.dumps(early) + ', "topics": [{"id": 1, "name": "Imported topic"}], '
+                '"tags": [], "ranks": [{"id": 1, "name": "Imported rank"}]}')
+    counts, passes = run_import(document)
+    assert passes == 2
+    assert counts['lectures'] == {'inserted': 3, 'skipped': 1, 'invalid': 0}
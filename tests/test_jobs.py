@@ -0,0 +1,26 @@
+def test_missing_video_is_listed_until_the_lecture_is_fixed(app, monkeypatch):
+    import jobs
+    from app import db
+    from models import Lecture, IngestJob
+    monkeypatch.setattr(jobs, 'fetch_videos', lambda video_ids: {})
+    with app.app_context():
+        lecture = Lecture(title='Lost lecture', youtube_id='missingvid1', thumbnail_url='placeholder')
+        db.session.add(lecture)
+        db.session.flush()
+        jobs.enqueue_fetch(lecture)
+        db.session.commit()
+        try:
+            assert jobs.run_pending() == 1
+            status = jobs.job_status()
+            assert [(job['lecture_id'], job['last_error']) for job in status['unresolved']] == \
+                [(lecture.id, 'Video not found')]
+            assert db.session.get(Lecture, lecture.id).thumbnail_url == 'placeholder'
+
+            # Pointing the lecture at another video resolves it
+            lecture.youtube_id = 'foundvideo1'
+            db.session.commit()
+            assert jobs.job_status()['unresolved'] == []
+        finally:
+            db.session.execute(db.delete(IngestJob).where(IngestJob.lecture_id == lecture.id))
+            db.session.delete(lecture)
+            db.session.commit()
@@ -0,0 +1,38 @@
+import time
+import pytest
+from flask import g
+from sqlalchemy.exc import OperationalError
+
+
+def test_failed_statement_does_not_skew_later_timings(app):
+    from app import db
+    from metrics import RequestMetrics
+    with app.test_request_context('/'):
+        g._metrics = RequestMetrics()
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM no_such_table')
+            conn.exec_driver_sql('SELECT 1')
+        # Only the statement that completed is counted, with its own duration
+        assert g._metrics.sql_count == 1
+        assert 0 <= g._metrics.sql_seconds < 1
+
+
+def test_interleaved_statements_are_timed_separately(app):
+    from app import db
+    from metrics import RequestMetrics
+    with app.test_request_context('/'):
+        g._metrics = RequestMetrics()
+        with db.engine.connect() as outer, db.engine.connect() as inner:
+            def nested():
+                # Runs on the second connection while the outer statement is still executing
+                inner.exec_driver_sql('SELECT pause(0.05)')
+                return 0
+            for conn in (outer, inner):
+                conn.connection.driver_connection.create_function('pause', 1, lambda s: time.sleep(s) or 0)
+            outer.connection.driver_connection.create_function('nested', 0, nested)
+            outer.exec_driver_sql('SELECT pause(0.05), nested(), pause(0.05)')
+        durations = {statement: elapsed for elapsed, statement in g._metrics.statements}
+        assert g._metrics.sql_count == 2
+        assert 0.05 <= durations['SELECT pause(0.05)'] < 0.1
+        assert durations['SELECT pause(0.05), nested(), pause(0.05)'] >= 0.15
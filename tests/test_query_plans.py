@@ -0,0 +1,44 @@
+import re
+import pytest
+
+# The plan lines the check must reject: the topic filter as it was planned
+# before searches used the reverse association indexes
+SCANNED_PLAN = [
+    'SCAN lecture USING COVERING INDEX ix_lecture_rank_date',
+    'CORRELATED SCALAR SUBQUERY 1',
+    'SEARCH lecture_topic_1 USING COVERING INDEX sqlite_autoindex_lecture_topic_1 (lecture_id=? AND topic_id=?)',
+    'USE TEMP B-TREE FOR ORDER BY',
+]
+
+# Searches filtered by topic or tag, and the table they must start from
+FILTERED = {'topic': 'lecture_topic', 'tag': 'lecture_tag'}
+
+
+@pytest.fixture(scope='module')
+def plans(app):
+    import query_plans
+    with app.app_context():
+        return {name: (plan, scans) for name, plan, scans in query_plans.check_plans()}
+
+
+def test_scans_through_an_index_are_reported(app):
+    import query_plans
+    with app.app_context():
+        assert query_plans.full_scans(SCANNED_PLAN) == [SCANNED_PLAN[0], SCANNED_PLAN[3]]
+        assert query_plans.full_scans(['SEARCH lecture USING INTEGER PRIMARY KEY (rowid=?)',
+                                       'USE TEMP B-TREE FOR ORDER BY']) == []
+
+
+def test_no_checked_search_scans_a_table(plans):
+    assert {name: scans for name, (plan, scans) in plans.items() if scans} == {}
+
+
+@pytest.mark.parametrize('facet', sorted(FILTERED))
+def test_filtered_searches_use_the_reverse_index(plans, facet):
+    table = FILTERED[facet]
+    searched = re.compile(rf'^SEARCH {table}(_\d+)? USING (COVERING )?INDEX ix_{table}_{facet} \({facet}_id=\?\)')
+    names = [name for name in plans if name.startswith(f'{facet} ')]
+    assert names
+    for name in names:
+        plan, scans = plans[name]
+        assert any(searched.match(line) for line in plan), (name, plan)
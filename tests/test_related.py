@@ -0,0 +1,153 @@
+import threading
+from collections import defaultdict
+import pytest
+
+K = 8
+
+
+@pytest.fixture(scope='module')
+def related(app):
+    import related
+    with app.app_context():
+        related.rebuild_related(K)
+    return related
+
+
+def stored_state(related):
+    """Lists and vectors as stored, plus the exact top-k those vectors give."""
+    from app import db
+    from models import RelatedLecture, RelatedVector, RelatedFeature
+    vectors, documents = defaultdict(dict), defaultdict(int)
+    for lecture_id, feature, weight in db.session.execute(
+            db.select(RelatedVector.lecture_id, RelatedVector.feature, RelatedVector.weight)):
+        vectors[lecture_id][feature] = weight
+        documents[feature] += 1
+    lists = defaultdict(dict)
+    for lecture_id, related_id, score in db.session.execute(
+            db.select(RelatedLecture.lecture_id, RelatedLecture.related_id, RelatedLecture.score)):
+        lists[lecture_id][related_id] = score
+    exact = {}
+    for lecture_id, vector in vectors.items():
+        scores = ((other_id, sum(weight * other.get(feature, 0.0) for feature, weight in vector.items()))
+                  for other_id, other in vectors.items() if other_id != lecture_id)
+        exact[lecture_id] = related._best(scores, K)
+    stats = dict(db.session.execute(db.select(RelatedFeature.feature, RelatedFeature.documents)).all())
+    return vectors, lists, exact, stats, dict(documents)
+
+
+def assert_exact(related):
+    vectors, lists, exact, stats, documents = stored_state(related)
+    assert stats == documents
+    assert set(lists) <= set(vectors)
+    for lecture_id, best in exact.items():
+        stored = lists.get(lecture_id, {})
+        # Ties may be broken differently, so compare the scores and check each stored one
+        assert sorted(stored.values(), reverse=True) == pytest.approx([score for _, score in best], abs=1e-5)
+        for other_id, score in stored.items():
+            expected = sum(weight * vectors[other_id].get(feature, 0.0)
+                           for feature, weight in vectors[lecture_id].items())
+            assert score == pytest.approx(expected, abs=1e-5)
+
+
+def test_rebuild_stores_exact_lists(app, related):
+    with app.app_context():
+        assert_exact(related)
+
+
+def test_incremental_updates_keep_lists_exact(app, related):
+    from app import db
+    from models import Lecture, Tag
+    with app.app_context():
+        lecture = db.session.get(Lecture, 5)
+        lecture.title = 'Joseki review of the avalanche'
+        lecture.tags = db.session.execute(db.select(Tag).where(Tag.id.in_([1, 2, 3]))).scalars().all()
+        added = Lecture(title=lecture.title, youtube_id='relatedtest', rank_id=lecture.rank_id,
+                        topics=list(lecture.topics), tags=list(lecture.tags))
+        db.session.add(added)
+        db.session.commit()
+        related.update_related([5, added.id], K)
+        assert_exact(related)
+        assert added.id in dict(related._load_lists([5])[5])
+
+        # A deleted lecture leaves every list it was in
+        added_id = added.id
+        db.session.delete(added)
+        db.session.commit()
+        related.update_related([added_id], K)
+        assert_exact(related)
+        vectors, lists, *rest = stored_state(related)
+        assert added_id not in vectors
+        assert all(added_id not in entries for entries in lists.values())
+
+
+def test_bulk_changes_only_request_a_rebuild(app, related, monkeypatch):
+    from versions import RELATED_REBUILD
+    monkeypatch.setitem(app.config, 'RELATED_AUTO', True)
+    monkeypatch.setattr(related, 'rebuild_related', lambda k=None: pytest.fail('rebuilt in the web process'))
+    with app.app_context():
+        related.RelatedUpdater().on_catalog_changed(app, version=1000, lecture_ids=None)
+        assert related._counter(RELATED_REBUILD) == 1000
+    monkeypatch.undo()
+    with app.app_context():
+        assert related.rebuild_if_requested() is not None
+        assert related._counter(RELATED_REBUILD) == 0
+        assert related.rebuild_if_requested() is None
+
+
+def test_failed_update_is_retried(app, related, monkeypatch):
+    monkeypatch.setitem(app.config, 'RELATED_AUTO', True)
+    monkeypatch.setattr(related, 'RETRY_SECONDS', 0.01)
+    calls, done = [], threading.Event()
+
+    def update(lecture_ids, k=None):
+        calls.append(set(lecture_ids))
+        if len(calls) == 1:
+            raise RuntimeError('database is locked')
+        done.set()
+    monkeypatch.setattr(related, 'update_related', update)
+    related.RelatedUpdater().on_catalog_changed(app, version=1, lecture_ids=[7])
+    assert done.wait(5)
+    assert calls[:2] == [{7}, {7}]
+
+
+def test_reset_and_reimport_start_from_empty_lists(app, related, monkeypatch):
+    import io
+    import json
+    import os
+    from app import db
+    from models import Lecture, RelatedLecture, RelatedVector, RelatedFeature
+    from data_transfer import import_file
+    from jobs import run_requested_rebuild
+    from snapshots import take_snapshot, restore_snapshot, truncate_catalog, snapshot_dir
+    from versions import commit_catalog_change
+    monkeypatch.setitem(app.config, 'RELATED_AUTO', True)
+    with app.app_context():
+        assert related.related_ids(1, K)
+        name = take_snapshot('related')
+        try:
+            truncate_catalog()
+            for model in (RelatedLecture, RelatedVector, RelatedFeature):
+                assert db.session.execute(db.select(db.func.count()).select_from(model)).scalar() == 0
+
+            export = {
+                'topics': [{'id': 1, 'name': 'Fuseki'}],
+                'tags': [{'id': 1, 'name': 'Review'}],
+                'ranks': [{'id': 1, 'name': '5k'}],
+                'lectures': [{'title': f'Fuseki review {n}', 'youtube_id': f'reimport{n:03d}',
+                              'publish_date': '2024-01-01T00:00:00', 'rank_id': 1,
+                              'topic_ids': [1], 'tag_ids': [1]} for n in range(5)],
+            }
+            import_file(io.BytesIO(json.dumps(export).encode()), 'export.json')
+            db.session.commit()
+            commit_catalog_change(metadata=True)
+            ids = db.session.execute(db.select(Lecture.id)).scalars().all()
+            # Reused ids do not inherit the lists of the lectures that had them before
+            assert all(related.related_ids(lecture_id, K) == [] for lecture_id in ids)
+
+            assert run_requested_rebuild() == 5
+            assert_exact(related)
+            assert set(related.related_ids(ids[0], K)) == set(ids) - {ids[0]}
+        finally:
+            restore_snapshot(name)
+            os.remove(os.path.join(snapshot_dir(), name))
+            related.rebuild_related(K)
@@ -0,0 +1,126 @@
+import pytest
+import sqlalchemy as sa
+from flask import g
+
+
+@pytest.fixture
+def routed(app):
+    """A request context routed to a stand-in replica engine."""
+    from app import db
+    replica = sa.create_engine('sqlite://')
+    with app.test_request_context('/'):
+        g._replica = replica
+        yield db, replica
+        db.session.remove()
+    replica.dispose()
+
+
+def test_plain_select_goes_to_the_replica(routed):
+    from models import Lecture
+    db, replica = routed
+    assert db.session.get_bind(clause=db.select(Lecture.id)) is replica
+    assert db.session.get_bind(clause=db.select(Lecture.id).union(db.select(Lecture.id))) is replica
+
+
+@pytest.mark.parametrize('statement', ['text', 'update', 'for update'])
+def test_anything_else_pins_the_request_to_the_primary(routed, statement):
+    from models import Lecture
+    db, replica = routed
+    clause = {
+        'text': db.text('UPDATE lecture SET title = title'),
+        'update': db.update(Lecture).values(title='x'),
+        'for update': db.select(Lecture.id).with_for_update(),
+    }[statement]
+    assert db.session.get_bind(clause=clause) is db.engine
+    assert g._replica is None and g._db_wrote
+    assert db.session.get_bind(clause=db.select(Lecture.id)) is db.engine
+
+
+@pytest.fixture
+def replica_app(app, tmp_path, monkeypatch):
+    """The app with routing hooks for one SQLite replica copied from the primary.
+
+    Yields a function returning how many statements each engine ran for a callable.
+    """
+    import replicas
+    from app import db
+    path = tmp_path / 'replica.db'
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('VACUUM INTO ?', (str(path),))
+    monkeypatch.setitem(app.config, 'READ_REPLICA_URLS', [f'sqlite:///{path}'])
+    monkeypatch.setitem(app.config, 'REPLICA_HEALTH_INTERVAL', 60)
+    # Install the hooks on copies of the hook tables, so they go away again after the test
+    monkeypatch.setattr(app, '_got_first_request', False)
+    for name in ('before_request_funcs', 'after_request_funcs', 'teardown_request_funcs'):
+        monkeypatch.setattr(app, name, {key: list(funcs) for key, funcs in getattr(app, name).items()})
+    with app.app_context():
+        replicas.init_replicas(app)
+        primary = db.engine
+    replica = replicas.replicas.engines[0]
+
+    def statements(fn):
+        counts = {primary: 0, replica: 0}
+
+        def counter(engine):
+            def record(*args):
+                counts[engine] += 1
+            return record
+        listeners = [(engine, counter(engine)) for engine in counts]
+        for engine, listener in listeners:
+            sa.event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            fn()
+        finally:
+            for engine, listener in listeners:
+                sa.event.remove(engine, 'before_cursor_execute', listener)
+        return counts[primary], counts[replica]
+
+    yield statements, replica
+    replicas.replicas.configure([], 10)
+    replica.dispose()
+
+
+def test_public_reads_use_the_replica(app, replica_app):
+    statements, replica = replica_app
+    client = app.test_client()
+    primary, read = statements(lambda: client.get('/api/search?q=joseki&per_page=5&facets=1'))
+    assert read > 0 and primary == 0
+
+
+def test_reads_after_a_write_use_the_primary(app, replica_app):
+    statements, replica = replica_app
+    client = app.test_client()
+    client.post('/login', data={'username': 'nobody', 'password': 'wrong'})
+    primary, read = statements(lambda: client.get('/api/search?q=joseki&per_page=5'))
+    assert primary > 0 and read == 0
+    # Other clients still read from the replica
+    primary, read = statements(lambda: app.test_client().get('/api/search?q=joseki&per_page=5'))
+    assert read > 0 and primary == 0
+
+
+def test_unhealthy_replica_falls_back_to_the_primary(app, replica_app):
+    import replicas
+    statements, replica = replica_app
+    with replica.begin() as conn:
+        conn.exec_driver_sql('DROP TABLE data_version')
+    client = app.test_client()
+    primary, read = statements(lambda: client.get('/api/search?q=joseki&per_page=5'))
+    assert primary > 0
+    # Only the failed health check reached the replica
+    assert read == 1
+    assert replicas.replicas.status() == [{'url': repr(replica.url), 'healthy': False}]
+
+
+def test_replica_failing_mid_request_sits_out(app, replica_app):
+    import replicas
+    statements, replica = replica_app
+    client = app.test_client()
+    assert statements(lambda: client.get('/api/search?q=joseki&per_page=5'))[1] > 0
+    # Healthy at its last check, then loses a table the search needs
+    with replica.begin() as conn:
+        conn.exec_driver_sql('DROP TABLE lecture_tag')
+    assert client.get('/api/search?tags[]=1&facets=1').status_code == 500
+    assert replicas.replicas.status()[0]['healthy'] is False
+    primary, read = statements(lambda: client.get('/api/search?tags[]=1&facets=1'))
+    assert primary > 0 and read == 0
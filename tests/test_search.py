@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.fixture(params=[True, False], ids=['facet_index', 'sql'])
+def facet_index(request, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'FACET_INDEX', request.param)
+    return request.param
+
+
+def test_empty_query_relevance_listing_pages_with_cursors(client, facet_index):
+    expected = [lecture['id'] for lecture in
+                client.get('/api/search?sort=date&per_page=50').get_json()['lectures']]
+    seen, cursor = [], ''
+    while len(seen) < len(expected):
+        response = client.get(f'/api/search?sort=relevance&per_page=20&cursor={cursor}')
+        assert response.status_code == 200
+        data = response.get_json()
+        seen += [lecture['id'] for lecture in data['lectures']]
+        cursor = data['next_cursor']
+        assert cursor
+    assert seen[:len(expected)] == expected
+
+
+@pytest.mark.parametrize('query', ['!!', '?', '--'])
+def test_query_without_words_matches_nothing(client, facet_index, query):
+    data = client.get('/api/search', query_string={'q': query, 'facets': '1'}).get_json()
+    assert data['lectures'] == []
+    assert data['total_pages'] == 0
+    assert data['facets']['total'] == 0
+    data = client.get('/api/search', query_string={'q': query, 'cursor': ''}).get_json()
+    assert data['lectures'] == [] and data['next_cursor'] is None
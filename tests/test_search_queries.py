@@ -0,0 +1,43 @@
+import pytest
+
+# Statements one /api/search request may run, whatever the page size or filters:
+# id page and total count, metadata version check, lecture rows, topic and tag
+# links, thumbnails, plus four facet counts on the SQL path when asked for
+MAX_QUERIES = 11
+
+FILTERS = [
+    '',
+    'topics[]=1&topics[]=2&topics[]=3',
+    'tags[]=1&tags[]=2',
+    'tags[]=1&tags[]=2&tag_match=all',
+    'q=joseki',
+    'facets=1',
+    'q=joseki&topics[]=1&topics[]=2&tags[]=1&tags[]=3&rank=2&facets=1',
+    'cursor=&facets=1&topics[]=2',
+]
+
+
+@pytest.fixture(params=[True, False], ids=['facet_index', 'sql'])
+def search_path(request, app):
+    saved = app.config['FACET_INDEX']
+    app.config['FACET_INDEX'] = request.param
+    # Index and metadata builds happen once per catalog version, not per request
+    app.test_client().get('/api/search?facets=1')
+    yield request.param
+    app.config['FACET_INDEX'] = saved
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_search_query_count_is_bounded(client, count_queries, search_path, filters):
+    counts = {}
+    for per_page in (1, 50):
+        def search():
+            response = client.get(f'/api/search?per_page={per_page}&{filters}')
+            assert response.status_code == 200
+            counts[per_page] = len(response.get_json()['lectures'])
+        queries = count_queries(search)
+        assert queries <= MAX_QUERIES, f'{queries} queries for per_page={per_page}&{filters}'
+        counts[per_page] = (counts[per_page], queries)
+    # A bigger page returns more lectures but never runs more statements
+    assert counts[50][0] >= counts[1][0]
+    assert counts[50][1] == counts[1][1]
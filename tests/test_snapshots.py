@@ -0,0 +1,65 @@
+import os
+import shutil
+import pytest
+
+
+@pytest.fixture
+def snapshots(app):
+    # app.py imports snapshots through routes, so it has to be imported first
+    import snapshots
+    return snapshots
+
+
+def test_snapshots_in_the_same_second_get_distinct_names(app, snapshots):
+    take_snapshot, snapshot_dir = snapshots.take_snapshot, snapshots.snapshot_dir
+    with app.app_context():
+        first, second = take_snapshot('same'), take_snapshot('same')
+        try:
+            assert first != second
+            assert {first, second} <= set(os.listdir(snapshot_dir()))
+        finally:
+            for name in (first, second):
+                os.remove(os.path.join(snapshot_dir(), name))
+
+
+def test_name_collision_is_a_snapshot_error(app, snapshots, monkeypatch):
+    take_snapshot, snapshot_dir = snapshots.take_snapshot, snapshots.snapshot_dir
+    stamp = snapshots.datetime.now()
+
+    class FrozenDatetime(snapshots.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return stamp
+
+    monkeypatch.setattr(snapshots, 'datetime', FrozenDatetime)
+    with app.app_context():
+        name = take_snapshot()
+        try:
+            with pytest.raises(snapshots.SnapshotError, match='already exists'):
+                take_snapshot()
+            assert os.path.getsize(os.path.join(snapshot_dir(), name)) > 0
+        finally:
+            os.remove(os.path.join(snapshot_dir(), name))
+
+
+def test_postgres_snapshot_reads_one_repeatable_read_transaction(app, snapshots, monkeypatch):
+    from types import SimpleNamespace
+    from unittest import mock
+
+    raw = mock.MagicMock()
+    raw.cursor.return_value.copy_expert.side_effect = lambda sql, out: out.write('id\n')
+    engine = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'), raw_connection=lambda: raw)
+    monkeypatch.setattr(snapshots, 'db', SimpleNamespace(engine=engine))
+    with app.app_context():
+        name = snapshots.take_snapshot('pg')
+        try:
+            calls = [call[0] for call in raw.mock_calls]
+            # The session is configured before the cursor opens the implicit transaction
+            assert calls.index('set_session') < calls.index('cursor')
+            raw.set_session.assert_called_once_with(isolation_level='REPEATABLE READ', readonly=True)
+            assert raw.cursor.return_value.copy_expert.call_count == len(snapshots.CATALOG_TABLES)
+            raw.commit.assert_called_once_with()
+            assert not raw.cursor.return_value.execute.called
+            assert len(os.listdir(os.path.join(snapshots.snapshot_dir(), name))) == len(snapshots.CATALOG_TABLES)
+        finally:
+            shutil.rmtree(os.path.join(snapshots.snapshot_dir(), name))
@@ -0,0 +1,13 @@
+def test_only_exported_pages_point_at_static_search_files(app, client, monkeypatch, tmp_path):
+    import response_cache
+    import static_export
+    monkeypatch.setitem(app.config, 'STATIC_EXPORT_DIR', str(tmp_path))
+    monkeypatch.setattr(response_cache, 'cache', response_cache.MemoryCache(16))
+    with app.app_context():
+        exported = static_export.render('/search')
+    assert b'data-static-search="/api/search/"' in exported
+    # Neither rendered nor taken from the page cache with the attribute when the app serves it
+    for _ in range(2):
+        served = client.get('/search', headers={'Accept-Encoding': 'identity'})
+        assert served.status_code == 200
+        assert b'data-static-search' not in served.data
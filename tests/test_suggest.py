@@ -0,0 +1,16 @@
+def test_warm_suggest_does_not_query_the_database(client, count_queries, monkeypatch):
+    import suggest_index
+    import response_cache
+    # The default page cache is on, as in production; a slow run must not
+    # reach the periodic version check either
+    monkeypatch.setattr(response_cache, 'cache', response_cache.MemoryCache(16))
+    monkeypatch.setattr(suggest_index, 'VERSION_CHECK_SECONDS', 60)
+    assert client.get('/api/suggest?q=jos').status_code == 200
+    for prefix in ('j', 'jo', 'jos', 'jose'):
+        response = None
+
+        def suggest():
+            nonlocal response
+            response = client.get(f'/api/suggest?q={prefix}')
+        assert count_queries(suggest) == 0
+        assert response.status_code == 200
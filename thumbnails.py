@@ -0,0 +1,183 @@
+import io
+import os
+import re
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import click
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+from flask import send_from_directory, url_for, abort
+from app import app, db
+from models import Lecture, ThumbnailVariant
+from utils import placeholder_thumbnail
+from versions import commit_catalog_change
+
+# Variant name -> target width. Cards are about 320px wide; the 2x variant
+# serves high-density screens and is never upscaled past the original.
+VARIANTS = {'card': 320, 'card2x': 640}
+JPEG_QUALITY = 82
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DIGEST_RE = re.compile(r'^[0-9a-f]{40}$')
+WRITE_BATCH_SIZE = 200
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _http():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=16)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def thumbnail_dir():
+    return app.config['THUMBNAIL_DIR']
+
+
+def source_url(youtube_id, thumbnail_url=None):
+    """Where to download the original: the stored URL's path on the configured host."""
+    path = urlparse(thumbnail_url or placeholder_thumbnail(youtube_id)).path
+    return app.config['THUMBNAIL_BASE_URL'].rstrip('/') + path
+
+
+def _store(data):
+    """Write bytes under their digest, once, and return the digest."""
+    digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+    directory = os.path.join(thumbnail_dir(), digest[:2])
+    path = os.path.join(directory, f'{digest}.jpg')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.replace(tmp, path)
+    return digest
+
+
+def _resize(original, width):
+    image = Image.open(io.BytesIO(original))
+    image = image.convert('RGB')
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue(), image.width
+
+
+def build_variants(youtube_id, thumbnail_url=None):
+    """Download one original and store its variants. Returns {variant: (digest, width)}.
+
+    Touches only the network and the disk, so it is safe to run on worker threads.
+    """
+    response = _http().get(source_url(youtube_id, thumbnail_url), timeout=10)
+    response.raise_for_status()
+    original = response.content
+    variants = {}
+    for variant, width in VARIANTS.items():
+        data, actual_width = _resize(original, width)
+        variants[variant] = (_store(data), actual_width)
+    return variants
+
+
+def save_variants(results):
+    """Record {youtube_id: {variant: (digest, width)}} in the session. The caller commits."""
+    if not results:
+        return
+    youtube_ids = list(results)
+    db.session.execute(db.delete(ThumbnailVariant).where(ThumbnailVariant.youtube_id.in_(youtube_ids)))
+    now = datetime.utcnow()
+    db.session.execute(db.insert(ThumbnailVariant), [
+        {'youtube_id': youtube_id, 'variant': variant, 'digest': digest, 'width': width, 'fetched_at': now}
+        for youtube_id, variants in results.items()
+        for variant, (digest, width) in variants.items()
+    ])
+
+
+def cache_thumbnail(lecture):
+    """Cache one lecture's thumbnail; errors are logged and the original URL keeps being used."""
+    try:
+        save_variants({lecture.youtube_id: build_variants(lecture.youtube_id, lecture.thumbnail_url)})
+    except Exception as e:
+        logging.error(f"Error caching thumbnail for {lecture.youtube_id}: {str(e)}")
+
+
+def thumbnail_urls(youtube_ids):
+    """{youtube_id: {'src': url, 'srcset': str or None}} for lectures with a cached thumbnail."""
+    if not youtube_ids:
+        return {}
+    rows = db.session.execute(
+        db.select(ThumbnailVariant.youtube_id, ThumbnailVariant.digest, ThumbnailVariant.width)
+        .where(ThumbnailVariant.youtube_id.in_(list(youtube_ids)))
+        .order_by(ThumbnailVariant.youtube_id, ThumbnailVariant.width)
+    ).all()
+    found = {}
+    for youtube_id, digest, width in rows:
+        found.setdefault(youtube_id, []).append((url_for('thumbnail', digest=digest), width))
+    urls = {}
+    for youtube_id, variants in found.items():
+        srcset = ', '.join(f'{url} {width}w' for url, width in variants if width)
+        urls[youtube_id] = {'src': variants[0][0], 'srcset': srcset or None}
+    return urls
+
+
+@app.route('/thumbnails/<digest>.jpg')
+def thumbnail(digest):
+    if not DIGEST_RE.match(digest):
+        abort(404)
+    response = send_from_directory(os.path.join(thumbnail_dir(), digest[:2]), f'{digest}.jpg',
+                                   max_age=IMMUTABLE_MAX_AGE)
+    # The name is the content hash, so the file can never change under it
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+
+@app.cli.command("thumbnails-backfill")
+@click.option('--workers', default=8, show_default=True, help='Parallel downloads.')
+@click.option('--force', is_flag=True, help='Rebuild thumbnails that are already cached.')
+def thumbnails_backfill(workers, force):
+    """Download and resize thumbnails for every lecture that has none cached."""
+    query = db.select(Lecture.youtube_id, Lecture.thumbnail_url)
+    if not force:
+        # Originals cached unresized before Pillow was required count as missing
+        cached = db.select(ThumbnailVariant.youtube_id).where(ThumbnailVariant.width.is_not(None)).distinct()
+        query = query.where(Lecture.youtube_id.not_in(cached))
+    lectures = db.session.execute(query).all()
+    print(f"Caching thumbnails for {len(lectures)} lectures with {workers} workers")
+
+    def build(row):
+        try:
+            return row.youtube_id, build_variants(row.youtube_id, row.thumbnail_url)
+        except Exception as e:
+            logging.error(f"Error caching thumbnail for {row.youtube_id}: {str(e)}")
+            return row.youtube_id, None
+
+    done, failed, pending = 0, 0, {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for youtube_id, variants in pool.map(build, lectures):
+            if variants is None:
+                failed += 1
+                continue
+            pending[youtube_id] = variants
+            if len(pending) >= WRITE_BATCH_SIZE:
+                save_variants(pending)
+                db.session.commit()
+                done += len(pending)
+                pending = {}
+    save_variants(pending)
+    done += len(pending)
+    # Cached pages embed thumbnail URLs, so move the catalog version on
+    commit_catalog_change([])
+    print(f"Cached {done} thumbnails, {failed} failed")
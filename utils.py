@@ -1,14 +1,46 @@
-import os
+import re
+import json
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
-from datetime import datetime
-from app import app
+from datetime import datetime, timedelta
+from app import app, db
+from models import YouTubeVideo
+import metrics
 import logging
 
-def get_youtube_video_info(url):
-    logging.debug(f"Processing YouTube URL: {url}")
+YOUTUBE_BATCH_SIZE = 50  # videos.list accepts at most 50 ids per call
+CACHE_CHUNK_SIZE = 500
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def youtube_session():
+    """Keep-alive session shared by every thread, sized for the fetch pool."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                pool_size = max(app.config['YOUTUBE_FETCH_WORKERS'], 10)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def extract_video_id(url):
+    """Video id from a youtu.be, watch?v=, /live/ or /shorts/ URL, or a bare id."""
+    url = url.strip()
+    if VIDEO_ID_RE.match(url):
+        return url
 
-    # Extract video ID from URL
     parsed_url = urlparse(url)
     video_id = None
 
@@ -17,13 +49,15 @@ def get_youtube_video_info(url):
             # Handle youtu.be short URLs
             video_id = parsed_url.path.lstrip('/').split('?')[0]
             logging.debug(f"Extracted video ID from youtu.be URL: {video_id}")
-        elif parsed_url.hostname in ['www.youtube.com', 'youtube.com']:
+        elif parsed_url.hostname in ['www.youtube.com', 'youtube.com', 'm.youtube.com']:
             # Handle regular youtube.com URLs
             if 'v' in parse_qs(parsed_url.query):
                 video_id = parse_qs(parsed_url.query)['v'][0]
-            elif 'live' in parsed_url.path:
+            elif '/live/' in parsed_url.path:
                 # Handle live URLs
-                video_id = parsed_url.path.split('/live/')[1].split('?')[0]
+                video_id = parsed_url.path.split('/live/')[1].split('/')[0]
+            elif '/shorts/' in parsed_url.path:
+                video_id = parsed_url.path.split('/shorts/')[1].split('/')[0]
             logging.debug(f"Extracted video ID from youtube.com URL: {video_id}")
         else:
             logging.error(f"Unsupported URL hostname: {parsed_url.hostname}")
@@ -37,32 +71,166 @@ def get_youtube_video_info(url):
         logging.error("No video ID found in URL")
         raise Exception('Could not extract video ID from URL')
 
-    # Get video info from YouTube API
-    api_key = app.config['YOUTUBE_API_KEY']
-    api_url = f'https://www.googleapis.com/youtube/v3/videos?id={video_id}&key={api_key}&part=snippet'
+    return video_id
+
+
+class ClientStats:
+    """Per-process counters for the YouTube client: cache hit rate and upstream latency."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.cache_hits = 0
+        self.negative_hits = 0
+        self.cache_misses = 0
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.upstream_seconds = 0.0
+        self.upstream_max_seconds = 0.0
+
+    def record_lookup(self, hits, negative_hits, misses):
+        with self.lock:
+            self.cache_hits += hits
+            self.negative_hits += negative_hits
+            self.cache_misses += misses
+
+    def record_upstream(self, seconds, ok=True):
+        with self.lock:
+            self.upstream_requests += 1
+            self.upstream_errors += 0 if ok else 1
+            self.upstream_seconds += seconds
+            self.upstream_max_seconds = max(self.upstream_max_seconds, seconds)
+
+    def as_dict(self):
+        with self.lock:
+            lookups = self.cache_hits + self.negative_hits + self.cache_misses
+            return {
+                'cache_hits': self.cache_hits,
+                'negative_hits': self.negative_hits,
+                'cache_misses': self.cache_misses,
+                'hit_rate': round((self.cache_hits + self.negative_hits) / lookups, 4) if lookups else None,
+                'upstream_requests': self.upstream_requests,
+                'upstream_errors': self.upstream_errors,
+                'upstream_avg_ms': round(1000 * self.upstream_seconds / self.upstream_requests, 1)
+                if self.upstream_requests else None,
+                'upstream_max_ms': round(1000 * self.upstream_max_seconds, 1)
+            }
+
+
+youtube_stats = ClientStats()
+
+
+def _video_info(video_id, snippet):
+    thumbnails = snippet.get('thumbnails', {})
+    # Prefer 'high' as before, falling back to whatever size the video has
+    thumbnail = next((thumbnails[size] for size in ('high', 'medium', 'default', 'standard', 'maxres')
+                      if size in thumbnails), None)
+    return {
+        'youtube_id': video_id,
+        'title': snippet.get('title', ''),
+        'thumbnail_url': thumbnail['url'] if thumbnail else placeholder_thumbnail(video_id),
+        'publish_date': datetime.strptime(snippet['publishedAt'], '%Y-%m-%dT%H:%M:%SZ')
+    }
+
 
-    logging.debug(f"Fetching video info for ID: {video_id}")
+def _fetch_batch(video_ids):
+    """One videos.list call for up to 50 ids: id -> snippet. Ids YouTube does not know are left out."""
+    started = time.perf_counter()
     try:
-        response = requests.get(api_url, timeout=10)
+        response = youtube_session().get(
+            f"{app.config['YOUTUBE_API_BASE'].rstrip('/')}/videos",
+            params={'id': ','.join(video_ids), 'key': app.config['YOUTUBE_API_KEY'], 'part': 'snippet'},
+            timeout=10
+        )
         response.raise_for_status()
     except requests.RequestException as e:
+        youtube_stats.record_upstream(time.perf_counter() - started, ok=False)
         logging.error(f"YouTube API request error: {str(e)}")
         raise Exception(f'Failed to fetch video info from YouTube API: {str(e)}')
 
-    if response.status_code != 200:
-        logging.error(f"YouTube API error: {response.status_code} - {response.text}")
-        raise Exception(f'YouTube API responded with code {response.status_code}')
+    youtube_stats.record_upstream(time.perf_counter() - started)
+    return {item['id']: item['snippet'] for item in response.json().get('items', [])}
 
-    data = response.json()
-    if not data.get('items'):
-        logging.error(f"No video found for ID: {video_id}")
-        raise Exception('Video not found')
 
-    video_data = data['items'][0]['snippet']
-    logging.debug(f"Successfully retrieved video data for ID: {video_id}")
+def _read_cache(video_ids):
+    """Fresh cache rows: id -> snippet dict, or None for a remembered not-found id."""
+    now = datetime.utcnow()
+    ttl = timedelta(seconds=app.config['YOUTUBE_CACHE_TTL'])
+    negative_ttl = timedelta(seconds=app.config['YOUTUBE_NEGATIVE_CACHE_TTL'])
+    cached = {}
+    # A connection of its own so lookups never flush or join the caller's transaction
+    with db.engine.connect() as conn:
+        for start in range(0, len(video_ids), CACHE_CHUNK_SIZE):
+            rows = conn.execute(
+                db.select(YouTubeVideo.video_id, YouTubeVideo.snippet, YouTubeVideo.found, YouTubeVideo.fetched_at)
+                .where(YouTubeVideo.video_id.in_(video_ids[start:start + CACHE_CHUNK_SIZE]))
+            )
+            for video_id, snippet, found, fetched_at in rows:
+                if now - fetched_at < (ttl if found else negative_ttl):
+                    cached[video_id] = json.loads(snippet) if found else None
+    return cached
+
+
+def _write_cache(snippets, missing):
+    now = datetime.utcnow()
+    rows = [{'video_id': video_id, 'snippet': json.dumps(snippet), 'found': True, 'fetched_at': now}
+            for video_id, snippet in snippets.items()]
+    rows += [{'video_id': video_id, 'snippet': None, 'found': False, 'fetched_at': now} for video_id in missing]
+    if not rows:
+        return
+    try:
+        # Committed on its own so answers are kept even if the caller rolls back
+        with db.engine.begin() as conn:
+            ids = [row['video_id'] for row in rows]
+            for start in range(0, len(ids), CACHE_CHUNK_SIZE):
+                conn.execute(db.delete(YouTubeVideo).where(
+                    YouTubeVideo.video_id.in_(ids[start:start + CACHE_CHUNK_SIZE])
+                ))
+            conn.execute(db.insert(YouTubeVideo), rows)
+    except Exception as e:
+        logging.error(f"Error writing YouTube cache: {str(e)}")
+
+
+def fetch_videos(video_ids, use_cache=True):
+    """Video info for many ids, from the cache where fresh and otherwise from
+    videos.list in batches of 50 fetched concurrently on a bounded pool.
+    Ids YouTube does not know are left out of the result.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    cached = _read_cache(video_ids) if use_cache and video_ids else {}
+    missing = [video_id for video_id in video_ids if video_id not in cached]
+    negative = sum(1 for snippet in cached.values() if snippet is None)
+    youtube_stats.record_lookup(len(cached) - negative, negative, len(missing))
+
+    snippets = {video_id: snippet for video_id, snippet in cached.items() if snippet is not None}
+    if missing:
+        started = time.perf_counter()
+        batches = [missing[start:start + YOUTUBE_BATCH_SIZE]
+                   for start in range(0, len(missing), YOUTUBE_BATCH_SIZE)]
+        fetched = {}
+        if len(batches) == 1:
+            fetched.update(_fetch_batch(batches[0]))
+        else:
+            workers = min(app.config['YOUTUBE_FETCH_WORKERS'], len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for result in pool.map(_fetch_batch, batches):
+                    fetched.update(result)
+        _write_cache(fetched, [video_id for video_id in missing if video_id not in fetched])
+        snippets.update(fetched)
+        metrics.add_timing('youtube', time.perf_counter() - started)
+
+    return {video_id: _video_info(video_id, snippets[video_id]) for video_id in video_ids if video_id in snippets}
+
+
+def cached_video(video_id):
+    """Video info if the cache has a fresh answer for a known video, without any network call."""
+    snippet = _read_cache([video_id]).get(video_id)
+    return _video_info(video_id, snippet) if snippet else None
+
+
+def placeholder_thumbnail(video_id):
+    """Thumbnail URL YouTube serves for every video, used until the real one is fetched."""
+    return f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
 
-    return {
-        'youtube_id': video_id,
-        'thumbnail_url': video_data['thumbnails']['high']['url'],
-        'publish_date': datetime.strptime(video_data['publishedAt'], '%Y-%m-%dT%H:%M:%SZ')
-    }
\ No newline at end of file
@@ -0,0 +1,69 @@
+from blinker import Namespace
+from flask import g, has_app_context
+from app import app, db
+from models import DataVersion
+
+# Version counters stored in the database. Every admin write bumps the
+# catalog version in the same transaction, so in-process indexes and caches
+# in any worker can compare versions to find out whether they are stale.
+# The metadata counter only moves when topics, tags or ranks change.
+CATALOG = 'catalog'
+METADATA = 'metadata'
+# Not a counter: the catalog version of the last change that needs a full
+# related-lectures rebuild, or 0 when none is waiting (see related.py)
+RELATED_REBUILD = 'related_rebuild'
+COUNTERS = (CATALOG, METADATA, RELATED_REBUILD)
+
+_signals = Namespace()
+
+# Sent after a catalog write commits, in the process that made it.
+# lecture_ids lists the lectures that changed, or is None when anything
+# may have changed (import, reset). metadata is True when topics, tags or
+# ranks changed.
+catalog_changed = _signals.signal('catalog-changed')
+
+
+def init_versions():
+    """Make sure the counter rows exist so bumps are plain UPDATEs."""
+    missing = [name for name in COUNTERS if db.session.get(DataVersion, name) is None]
+    for name in missing:
+        db.session.add(DataVersion(name=name, version=0))
+    if missing:
+        db.session.commit()
+
+
+def _request_versions():
+    """All counters, read with one query at most once per request."""
+    if has_app_context() and '_data_versions' in g:
+        return g._data_versions
+    versions = dict(db.session.execute(db.select(DataVersion.name, DataVersion.version)).all())
+    if has_app_context():
+        g._data_versions = versions
+    return versions
+
+
+def get_version(name=CATALOG):
+    """Current value of a counter."""
+    return _request_versions().get(name, 0)
+
+
+def bump_version(name=CATALOG):
+    """Increment a counter inside the current transaction and return the new value."""
+    db.session.execute(
+        db.update(DataVersion).where(DataVersion.name == name).values(version=DataVersion.version + 1)
+    )
+    version = db.session.execute(
+        db.select(DataVersion.version).where(DataVersion.name == name)
+    ).scalar()
+    _request_versions()[name] = version
+    return version
+
+
+def commit_catalog_change(lecture_ids=None, metadata=False):
+    """Commit the session together with version bumps and notify listeners."""
+    version = bump_version(CATALOG)
+    if metadata:
+        bump_version(METADATA)
+    db.session.commit()
+    catalog_changed.send(app, version=version, lecture_ids=lecture_ids, metadata=metadata)
+    return version
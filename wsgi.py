@@ -0,0 +1,9 @@
+import os
+
+# Production entry point (see gunicorn.conf.py): the app is built by create_app()
+# rather than by importing app, and warmed before workers are forked.
+os.environ["APP_FACTORY"] = "1"
+
+from app import create_app  # noqa: E402
+
+app = create_app(warm=True)